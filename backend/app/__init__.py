@@ -1,9 +1,49 @@
 # backend\app\__init__.py
 
+import os
+import secrets
+from dotenv import load_dotenv
+
+# Load .env before any module reads its configuration from the environment
+load_dotenv()
+
 from quart import Quart
 from quart_cors import cors
+from app.pipelines import executors, registry
+from app.pipelines.journal import run_journal
+from app.pipelines import jobs
+from app.services.clients import client_manager
 
 app = Quart(__name__)
-app = cors(app, allow_origin="http://localhost:3000")
+# Signs the session cookie that identifies callers. Set it to the same value
+# on every web process; without it a random key is used, and sessions end
+# when the server restarts.
+app.secret_key = os.getenv("SECRET_KEY") or secrets.token_hex(32)
+if not os.getenv("SECRET_KEY"):
+    print("SECRET_KEY is not set, using a random key for session cookies")
+app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
+# The frontend sends the session cookie with its requests
+app = cors(app, allow_origin="http://localhost:3000", allow_credentials=True)
+
+worker_processes = []
+
+@app.before_serving
+async def prewarm_nodes():
+    if jobs.job_queue is not None:
+        # Runs are executed by worker processes, which load the node types
+        # they need themselves
+        worker_processes.extend(jobs.start_workers())
+        return
+    # Optionally load selected node types (e.g. the FLUX model) in the background
+    registry.prewarm()
+
+@app.after_serving
+async def shutdown_executors():
+    jobs.stop_workers(worker_processes)
+    executors.shutdown()
+    await client_manager.close()
+    if run_journal is not None:
+        # Write out the journal entries still queued
+        run_journal.flush()
 
-from app import routes
\ No newline at end of file
+from app import routes
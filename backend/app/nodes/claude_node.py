@@ -1,9 +1,7 @@
-import os
-import asyncio
-from anthropic import Anthropic, AsyncAnthropic
-
-sync_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-async_client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+from app.services.clients import get_client, load_sdk
+from app.services import provider_limits, metrics
+from app.services.provider_limits import estimate_tokens
+from app.services.prompt_cache import prompt_cache, enabled as prompt_cache_enabled
 
 def extract_text(content):
     if isinstance(content, list):
@@ -15,47 +13,46 @@ def extract_text(content):
     else:
         return str(content)
 
-async def async_claude_function(input_data, options):
-    try:
-        if options.get('use_custom_input', False):
-            custom_input = options.get('custom_input', '')
-            input_data = custom_input.replace('{input}', input_data)
-        max_tokens = int(options.get('max_tokens', 1024))
-        model = options.get('model', 'claude-3-opus-20240229')
-        system_message = options.get('system_message', "You are a helpful assistant.")
+def message_request(input_data, options):
+    if options.get('use_custom_input', False):
+        custom_input = options.get('custom_input', '')
+        input_data = custom_input.replace('{input}', input_data)
+    max_tokens = int(options.get('max_tokens', 1024))
+    system_message = options.get('system_message', "You are a helpful assistant.")
+    return {
+        "max_tokens": max_tokens,
+        "temperature": float(options.get('temperature', 1.0)),
+        "messages": [
+            {
+                "role": "user",
+                "content": input_data
+            }
+        ],
+        "model": options.get('model', 'claude-3-opus-20240229'),
+        "system": system_message
+    }, estimate_tokens(system_message + input_data, max_tokens)
 
-        response = await async_client.messages.create(
-            max_tokens=max_tokens,
-            messages=[
-                {
-                    "role": "user",
-                    "content": input_data
-                }
-            ],
-            model=model,
-            system=system_message
-        )
-        return extract_text(response.content)
-    except Exception as e:
-        return f"Error: {str(e)}"
+def record_usage(params, usage):
+    if usage is not None:
+        metrics.record_usage('anthropic', params['model'], usage.input_tokens, usage.output_tokens)
+
+async def async_claude_stream(input_data, options):
+    params, tokens = message_request(input_data, options)
+
+    async def open_stream():
+        async with get_client('anthropic').messages.stream(**params) as stream:
+            async for text in stream.text_stream:
+                yield text
+            record_usage(params, (await stream.get_final_message()).usage)
+
+    async for text in provider_limits.stream('anthropic', params['model'], tokens, open_stream):
+        yield text
 
 def sync_claude_function(input_data, options):
     try:
-        max_tokens = int(options.get('max_tokens', 1024))
-        model = options.get('model', 'claude-3-opus-20240229')
-        system_message = options.get('system_message', "You are a helpful assistant.")
-
-        response = sync_client.messages.create(
-            max_tokens=max_tokens,
-            messages=[
-                {
-                    "role": "user",
-                    "content": input_data
-                }
-            ],
-            model=model,
-            system=system_message
-        )
+        params, _ = message_request(input_data, options)
+        response = get_client('anthropic', sync=True).messages.create(**params)
+        record_usage(params, response.usage)
         return extract_text(response.content)
     except Exception as e:
         return f"Error: {str(e)}"
@@ -63,13 +60,45 @@ def sync_claude_function(input_data, options):
 def process(input_data, options):
     return sync_claude_function(input_data, options)
 
+def cache_key(params):
+    # The prompt, and the settings a cached completion must have been made with
+    return params['messages'][0]['content'], (params['system'], params['max_tokens'], params['temperature'])
+
 async def async_process(input_data, options):
-    result = await async_claude_function(input_data, options)
-    yield result
+    # Stream tokens as they arrive, then yield the complete text as the result.
+    # Failed calls raise ProviderError, which is reported as the node's error.
+    # With the prompt cache on, a completion of the same or a similar prompt
+    # is returned instead of calling the provider.
+    if prompt_cache_enabled(options):
+        params, _ = message_request(input_data, options)
+        prompt, settings = cache_key(params)
+        completion = prompt_cache.lookup('anthropic', params['model'], prompt, settings)
+        if completion is not None:
+            yield completion
+            return
+    parts = []
+    async for delta in async_claude_stream(input_data, options):
+        parts.append(delta)
+        yield {"delta": delta}
+    completion = ''.join(parts)
+    if prompt_cache_enabled(options):
+        prompt_cache.store('anthropic', params['model'], prompt, completion, settings)
+    yield completion
+
+def is_cacheable(options):
+    # Only deterministic completions are worth caching
+    try:
+        return float(options.get('temperature', 1.0)) == 0
+    except (TypeError, ValueError):
+        return False
+
+def warm_up():
+    load_sdk('anthropic')
 
 def get_ui_config():
     return {
         "type": "Claude Node",
+        "provider": "anthropic",
         "fields": [
             {
                 "name": "model",
@@ -89,12 +118,26 @@ def get_ui_config():
                 "label": "Max Tokens",
                 "default": 1024
             },
+            {
+                "name": "temperature",
+                "type": "number",
+                "label": "Temperature",
+                "default": 1.0,
+                "step": 0.1,
+                "min": 0,
+                "max": 1
+            },
             {
                 "name": "system_message",
                 "type": "textarea",
                 "label": "System Message",
                 "placeholder": "You are a helpful assistant."
             },
+            {
+                "name": "prompt_cache",
+                "type": "checkbox",
+                "label": "Reuse Completions of Similar Prompts"
+            },
             {
                 "name": "use_custom_input",
                 "type": "checkbox",
@@ -1,13 +1,13 @@
 # backend/app/nodes/dalle_image_generator.py
 
 import os
-from openai import OpenAI
+import base64
+from app.services.clients import get_client, load_sdk
+from app.services import provider_limits
+from app.services.artifacts import artifact_store
+from app.pipelines import executors
 
-def process(input_data, options):
-    # Initialize the OpenAI client
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    print(f"DALL-E received input_data: {input_data}")
-    print(f"DALL-E received options: {options}")
+def image_params(input_data, options):
     # Prepare the request parameters
     params = {
         "model": "dall-e-3",
@@ -21,18 +21,51 @@ def process(input_data, options):
     # if prompt contains {input}, replace it with the actual input data
     if "{input}" in params["prompt"]:
         params["prompt"] = params["prompt"].replace("{input}", input_data)
+    # DALL-E URLs expire after an hour; mirrored images are returned inline
+    # and kept in the artifact store instead
+    if mirror_enabled(options):
+        params["response_format"] = "b64_json"
+    return params
+
+def mirror_enabled(options):
+    return str(options.get("mirror", False)).lower() in ("true", "1", "on")
+
+def store_image(image):
+    handle = artifact_store.put(base64.b64decode(image.b64_json), "image/png")
+    return {**handle, "image": handle["url"], "is_final": True}
 
-    # Generate the image
+def process(input_data, options):
+    # Generate the image with the shared, pooled OpenAI client
     try:
-        response = client.images.generate(**params)
+        response = get_client('openai', sync=True).images.generate(**image_params(input_data, options))
+        if mirror_enabled(options):
+            return store_image(response.data[0])
         # Return the URL of the generated image
         return response.data[0].url
     except Exception as e:
         return f"Error generating image: {str(e)}"
 
+async def async_process(input_data, options):
+    # Failed calls raise ProviderError, which is reported as the node's error
+    params = image_params(input_data, options)
+
+    async def request():
+        return await get_client('openai').images.generate(**params)
+
+    response = await provider_limits.call('openai', params['model'], 0, request)
+    if mirror_enabled(options):
+        yield await executors.run_in_thread(store_image, response.data[0])
+    else:
+        yield response.data[0].url
+
+def warm_up():
+    load_sdk('openai')
+
 def get_ui_config():
     return {
         "type": "DALL-E Image Generator",
+        "provider": "openai",
+        "execution": "io",
         "fields": [
             {
                 "name": "prompt",
@@ -61,6 +94,12 @@ def get_ui_config():
                 "label": "Image Style",
                 "options": ["vivid", "natural"],
                 "default": "vivid"
+            },
+            {
+                "name": "mirror",
+                "type": "checkbox",
+                "label": "Keep Local Copy",
+                "default": False
             }
         ]
     }
\ No newline at end of file
@@ -1,69 +1,84 @@
 # backend/app/nodes/flux_image_generator.py
 
-import torch
-from diffusers import FluxPipeline
-import io
-import base64
-from PIL import Image
-import os
-import asyncio
+from app.services.flux_worker import flux_worker
+from app.services.artifacts import artifact_store
+from app.pipelines import executors
 
-# Load the FLUX pipeline
-pipe = FluxPipeline.from_pretrained(
-    "C:\\Projects\\flux1\\",  # Update this path to your local FLUX model
-    torch_dtype=torch.bfloat16,
-)
-pipe.enable_sequential_cpu_offload()
+def warm_up():
+    # Load the model weights up front (used when pre-warming at startup)
+    flux_worker.load()
 
 def process(input_data, options):
     # This function is required but not used
     return "FLUX Image Generator does not support synchronous processing"
 
+def save_png(image):
+    # PNG-encode straight into the artifact store
+    return artifact_store.write(lambda f: image.save(f, format="PNG"), "image/png")
+
 async def async_process(input_data, options):
-    prompt = options.get("prompt", input_data)
+    prompt = options.get("prompt") or input_data
+    if "{input}" in prompt:
+        prompt = prompt.replace("{input}", input_data)
     guidance_scale = float(options.get("guidance_scale", 4.0))
     num_inference_steps = int(options.get("num_inference_steps", 6))
     height = int(options.get("height", 1024))
     width = int(options.get("width", 1024))
     seed = options.get("seed")
+    seed = int(seed) if seed not in (None, "", "random") else None
 
-    if seed is not None and seed != "random":
-        generator = torch.Generator("cpu").manual_seed(int(seed))
-    else:
-        generator = torch.Generator("cpu").manual_seed(torch.randint(0, 1000000, (1,)).item())
-
+    # Rendering happens on the FLUX worker thread, possibly batched together
+    # with other requests of the same size; we just stream its progress
+    request = flux_worker.submit(
+        prompt,
+        height=height,
+        width=width,
+        num_inference_steps=num_inference_steps,
+        guidance_scale=guidance_scale,
+        seed=seed,
+        model=options.get("model") or None,
+    )
     try:
-        # Run the pipeline
-        result = pipe(
-            prompt,
-            height=height,
-            width=width,
-            guidance_scale=guidance_scale,
-            num_inference_steps=num_inference_steps,
-            generator=generator,
-            output_type="pil",
-        )
+        async for update in request.progress():
+            yield update
+        final_image = await request.future
+
+        # Final image. PNG compression releases the GIL, so the encoding runs
+        # in the node thread pool rather than on the event loop. The result
+        # references the stored PNG; child nodes receive its URL.
+        handle = await executors.run_in_thread(save_png, final_image)
 
-        # Final image
-        final_image = result.images[0]
-        buffered = io.BytesIO()
-        final_image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        
         yield {
-            "image": f"data:image/png;base64,{img_str}",
+            **handle,
+            "image": handle["url"],
             "is_final": True
         }
 
     except Exception as e:
         print(f"Error in FLUX generator: {str(e)}")
         yield {"error": str(e)}
+    finally:
+        if not request.future.done():
+            request.cancel()
+
+def is_cacheable(options):
+    # Images are reproducible only with a fixed seed
+    seed = options.get("seed")
+    return seed not in (None, "", "random")
 
 def get_ui_config():
     return {
         "type": "FLUX Image Generator",
         "description": "Generates images using the FLUX model",
+        "queue": "gpu",
         "fields": [
+            {
+                "name": "model",
+                "type": "text",
+                "label": "Model",
+                "placeholder": "flux",
+                "default": ""
+            },
             {
                 "name": "prompt",
                 "type": "textarea",
@@ -1,44 +1,49 @@
-import os
-from openai import OpenAI, AsyncOpenAI
-import asyncio
+from app.services.clients import get_client, load_sdk
+from app.services import provider_limits, metrics
+from app.services.provider_limits import estimate_tokens
+from app.services.prompt_cache import prompt_cache, enabled as prompt_cache_enabled
 
-sync_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def chat_request(input_data, options):
+    if options.get('use_custom_input', False):
+        custom_input = options.get('custom_input', '')
+        input_data = custom_input.replace('{input}', input_data)
+    system_message = options.get('system_message', "You are a helpful assistant.")
+    max_tokens = int(options.get('max_tokens', 150))
+    return {
+        "model": options.get('model', 'gpt-4'),
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": input_data}
+        ],
+        "max_tokens": max_tokens,
+        "temperature": float(options.get('temperature', 0.7))
+    }, estimate_tokens(system_message + input_data, max_tokens)
 
-async def async_gpt_function(input_data, options):
-    try:
-        if options.get('use_custom_input', False):
-            custom_input = options.get('custom_input', '')
-            input_data = custom_input.replace('{input}', input_data)
+def record_usage(params, usage):
+    if usage is not None:
+        metrics.record_usage('openai', params['model'], usage.prompt_tokens, usage.completion_tokens)
 
-        chat_completion = await async_client.chat.completions.create(
-            model=options.get('model', 'gpt-4'),
-            messages=[
-                {"role": "system", "content": options.get('system_message', "You are a helpful assistant.")},
-                {"role": "user", "content": input_data}
-            ],
-            max_tokens=int(options.get('max_tokens', 150)),
-            temperature=float(options.get('temperature', 0.7))
+async def async_gpt_stream(input_data, options):
+    params, tokens = chat_request(input_data, options)
+
+    async def open_stream():
+        stream = await get_client('openai').chat.completions.create(
+            **params, stream=True, stream_options={"include_usage": True}
         )
-        return chat_completion.choices[0].message.content
-    except Exception as e:
-        return f"Error: {str(e)}"
+        async for chunk in stream:
+            # The last chunk carries the token usage of the whole completion
+            record_usage(params, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async for delta in provider_limits.stream('openai', params['model'], tokens, open_stream):
+        yield delta
 
 def sync_gpt_function(input_data, options):
     try:
-        if options.get('use_custom_input', False):
-            custom_input = options.get('custom_input', '')
-            input_data = custom_input.replace('{input}', input_data)
-
-        chat_completion = sync_client.chat.completions.create(
-            model=options.get('model', 'gpt-4'),
-            messages=[
-                {"role": "system", "content": options.get('system_message', "You are a helpful assistant.")},
-                {"role": "user", "content": input_data}
-            ],
-            max_tokens=int(options.get('max_tokens', 150)),
-            temperature=float(options.get('temperature', 0.7))
-        )
+        params, _ = chat_request(input_data, options)
+        chat_completion = get_client('openai', sync=True).chat.completions.create(**params)
+        record_usage(params, chat_completion.usage)
         return chat_completion.choices[0].message.content
     except Exception as e:
         return f"Error: {str(e)}"
@@ -46,13 +51,46 @@ def sync_gpt_function(input_data, options):
 def process(input_data, options):
     return sync_gpt_function(input_data, options)
 
+def cache_key(params):
+    # The prompt, and the settings a cached completion must have been made with
+    messages = params['messages']
+    return messages[1]['content'], (messages[0]['content'], params['max_tokens'], params['temperature'])
+
 async def async_process(input_data, options):
-    result = await async_gpt_function(input_data, options)
-    yield result
+    # Stream tokens as they arrive, then yield the complete text as the result.
+    # Failed calls raise ProviderError, which is reported as the node's error.
+    # With the prompt cache on, a completion of the same or a similar prompt
+    # is returned instead of calling the provider.
+    if prompt_cache_enabled(options):
+        params, _ = chat_request(input_data, options)
+        prompt, settings = cache_key(params)
+        completion = prompt_cache.lookup('openai', params['model'], prompt, settings)
+        if completion is not None:
+            yield completion
+            return
+    parts = []
+    async for delta in async_gpt_stream(input_data, options):
+        parts.append(delta)
+        yield {"delta": delta}
+    completion = ''.join(parts)
+    if prompt_cache_enabled(options):
+        prompt_cache.store('openai', params['model'], prompt, completion, settings)
+    yield completion
+
+def is_cacheable(options):
+    # Only deterministic completions are worth caching
+    try:
+        return float(options.get('temperature', 0.7)) == 0
+    except (TypeError, ValueError):
+        return False
+
+def warm_up():
+    load_sdk('openai')
 
 def get_ui_config():
     return {
         "type": "GPT Node",
+        "provider": "openai",
         "fields": [
             {
                 "name": "model",
@@ -86,6 +124,11 @@ def get_ui_config():
                 "label": "System Message",
                 "placeholder": "You are a helpful assistant."
             },
+            {
+                "name": "prompt_cache",
+                "type": "checkbox",
+                "label": "Reuse Completions of Similar Prompts"
+            },
             {
                 "name": "use_custom_input",
                 "type": "checkbox",
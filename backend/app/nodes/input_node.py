@@ -1,9 +1,14 @@
 def process(input_data, options):
     return options.get('value', '')
 
+def process_batch(inputs, options):
+    # In batches, every row's value replaces the node's own
+    return list(inputs)
+
 def get_ui_config():
     return {
         "type": "Input Node",
+        "execution": "inline",
         "fields": [
             {
                 "name": "value",
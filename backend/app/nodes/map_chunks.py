@@ -0,0 +1,91 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from app.pipelines import wrapped
+
+DEFAULT_MAX_PARALLEL = 4
+
+def chunks_of(input_data):
+    # The chunks of a Split Text node, or the whole input as a single chunk
+    if isinstance(input_data, list):
+        return input_data
+    return [input_data] if input_data not in (None, '') else []
+
+def max_parallel(options):
+    return max(1, int(float(options.get('max_parallel', DEFAULT_MAX_PARALLEL) or DEFAULT_MAX_PARALLEL)))
+
+def process(input_data, options):
+    node = wrapped.load(options)
+    if node is None:
+        return chunks_of(input_data)
+    _, module, node_options = node
+    with ThreadPoolExecutor(max_workers=max_parallel(options)) as pool:
+        return list(pool.map(lambda chunk: module.process(chunk, node_options), chunks_of(input_data)))
+
+async def async_process(input_data, options):
+    # Runs the wrapped node on every chunk, at most max_parallel at a time,
+    # and yields the results in the order of the chunks. A progress update
+    # with the chunk's result is streamed as each chunk completes.
+    chunks = chunks_of(input_data)
+    node = await wrapped.load_async(options)
+    if node is None:
+        yield chunks
+        return
+    node_type, module, node_options = node
+    semaphore = asyncio.Semaphore(max_parallel(options))
+    completed = asyncio.Queue()
+    results = [None] * len(chunks)
+
+    async def run(index):
+        try:
+            async with semaphore:
+                results[index] = await wrapped.call(node_type, module, chunks[index], node_options)
+            await completed.put((index, None))
+        except Exception as e:
+            await completed.put((index, e))
+
+    tasks = [asyncio.create_task(run(index)) for index in range(len(chunks))]
+    try:
+        for step in range(1, len(chunks) + 1):
+            index, error = await completed.get()
+            if error is not None:
+                print(f"Error processing chunk {index + 1} of {len(chunks)}: {str(error)}")
+                raise error
+            yield {"step": step, "total": len(chunks), "chunk": index, "result": results[index]}
+        yield results
+    finally:
+        # Stops the remaining chunks when a chunk fails or the run is cancelled
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def is_cacheable(options):
+    # As deterministic as the wrapped node
+    return wrapped.cacheable(options)
+
+def get_ui_config():
+    return {
+        "type": "Map Chunks",
+        "execution": "io",
+        "fields": [
+            {
+                "name": "node_type",
+                "type": "text",
+                "label": "Node Type",
+                "placeholder": "GPT Node"
+            },
+            {
+                "name": "node_options",
+                "type": "textarea",
+                "label": "Node Options (JSON)",
+                "placeholder": "{\"model\": \"gpt-4o-mini\", \"use_custom_input\": true, \"custom_input\": \"Summarize: {input}\"}"
+            },
+            {
+                "name": "max_parallel",
+                "type": "number",
+                "label": "Max Parallel Chunks",
+                "default": 4,
+                "min": 1,
+                "max": 64
+            }
+        ]
+    }
@@ -0,0 +1,62 @@
+from app.pipelines import wrapped
+
+def merge(input_data, separator):
+    # The results of a Map Chunks node joined in the order of their chunks
+    if not isinstance(input_data, list):
+        return str(input_data or '')
+    return separator.join(str(result) for result in input_data if result is not None)
+
+def separator_of(options):
+    separator = options.get('separator')
+    return "\n\n" if separator is None else str(separator).replace('\\n', '\n')
+
+def process(input_data, options):
+    merged = merge(input_data, separator_of(options))
+    node = wrapped.load(options)
+    if node is None:
+        return merged
+    _, module, node_options = node
+    return module.process(merged, node_options)
+
+async def async_process(input_data, options):
+    # Merges the chunk results; with a node type configured, that node then
+    # combines the merged text (e.g. a final summary of the chunk summaries)
+    # and its output is streamed
+    merged = merge(input_data, separator_of(options))
+    node = await wrapped.load_async(options)
+    if node is None:
+        yield merged
+        return
+    _, module, node_options = node
+    async for output in wrapped.stream(module, merged, node_options):
+        yield output
+
+def is_cacheable(options):
+    # As deterministic as the wrapped node
+    return wrapped.cacheable(options)
+
+def get_ui_config():
+    return {
+        "type": "Reduce Chunks",
+        "execution": "inline",
+        "fields": [
+            {
+                "name": "separator",
+                "type": "text",
+                "label": "Separator",
+                "placeholder": "\\n\\n"
+            },
+            {
+                "name": "node_type",
+                "type": "text",
+                "label": "Combine With Node Type (optional)",
+                "placeholder": "GPT Node"
+            },
+            {
+                "name": "node_options",
+                "type": "textarea",
+                "label": "Node Options (JSON)",
+                "placeholder": "{\"use_custom_input\": true, \"custom_input\": \"Combine these summaries: {input}\"}"
+            }
+        ]
+    }
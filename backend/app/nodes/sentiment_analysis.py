@@ -1,11 +1,16 @@
-def process(input_data, options):
-    positive_words = set(['good', 'great', 'excellent', 'happy', 'positive'])
-    negative_words = set(['bad', 'awful', 'terrible', 'sad', 'negative'])
-    
-    words = input_data.lower().split()
-    positive_count = sum(1 for word in words if word in positive_words)
-    negative_count = sum(1 for word in words if word in negative_words)
-    
+import numpy as np
+from itertools import repeat
+
+POSITIVE_WORDS = frozenset(['good', 'great', 'excellent', 'happy', 'positive'])
+NEGATIVE_WORDS = frozenset(['bad', 'awful', 'terrible', 'sad', 'negative'])
+# Codes of the words that count, for process_batch; the separator word
+# marks where one row ends and the next begins
+ROW_SEPARATOR = ' \x00 '
+SEPARATOR_CODE = 2
+WORD_CODES = {**{word: 1 for word in POSITIVE_WORDS}, **{word: -1 for word in NEGATIVE_WORDS}, '\x00': SEPARATOR_CODE}
+LABELS = np.array(["Negative", "Neutral", "Positive"], dtype=object)
+
+def classify(positive_count, negative_count):
     if positive_count > negative_count:
         return "Positive"
     elif negative_count > positive_count:
@@ -13,8 +18,51 @@ def process(input_data, options):
     else:
         return "Neutral"
 
+def process(input_data, options):
+    words = input_data.lower().split()
+    positive_count = sum(1 for word in words if word in POSITIVE_WORDS)
+    negative_count = sum(1 for word in words if word in NEGATIVE_WORDS)
+    return classify(positive_count, negative_count)
+
+def process_batch(inputs, options):
+    # All rows are lowercased and split in one go, with a separator word
+    # between rows; each word is scored (+1 positive, -1 negative) and the
+    # scores are summed per row from their running total
+    text = ROW_SEPARATOR.join(inputs)
+    if text.count('\x00') != len(inputs) - 1:
+        # A row contains the separator itself
+        return [process(row, options) for row in inputs]
+    words = text.lower().split()
+    codes = np.fromiter(map(WORD_CODES.get, words, repeat(0)), dtype=np.int8, count=len(words))
+    separators = codes == SEPARATOR_CODE
+    running = np.concatenate(([0], np.cumsum(np.where(separators, 0, codes), dtype=np.int64)))
+    ends = np.append(np.flatnonzero(separators), len(codes))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    return LABELS[np.sign(running[ends] - running[starts]) + 1].tolist()
+
+async def stream_process(chunks, options):
+    # Count complete words as they arrive; the trailing part of a chunk may
+    # continue in the next one, so it is carried over
+    positive_count = 0
+    negative_count = 0
+    carry = ''
+    async for chunk in chunks:
+        text = carry + chunk
+        words = text.lower().split()
+        carry = ''
+        if words and text and not text[-1].isspace():
+            carry = words.pop()
+        positive_count += sum(1 for word in words if word in POSITIVE_WORDS)
+        negative_count += sum(1 for word in words if word in NEGATIVE_WORDS)
+        yield {"partial": classify(positive_count, negative_count)}
+    positive_count += carry in POSITIVE_WORDS
+    negative_count += carry in NEGATIVE_WORDS
+    yield classify(positive_count, negative_count)
+
 def get_ui_config():
     return {
         "type": "Sentiment Analysis",
+        "execution": "inline",
+        "cacheable": True,
         "fields": []
     }
\ No newline at end of file
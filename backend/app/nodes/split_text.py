@@ -0,0 +1,80 @@
+# Tokens are estimated the way the provider limiter does: about four
+# characters each
+CHARS_PER_TOKEN = 4
+# Chunks end at the last of these breaks in their second half, if any
+BREAKS = ("\n\n", "\n", ". ", "? ", "! ", " ")
+
+def chunk_end(text, start, end):
+    if end >= len(text):
+        return len(text)
+    lowest = start + (end - start) // 2
+    for separator in BREAKS:
+        index = text.rfind(separator, lowest, end)
+        if index != -1:
+            return index + len(separator)
+    return end
+
+def split(text, size, overlap=0):
+    # Chunks of at most `size` characters; each one starts `overlap`
+    # characters (rounded back to the start of a word) before the previous
+    # one ended
+    size = max(1, size)
+    overlap = min(max(0, overlap), size // 2)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = chunk_end(text, start, start + size)
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        next_start = end - overlap
+        if overlap:
+            space = text.rfind(' ', start, next_start)
+            if space != -1:
+                next_start = space + 1
+            elif text[end - 1].isspace():
+                # The chunk is a single word: no overlap
+                next_start = end
+        start = max(next_start, start + 1)
+    return chunks
+
+def process(input_data, options):
+    text = ' '.join(map(str, input_data)) if isinstance(input_data, list) else str(input_data or '')
+    scale = CHARS_PER_TOKEN if options.get('unit', 'tokens') == 'tokens' else 1
+    size = int(float(options.get('chunk_size', 1000) or 1000)) * scale
+    overlap = int(float(options.get('overlap', 100) or 0)) * scale
+    return split(text, size, overlap)
+
+def get_ui_config():
+    return {
+        "type": "Split Text",
+        "execution": "inline",
+        "cacheable": True,
+        "fields": [
+            {
+                "name": "chunk_size",
+                "type": "number",
+                "label": "Chunk Size",
+                "default": 1000,
+                "min": 1
+            },
+            {
+                "name": "overlap",
+                "type": "number",
+                "label": "Overlap",
+                "default": 100,
+                "min": 0
+            },
+            {
+                "name": "unit",
+                "type": "select",
+                "label": "Unit",
+                "options": [
+                    {"value": "tokens", "label": "Tokens"},
+                    {"value": "characters", "label": "Characters"}
+                ]
+            }
+        ]
+    }
@@ -3,8 +3,29 @@ def process(input_data, options):
     char_count = len(input_data)
     return f"Word count: {word_count}, Character count: {char_count}"
 
+def process_batch(inputs, options):
+    return [f"Word count: {len(row.split())}, Character count: {len(row)}" for row in inputs]
+
+async def stream_process(chunks, options):
+    # Running counts; a word split across two chunks is only counted once
+    word_count = 0
+    char_count = 0
+    in_word = False
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        char_count += len(chunk)
+        word_count += len(chunk.split())
+        if in_word and not chunk[0].isspace():
+            word_count -= 1
+        in_word = not chunk[-1].isspace()
+        yield {"partial": f"Word count: {word_count}, Character count: {char_count}"}
+    yield f"Word count: {word_count}, Character count: {char_count}"
+
 def get_ui_config():
     return {
         "type": "Text Analysis",
+        "execution": "inline",
+        "cacheable": True,
         "fields": []
     }
\ No newline at end of file
@@ -5,9 +5,33 @@ def process(input_data, options):
         input_data = input_data[::-1]
     return input_data
 
+def process_batch(inputs, options):
+    # The options are looked at once for all rows
+    rows = list(inputs)
+    if options.get('to_uppercase', False):
+        rows = [row.upper() for row in rows]
+    if options.get('reverse', False):
+        rows = [row[::-1] for row in rows]
+    return rows
+
+def can_stream(options):
+    # Reversing needs the whole text
+    return not options.get('reverse', False)
+
+async def stream_process(chunks, options):
+    parts = []
+    async for chunk in chunks:
+        if options.get('to_uppercase', False):
+            chunk = chunk.upper()
+        parts.append(chunk)
+        yield {"delta": chunk}
+    yield ''.join(parts)
+
 def get_ui_config():
     return {
         "type": "Text Transformation",
+        "execution": "inline",
+        "cacheable": True,
         "fields": [
             {
                 "name": "to_uppercase",
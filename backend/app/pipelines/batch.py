@@ -0,0 +1,332 @@
+# backend/app/pipelines/batch.py
+
+import os
+import csv
+import json
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from app.pipelines.dynamic_pipeline import execute_pipeline, UpstreamError
+from app.pipelines.plan import get_plan, JOIN_VALUE, JOIN_EXPLICIT, JOIN_NONE
+from app.pipelines import executors, registry
+from app.services import provider_limits
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+# Pipelines whose nodes all implement process_batch are executed column-wise,
+# this many rows at a time
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "1000"))
+# Bounds for the batch jobs kept for /batch/<batch_id>: finished jobs are
+# dropped after BATCH_JOB_TTL seconds, and the oldest finished ones once
+# there are more than BATCH_MAX_JOBS
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "1000"))
+BATCH_JOB_TTL = float(os.getenv("BATCH_JOB_TTL", "86400"))
+
+# Marks the cells of rows for which a node failed
+_FAILED = object()
+
+class BatchJob:
+    def __init__(self, input_path, output_path):
+        self.batch_id = uuid.uuid4().hex
+        self.input_path = input_path
+        self.output_path = output_path
+        self.status = "pending"
+        self.error = None
+        self.rows_done = 0
+        self.rows_failed = 0
+        self.rows_skipped = 0
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0
+        return {
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "error": self.error,
+            "input_path": self.input_path,
+            "output_path": self.output_path,
+            "rows_done": self.rows_done,
+            "rows_failed": self.rows_failed,
+            "rows_skipped": self.rows_skipped,
+            "elapsed": elapsed,
+            "rows_per_second": self.rows_done / elapsed if elapsed else 0,
+        }
+
+class BatchJobStore:
+    def __init__(self, max_jobs=BATCH_MAX_JOBS, ttl=BATCH_JOB_TTL):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+
+    def add(self, job):
+        self.expire()
+        self._jobs[job.batch_id] = job
+        self._evict()
+
+    def get(self, batch_id):
+        self.expire()
+        return self._jobs.get(batch_id)
+
+    def expire(self):
+        deadline = time.time() - self.ttl
+        for batch_id, job in list(self._jobs.items()):
+            if job.finished is not None and job.finished < deadline:
+                del self._jobs[batch_id]
+
+    def _evict(self):
+        # Jobs that are still pending or running are never evicted
+        for batch_id, job in list(self._jobs.items()):
+            if len(self._jobs) <= self.max_jobs:
+                return
+            if job.finished is not None:
+                del self._jobs[batch_id]
+
+    def __len__(self):
+        return len(self._jobs)
+
+def batch_settings(concurrency, rate_limits):
+    # (concurrency, requests per minute per provider) of a batch; raises
+    # ValueError for invalid ones
+    try:
+        concurrency = int(concurrency)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid concurrency {concurrency!r}, expected a number of rows")
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1")
+    return concurrency, provider_limits.parse_request_limits(rate_limits)
+
+def read_rows(path):
+    # Yields (offset, row) lazily so that inputs of any size can be streamed.
+    # CSV rows are dicts keyed by column; JSONL rows are whatever each line holds.
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            for offset, row in enumerate(csv.DictReader(f)):
+                yield offset, row
+        else:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    yield offset, json.loads(line)
+                    offset += 1
+
+def completed_rows(output_path):
+    # Offsets already present in an output file, used to resume after a crash
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['row'])
+            except (ValueError, KeyError):
+                continue  # partially written last line
+    return done
+
+def row_inputs(plan, row, input_field='input'):
+    # Values fed into the pipeline's Input Nodes for a row. A dict row can
+    # address Input Nodes by id; otherwise its `input_field` (or the row itself)
+    # is used.
+    inputs = {}
+    for node in plan.nodes:
+        if node['type'] == 'Input Node':
+            if isinstance(row, dict):
+                inputs[node['id']] = row.get(node['id'], row.get(input_field, ''))
+            else:
+                inputs[node['id']] = row
+    return inputs
+
+async def run_row(config, offset, row, input_field='input', plan=None):
+    # Every row runs the same compiled plan; only the inputs change
+    plan = plan or get_plan(config)
+    results = {}
+    errors = {}
+    async for node_id, event in execute_pipeline(config, plan=plan,
+                                                 inputs=row_inputs(plan, row, input_field), targets=config.get('targets')):
+        if node_id is None or not isinstance(event, dict):
+            continue
+        if "error" in event:
+            errors[node_id] = event["error"]
+        elif "result" in event:
+            results[node_id] = event["result"]
+    return {"row": offset, "input": row, "results": results, "errors": errors}
+
+def load_batch_modules(plan, targets=None):
+    # Node implementations of a plan if every one of them (that the targets
+    # need) can process a whole column of rows, otherwise None
+    modules = {}
+    needed = set(plan.needed(targets))
+    for node in plan.nodes:
+        if node['id'] not in needed:
+            continue
+        try:
+            module = registry.get_node_module(node['type'])
+        except Exception:
+            return None  # reported per row by execute_pipeline
+        if not hasattr(module, 'process_batch'):
+            return None
+        modules[node['type']] = module
+    return modules
+
+async def process_column(module, column, options):
+    # Results of a node for a column of inputs; rows with the same input are
+    # only processed once. If the batch call fails, rows are retried one by
+    # one so that the error is only reported for the rows that cause it.
+    try:
+        distinct = list(dict.fromkeys(column))
+    except TypeError:
+        distinct = column  # unhashable inputs
+    try:
+        results = await executors.run_process_batch(module, distinct, options)
+        if len(results) != len(distinct):
+            raise ValueError(f"process_batch returned {len(results)} results for {len(distinct)} inputs")
+    except Exception as e:
+        print(f"Error in process_batch of {module.get_ui_config().get('type')}, processing rows one by one: {str(e)}")
+        results = []
+        for input_data in column:
+            try:
+                results.append(await executors.run_process(module, input_data, options))
+            except Exception as row_error:
+                results.append(row_error)
+        return results
+    if distinct is column:
+        return results
+    by_input = dict(zip(distinct, results))
+    return [by_input[input_data] for input_data in column]
+
+async def run_columns(plan, modules, chunk, input_field='input', targets=None):
+    # Runs a chunk of (offset, row) through the pipeline node by node, each
+    # node processing the inputs of all rows at once. Rows for which a node
+    # fails get its error and are left out of the nodes that depend on it.
+    records = [{"row": offset, "input": row, "results": {}, "errors": {}} for offset, row in chunk]
+    row_values = [row_inputs(plan, row, input_field) for _, row in chunk]
+    needed = set(plan.needed(targets))
+    columns = []
+    for i, node in enumerate(plan.nodes):
+        node_id = node['id']
+        if node_id not in needed:
+            # Pruned: no target depends on it
+            columns.append(None)
+            continue
+        join = plan.joins[i]
+        parents = plan.parents[i]
+        column = [_FAILED] * len(records)
+        rows = []
+        inputs = []
+        for r, record in enumerate(records):
+            upstream = next((parent for parent in parents if columns[parent][r] is _FAILED), None)
+            if upstream is not None:
+                record["errors"][node_id] = UpstreamError(plan.node_ids[upstream]).to_dict()
+                continue
+            if join == JOIN_VALUE:
+                input_data = row_values[r][node_id]
+            elif join == JOIN_EXPLICIT:
+                input_data = node['input']
+            elif join == JOIN_NONE:
+                input_data = ''
+            else:
+                input_data = [columns[parent][r] for parent in parents if columns[parent][r] is not None]
+                input_data = (input_data[0] if len(input_data) == 1 else ' '.join(input_data)) if input_data else ''
+            rows.append(r)
+            inputs.append(input_data)
+        if rows:
+            results = await process_column(modules[node['type']], inputs, node.get('options', {}))
+            for r, result in zip(rows, results):
+                if isinstance(result, Exception):
+                    records[r]["errors"][node_id] = {"type": "error", "message": str(result)}
+                else:
+                    column[r] = result
+                    records[r]["results"][node_id] = result
+        columns.append(column)
+    return records
+
+async def run_batch(config, input_path, output_path, concurrency=BATCH_CONCURRENCY, rate_limits=None,
+                    resume=False, start_offset=0, input_field='input', job=None):
+    job = job or BatchJob(input_path, output_path)
+    job.status = "running"
+    job.started = time.time()
+    queue = None
+    done = set()
+    plan = None
+    targets = config.get('targets')
+
+    def write(out, records):
+        out.write(''.join(json.dumps(record) + '\n' for record in records))
+        out.flush()
+        job.rows_done += len(records)
+        job.rows_failed += sum(1 for record in records if record["errors"])
+
+    async def worker(out):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            offset, row = item
+            try:
+                record = await run_row(config, offset, row, input_field, plan)
+            except Exception as e:
+                record = {"row": offset, "input": row, "results": {}, "errors": {"pipeline": {"type": "error", "message": str(e)}}}
+            write(out, [record])
+
+    def pending_rows():
+        for offset, row in read_rows(input_path):
+            if offset < start_offset or offset in done:
+                job.rows_skipped += 1
+                continue
+            yield offset, row
+
+    async def run_chunks(out, modules):
+        # Column-wise: every node processes the rows of a chunk at once
+        chunk = []
+        for item in pending_rows():
+            chunk.append(item)
+            if len(chunk) == BATCH_CHUNK_SIZE:
+                write(out, await run_columns(plan, modules, chunk, input_field, targets))
+                chunk = []
+        if chunk:
+            write(out, await run_columns(plan, modules, chunk, input_field, targets))
+
+    async def run_rows(out):
+        workers = [asyncio.create_task(worker(out)) for _ in range(concurrency)]
+        try:
+            for item in pending_rows():
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    try:
+        concurrency, rate_limits = batch_settings(concurrency, rate_limits)
+        done = completed_rows(output_path) if resume else set()
+        # Row by row, rows flow through a bounded queue to a fixed number of workers, so only
+        # about 2 * concurrency rows are held in memory at any time. Results are
+        # appended as soon as each row completes (not necessarily in input order).
+        queue = asyncio.Queue(maxsize=concurrency * 2)
+        plan = get_plan(config)
+        modules = await executors.run_in_thread(load_batch_modules, plan, targets)
+        # Rate limits lower the provider limits that every call goes through
+        # while the batch runs
+        with provider_limits.limit_requests(rate_limits), open(output_path, 'a+', encoding='utf-8') as out:
+            # Terminate a line left incomplete by a crash before appending
+            if out.tell() > 0:
+                out.seek(out.tell() - 1)
+                if out.read(1) != '\n':
+                    out.write('\n')
+            if modules is not None:
+                await run_chunks(out, modules)
+            else:
+                await run_rows(out)
+        job.status = "completed"
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+        raise
+    except Exception as e:
+        print(f"Error in batch {job.batch_id}: {str(e)}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished = time.time()
+    return job
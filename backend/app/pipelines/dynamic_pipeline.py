@@ -1,134 +1,451 @@
 # backend/app/pipelines/dynamic_pipeline.py
 
 import os
-import importlib.util
+import time
 import asyncio
-from collections import deque
-from dotenv import load_dotenv
-
-load_dotenv()
-
-def load_node_modules():
-    node_modules = {}
-    nodes_dir = os.path.join(os.path.dirname(__file__), '..', 'nodes')
-    print(f"Loading nodes from: {nodes_dir}")
-    for filename in os.listdir(nodes_dir):
-        if filename.endswith('.py'):
-            module_name = filename[:-3]
-            module_path = os.path.join(nodes_dir, filename)
-            print(f"Loading module: {module_name} from {module_path}")
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            if hasattr(module, 'process') and hasattr(module, 'get_ui_config'):
-                node_type = module.get_ui_config()['type']
-                print(f"Added node type: {node_type}")
-                node_modules[node_type] = module
-            else:
-                print(f"Module {module_name} does not have required attributes")
-    return node_modules
-
-NODE_MODULES = load_node_modules()
-
-async def execute_pipeline(config, start_node_id=None):
-    nodes = {node['id']: node for node in config['nodes']}
-    edges = config['edges']
-    
-    if not nodes:
-        raise ValueError("No nodes in the pipeline configuration")
-
-    # Create a graph representation
-    graph = {node: [] for node in nodes}
-    incoming_edges = {node: [] for node in nodes}
-    for edge in edges:
-        graph[edge['source']].append(edge['target'])
-        incoming_edges[edge['target']].append(edge['source'])
-    
-    # Topological sort
-    def topological_sort():
-        in_degree = {node: len(incoming) for node, incoming in incoming_edges.items()}
-        queue = deque([node for node, degree in in_degree.items() if degree == 0])
-        result = []
-        
-        while queue:
-            node = queue.popleft()
-            result.append(node)
-            for neighbor in graph.get(node, []):
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
-        
-        if len(result) != len(nodes):
-            raise ValueError("Graph has a cycle")
-        
-        return result
-
-    execution_order = topological_sort()
-
-    # Determine the execution order based on the start_node_id
+from app.pipelines.result_cache import result_cache, is_cacheable, make_key
+from app.pipelines.single_flight import single_flight
+from app.pipelines.incremental import RunState, node_signature, ancestors, descendants, dirty_nodes
+from app.pipelines import executors, registry
+from app.pipelines.plan import get_plan, plan_cache, JOIN_VALUE, JOIN_EXPLICIT, JOIN_NONE
+from app.services import provider_limits, metrics
+from app.services.artifacts import artifact_store, is_stale
+
+# Upper bound on how many nodes of a single run may execute at the same time.
+# Can be overridden per pipeline with the "maxConcurrency" config key.
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("PIPELINE_MAX_CONCURRENCY", "4"))
+
+def _final_value(result):
+    # Value handed to child nodes for what a node yielded last
+    if isinstance(result, dict) and result.get("is_final"):
+        return result.get("image") or result
+    return result
+
+def _is_intermediate(result):
+    # Partial output such as {"delta": "..."} tokens, {"partial": ...} running
+    # values or {"step": n} progress; the node's last other value is its result
+    return isinstance(result, dict) and not result.get("is_final") and any(key in result for key in ("delta", "partial", "step"))
+
+def _load_modules(node_types):
+    # Import the implementations of the given node types, remembering the error
+    # for node types that fail to load
+    modules = {}
+    for node_type in node_types:
+        try:
+            modules[node_type] = registry.get_node_module(node_type)
+        except Exception as e:
+            print(f"Error loading node type {node_type}: {str(e)}")
+            modules[node_type] = e
+    return modules
+
+class UpstreamError(Exception):
+    # Raised for nodes that can't run because a node they depend on failed
+    def __init__(self, upstream):
+        super().__init__(f"Upstream node {upstream} failed")
+        self.upstream = upstream
+
+    def to_dict(self):
+        return {"type": "upstream_error", "message": str(self), "upstream": self.upstream}
+
+def _error_info(error):
+    # Node errors are reported as {"type": ..., "message": ..., ...} dicts
+    if hasattr(error, 'to_dict'):
+        return error.to_dict()
+    if isinstance(error, dict):
+        return error
+    return {"type": "error", "message": str(error)}
+
+def _is_error_text(result):
+    # Provider nodes report failures as "Error..." strings; never cache those
+    return isinstance(result, str) and result.startswith("Error")
+
+# Number of chunks buffered on a streaming edge before the producing node
+# has to wait for its consumer to catch up
+STREAM_EDGE_BUFFER = int(os.getenv("PIPELINE_STREAM_EDGE_BUFFER", "64"))
+
+# Marker put on the event queue when a node has finished (successfully or not)
+_NODE_DONE = object()
+# Markers closing a streaming edge
+_EDGE_END = object()
+_EDGE_FAILED = object()
+
+async def execute_pipeline(config, start_node_id=None, max_concurrency=None, state=None,
+                           plan=None, inputs=None, completed=(), targets=None):
+    # `plan` is the compiled plan of `config` (looked up in the plan cache when
+    # not given); `inputs` maps Input Node ids to values replacing their own;
+    # `completed` are the nodes that already completed in an interrupted
+    # execution of the same run, which is resumed; `targets` are the nodes
+    # whose results are requested (all nodes by default)
+    run_started = time.monotonic()
+    if plan is None:
+        plan = get_plan(config)
+    inputs = inputs or {}
+    nodes = plan.nodes_by_id
+    graph = plan.graph
+    incoming_edges = plan.incoming_edges
+    execution_order = plan.node_ids
+
+    # Node implementations are imported on first use, off the event loop,
+    # together with the node types wrapped by nodes such as Map Chunks
+    node_types = {node['type'] for node in plan.nodes}
+    wrapped_types = {node.get('options', {}).get('node_type') for node in plan.nodes}
+    wrapped_types = {node_type for node_type in wrapped_types if node_type and isinstance(node_type, str)} - node_types
+    if all(registry.is_loaded(node_type) for node_type in node_types | wrapped_types):
+        modules = _load_modules(node_types)
+    else:
+        modules = await executors.run_in_thread(_load_modules, node_types)
+        await executors.run_in_thread(_load_modules, wrapped_types)
+    load_errors = {node_type: module for node_type, module in modules.items() if isinstance(module, Exception)}
+    for node_type in load_errors:
+        modules[node_type] = None
+    prepared = plan.prepare(modules)
+
+    # Restrict the run to the start node, everything it depends on and
+    # everything that depends on it
     if start_node_id:
         if start_node_id not in nodes:
             raise ValueError(f"Start node {start_node_id} not found in the pipeline configuration")
-        start_index = execution_order.index(start_node_id)
-        execution_order = execution_order[start_index:]
+        scope = {start_node_id} | ancestors(incoming_edges, [start_node_id]) | descendants(graph, [start_node_id])
+        execution_order = [node_id for node_id in execution_order if node_id in scope]
+
+    # Only compute the targets and the nodes they depend on. Pruned nodes,
+    # e.g. a branch that isn't previewed, are not executed at all.
+    pruned = []
+    if targets:
+        unknown = [target for target in targets if target not in nodes]
+        if unknown:
+            raise ValueError(f"Target node {unknown[0]} not found in the pipeline configuration")
+        needed = set(plan.needed(targets))
+        pruned = [node_id for node_id in execution_order if node_id not in needed]
+        execution_order = [node_id for node_id in execution_order if node_id in needed]
+
+    # Only recompute nodes that changed since the previous run of this pipeline
+    # (and their descendants); everything else reuses its retained result. The
+    # start node is always recomputed, unless a resumed run already did.
+    if state is None:
+        state = RunState()
+    state.prune(nodes)
+    signatures = prepared["signatures"]
+    if inputs:
+        signatures = dict(signatures)
+        for node_id, value in inputs.items():
+            node = nodes[node_id]
+            signatures[node_id] = node_signature({**node, 'input': None, 'options': {**node.get('options', {}), 'value': value}},
+                                                 incoming_edges[node_id], modules.get(node['type']))
+    forced = [start_node_id] if start_node_id and start_node_id not in completed else []
+    # Results whose artifacts have been evicted from the store are recomputed
+    forced += [node_id for node_id in execution_order if is_stale(state.payloads.get(node_id))]
+    dirty = dirty_nodes(execution_order, graph, signatures, state, forced=forced)
+    reused = [node_id for node_id in execution_order if node_id not in dirty]
+    # Pruned nodes downstream of recomputed ones are out of date: they are
+    # recomputed the next time they are needed
+    outdated = descendants(graph, dirty)
+    for node_id in pruned:
+        if node_id in outdated:
+            state.forget(node_id)
+    execution_order = [node_id for node_id in execution_order if node_id in dirty]
+
+    if max_concurrency is None:
+        max_concurrency = config.get('maxConcurrency') or DEFAULT_MAX_CONCURRENCY
+    max_concurrency = max(1, int(max_concurrency))
 
     # Execute pipeline
-    results = {}
-    processed = set()
+    results = {node_id: state.results[node_id] for node_id in reused}
+    payloads = {}
+    failed = set()
+    node_metrics = {}
 
-    async def process_node(node_id):
-        if node_id in processed:
-            yield node_id, results.get(node_id)
-            return
+    # Streaming edges: a node with a single parent that can stream its output
+    # and which itself can consume input chunk by chunk is started together
+    # with that parent and reads the parent's deltas from a bounded queue.
+    stream_sources = {}
+    stream_edges = {}
+    dirty_set = set(execution_order)
+    for node_id, parent in prepared["stream_candidates"].items():
+        if node_id in dirty_set and parent in dirty_set:
+            stream_sources[node_id] = parent
+            stream_edges.setdefault(parent, []).append((node_id, asyncio.Queue(maxsize=STREAM_EDGE_BUFFER)))
+    streamed = set()
+
+    async def read_edge(node_id, queue, collected):
+        while True:
+            chunk = await queue.get()
+            if chunk is _EDGE_END:
+                node_metrics[node_id].input_bytes = sum(metrics.size_of(chunk) for chunk in collected)
+                return
+            if chunk is _EDGE_FAILED:
+                raise UpstreamError(stream_sources[node_id])
+            collected.append(chunk)
+            yield chunk
+
+    detached = set()
+
+    def detach_edge(node_id):
+        # The consumer stopped reading (finished early or failed): unblock its
+        # parent and stop feeding the edge
+        detached.add(node_id)
+        for child, queue in stream_edges.get(stream_sources[node_id], []):
+            if child == node_id:
+                while not queue.empty():
+                    queue.get_nowait()
+
+    async def close_edges(node_id):
+        for child, queue in stream_edges.get(node_id, []):
+            if child in detached:
+                continue
+            if node_id in failed or node_id not in results:
+                await queue.put(_EDGE_FAILED)
+                continue
+            if node_id not in streamed:
+                # The parent produced its result in one piece
+                await queue.put(str(results[node_id]))
+            await queue.put(_EDGE_END)
 
+    async def process_node(node_id):
         node = nodes[node_id]
-        module = NODE_MODULES.get(node['type'])
+        module = modules.get(node['type'])
+        if node['type'] in load_errors:
+            failed.add(node_id)
+            yield node_id, {"error": {"type": "load_error", "message": f"Failed to load node type {node['type']}: {load_errors[node['type']]}"}}
+            return
         if not module:
             result = f"Unknown node type: {node['type']}"
             results[node_id] = result
-            processed.add(node_id)
+            payloads[node_id] = result
             yield node_id, result
             return
 
-        if node['type'] == 'Input Node':
-            input_data = node.get('input') or node.get('options', {}).get('value', '')
+        options = node.get('options', {})
+        if node_id in inputs:
+            # Input Nodes fed with another value, e.g. a batch row
+            options = {**options, 'value': inputs[node_id]}
+        cache_key = None
+        collected = None
+
+        if node_id in stream_sources:
+            # Input arrives chunk by chunk from the parent while it is running
+            collected = []
+            queue = next(q for child, q in stream_edges[stream_sources[node_id]] if child == node_id)
+            outputs = module.stream_process(read_edge(node_id, queue, collected), options)
         else:
-            if node.get('input') is not None:
+            join = plan.join_by_id[node_id]
+            if join == JOIN_VALUE:
+                input_data = inputs[node_id] if node_id in inputs else node.get('input') or options.get('value', '')
+            elif join == JOIN_EXPLICIT:
                 input_data = node['input']
+            elif join == JOIN_NONE:
+                input_data = ''  # Use empty string for nodes without inputs
             else:
-                parents = incoming_edges.get(node_id, [])
-                if not parents:
-                    input_data = ''  # Use empty string for nodes without inputs
+                input_data = [results[parent] for parent in incoming_edges[node_id] if results.get(parent) is not None]
+                if not input_data:
+                    input_data = ''  # Use empty string if all parents were skipped
                 else:
-                    input_data = []
-                    for parent in parents:
-                        parent_result = results.get(parent)
-                        if parent_result is not None:
-                            input_data.append(parent_result)
-                    if not input_data:
-                        input_data = ''  # Use empty string if all parents were skipped
-                    else:
-                        input_data = input_data[0] if len(input_data) == 1 else ' '.join(input_data)
-
-        if hasattr(module, 'async_process'):
-            async for result in module.async_process(input_data, node.get('options', {})):
+                    input_data = input_data[0] if len(input_data) == 1 else ' '.join(input_data)
+            node_metrics[node_id].input_bytes = metrics.size_of(input_data)
+
+            # Serve deterministic nodes from the result cache. Nodes can opt out
+            # individually with "cache": false in their configuration.
+            if result_cache is not None and node.get('cache', True) and is_cacheable(module, options):
+                cache_key = make_key(node['type'], module, options, input_data)
+                hit, cached = await result_cache.get_async(cache_key)
+                if hit and is_stale(cached):
+                    hit = False
+                metrics.node_cache.inc(node_type=node['type'], result="hit" if hit else "miss")
+                if hit:
+                    node_metrics[node_id].cached = True
+                    results[node_id] = _final_value(cached)
+                    payloads[node_id] = cached
+                    yield node_id, {"result": cached, "cached": True}
+                    return
+
+            if not hasattr(module, 'async_process'):
+                outputs = None
+            elif single_flight is not None and node.get('dedupe', True):
+                # Join an identical call of another run that is in flight
+                # instead of making it again. Nodes can opt out with
+                # "dedupe": false in their configuration.
+                outputs, shared = single_flight.join(
+                    cache_key or make_key(node['type'], module, options, input_data),
+                    lambda: module.async_process(input_data, options),
+                )
+                node_metrics[node_id].shared = shared
+                metrics.node_single_flight.inc(node_type=node['type'], result="shared" if shared else "call")
+            else:
+                outputs = module.async_process(input_data, options)
+
+        final = None
+        if outputs is not None:
+            async for result in outputs:
                 if isinstance(result, dict) and "error" in result:
-                    yield node_id, {"error": result["error"]}
+                    failed.add(node_id)
+                    yield node_id, {"error": _error_info(result["error"])}
                     break
+                if _is_intermediate(result):
+                    # Streamed tokens or progress updates, forwarded as they come
+                    yield node_id, {"intermediate": result}
+                    if "delta" in result:
+                        streamed.add(node_id)
+                        for child, queue in stream_edges.get(node_id, []):
+                            if child not in detached:
+                                await queue.put(result["delta"])
+                    continue
                 yield node_id, {"result": result}
-                if isinstance(result, dict) and result.get("is_final"):
-                    results[node_id] = result.get("image") or result
+                final = result
+                results[node_id] = _final_value(result)
         else:
-            result = module.process(input_data, node.get('options', {}))
-            results[node_id] = result
-            yield node_id, {"result": result}
+            # Blocking and CPU-heavy nodes run in pools so they don't stall
+            # the event loop (and every other stream served by it)
+            final = await executors.run_process(module, input_data, options)
+            results[node_id] = final
+            yield node_id, {"result": final}
+        payloads[node_id] = final
+
+        if collected is not None and result_cache is not None and node.get('cache', True) and is_cacheable(module, options):
+            # The input of a streaming node is only known once it has finished
+            cache_key = make_key(node['type'], module, options, ''.join(collected))
+        if cache_key is not None and node_id not in failed and not _is_error_text(final):
+            await result_cache.set_async(cache_key, final)
+
+    # Ready-queue scheduler: a node is started as soon as all of its parents that
+    # are part of this run have finished, so independent branches run concurrently.
+    # Events from running nodes are funnelled through a single queue so that the
+    # caller sees them interleaved in the order they were produced.
+    scheduled = set(execution_order)
+    remaining_parents = {
+        node_id: sum(1 for parent in incoming_edges[node_id] if parent in scheduled)
+        for node_id in execution_order
+        if node_id not in stream_sources
+    }
+    events = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = {}
+
+    # Calls to providers are queued fairly across runs
+    run_key = object()
+
+    def measured(node_id, event):
+        # Attach the node's timings to its result (or error) event
+        node_stats = node_metrics[node_id]
+        if isinstance(event, dict) and "intermediate" in event:
+            node_stats.chunk()
+            return node_id, event
+        if isinstance(event, dict) and ("result" in event or "error" in event):
+            node_stats.finish(event.get("result"))
+            return node_id, {**event, "metrics": node_stats.to_dict()}
+        node_stats.finish(event)
+        return node_id, event
+
+    async def run_node(node_id):
+        provider_limits.current_run.set(run_key)
+        node_stats = node_metrics[node_id]
+        metrics.current_node.set(node_stats)
+        try:
+            executed = True
+            try:
+                upstream = next((parent for parent in incoming_edges[node_id] if parent in failed), None)
+                if upstream is not None:
+                    # Don't run a node on the output of a failed one
+                    node_stats.start()
+                    raise UpstreamError(upstream)
+                if node_id in stream_sources:
+                    # Streaming consumers don't take a concurrency slot: they only
+                    # make progress while their parent (which holds one) does.
+                    node_stats.start()
+                    async for item in process_node(node_id):
+                        await events.put(measured(*item))
+                else:
+                    async with semaphore:
+                        node_stats.start()
+                        async for item in process_node(node_id):
+                            await events.put(measured(*item))
+            except Exception as e:
+                if isinstance(e, UpstreamError):
+                    executed = False
+                else:
+                    print(f"Error processing node {node_id}: {str(e)}")
+                failed.add(node_id)
+                await events.put(measured(node_id, {"error": _error_info(e)}))
+            if executed:
+                node_stats.observe("error" if node_id in failed else "cached" if node_stats.cached else "ok")
+            await close_edges(node_id)
+        finally:
+            if node_id in stream_sources:
+                detach_edge(node_id)
+            await events.put((node_id, _NODE_DONE))
+
+    def by_priority(node_ids):
+        return sorted(node_ids, key=lambda node_id: (-plan.critical_by_id[node_id], plan.index[node_id]))
+
+    def start_node(node_id):
+        node_metrics[node_id] = metrics.NodeMetrics(nodes[node_id]['type'])
+        tasks[node_id] = asyncio.create_task(run_node(node_id))
+        for child, _ in stream_edges.get(node_id, []):
+            start_node(child)
+
+    yield None, {"plan": {"reused": reused, "recomputed": execution_order, "pruned": pruned}}
+    for node_id in reused:
+        yield node_id, {"result": state.payloads[node_id], "reused": True}
+
+    try:
+        # Nodes that become ready together are started longest critical path
+        # first (ties in topological order), so the slowest chain isn't queued
+        # behind short branches
+        for node_id in by_priority(node_id for node_id in execution_order if remaining_parents.get(node_id) == 0):
+            start_node(node_id)
+
+        while tasks:
+            node_id, event = await events.get()
+            if event is not _NODE_DONE:
+                yield node_id, event
+                continue
+
+            del tasks[node_id]
+            if node_id in failed or node_id not in results or _is_error_text(results[node_id]):
+                state.forget(node_id)
+            else:
+                state.retain(node_id, signatures[node_id], results[node_id], payloads.get(node_id))
+            ready = []
+            for child in graph[node_id]:
+                if child in remaining_parents:
+                    remaining_parents[child] -= 1
+                    if remaining_parents[child] == 0:
+                        ready.append(child)
+            for child in by_priority(ready):
+                start_node(child)
 
-        processed.add(node_id)
+        # Run totals, e.g. to tell what a run cost
+        duration = time.monotonic() - run_started
+        metrics.run_duration.observe(duration, status="error" if failed else "ok")
+        usage = {}
+        for node_stats in node_metrics.values():
+            for kind, tokens in node_stats.usage.items():
+                usage[kind] = usage.get(kind, 0) + tokens
+        yield None, {"metrics": {
+            "duration": duration,
+            "executed": len(node_metrics),
+            "reused": len(reused),
+            "cached": sum(1 for node_stats in node_metrics.values() if node_stats.cached),
+            "shared": sum(1 for node_stats in node_metrics.values() if node_stats.shared),
+            "failed": len(failed),
+            "usage": usage,
+        }}
+    finally:
+        # The consumer went away (e.g. the SSE client disconnected) or a node
+        # raised: make sure no node keeps running in the background.
+        pending = list(tasks.values())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
-    # Process nodes in topological order
-    for node_id in execution_order:
-        async for intermediate_node_id, intermediate_result in process_node(node_id):
-            yield intermediate_node_id, intermediate_result
+def get_stats():
+    return {
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "single_flight": single_flight.stats() if single_flight is not None else None,
+        "executors": executors.get_stats(),
+        "plans": plan_cache.stats(),
+        "artifacts": artifact_store.stats(),
+    }
 
 def get_node_types():
-    return {node_type: module.get_ui_config() for node_type, module in NODE_MODULES.items()}
\ No newline at end of file
+    # Served from the node manifest, without importing any node implementation
+    return registry.get_node_types()
\ No newline at end of file
@@ -0,0 +1,190 @@
+# backend/app/pipelines/executors.py
+
+import os
+import time
+import asyncio
+import threading
+import contextvars
+import importlib.util
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from app.services import metrics
+
+# How a node's synchronous `process` function is run, declared with the
+# "execution" key of its UI config:
+#   "inline" - cheap pure-Python work, called directly on the event loop
+#   "io"     - blocking calls (network, disk), run in a bounded thread pool
+#   "cpu"    - heavy computation, run in a process pool to sidestep the GIL
+# Nodes that don't declare anything are treated as "io".
+EXECUTION_CLASSES = ("inline", "io", "cpu")
+NODE_THREAD_POOL_SIZE = int(os.getenv("NODE_THREAD_POOL_SIZE", "16"))
+NODE_PROCESS_POOL_SIZE = int(os.getenv("NODE_PROCESS_POOL_SIZE", str(os.cpu_count() or 2)))
+
+class PoolStats:
+    def __init__(self, size):
+        self.size = size
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def submitted(self):
+        with self._lock:
+            self.queued += 1
+
+    def cancelled(self):
+        # A call cancelled before a worker picked it up
+        with self._lock:
+            self.queued -= 1
+
+    def started(self, wait):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def finished(self, ok):
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+            if not ok:
+                self.failed += 1
+
+    def to_dict(self):
+        with self._lock:
+            in_flight = self.active + self.queued
+            return {
+                "size": self.size,
+                "active": self.active,
+                "queued": self.queued,
+                "in_flight": in_flight,
+                "saturation": in_flight / self.size if self.size else 0,
+                "completed": self.completed,
+                "failed": self.failed,
+                "average_wait": self.total_wait / self.completed if self.completed else 0,
+                "max_wait": self.max_wait,
+            }
+
+_thread_pool = None
+_process_pool = None
+_pool_lock = threading.Lock()
+thread_stats = PoolStats(NODE_THREAD_POOL_SIZE)
+process_stats = PoolStats(NODE_PROCESS_POOL_SIZE)
+
+def thread_pool():
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=NODE_THREAD_POOL_SIZE, thread_name_prefix="node-io")
+        return _thread_pool
+
+def process_pool():
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            # spawn rather than fork: the server process has threads (and
+            # possibly a loaded model) that must not be duplicated
+            _process_pool = ProcessPoolExecutor(
+                max_workers=NODE_PROCESS_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+def execution_class(module):
+    execution = module.get_ui_config().get('execution', 'io')
+    return execution if execution in EXECUTION_CLASSES else 'io'
+
+async def run_in_thread(fn, *args):
+    # Run a blocking call in the shared thread pool and account for it. The
+    # call sees the caller's context variables (e.g. the node being measured).
+    thread_stats.submitted()
+    submitted = time.monotonic()
+    context = contextvars.copy_context()
+
+    def call():
+        thread_stats.started(time.monotonic() - submitted)
+        ok = False
+        try:
+            result = context.run(fn, *args)
+            ok = True
+            return result
+        finally:
+            thread_stats.finished(ok)
+
+    future = thread_pool().submit(call)
+    # Calls cancelled while queued (by their caller or a shutdown) never start
+    future.add_done_callback(lambda future: future.cancelled() and thread_stats.cancelled())
+    return await asyncio.wrap_future(future)
+
+_process_modules = {}
+
+def _call_in_process(module_path, function_name, args):
+    # Runs inside a pool process. Node modules are loaded from their file, as
+    # the pipeline does, and kept for subsequent calls. The start time lets
+    # the parent measure how long the call waited for a free process.
+    started = time.time()
+    module = _process_modules.get(module_path)
+    if module is None:
+        module_name = os.path.splitext(os.path.basename(module_path))[0]
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _process_modules[module_path] = module
+    return started, getattr(module, function_name)(*args)
+
+async def run_in_process(module, function_name, *args):
+    # Calls are counted as queued until they complete, as the parent can't see
+    # when a pool process picks them up; their wait is recorded afterwards
+    process_stats.submitted()
+    submitted = time.time()
+    ok = False
+    started = None
+    try:
+        future = process_pool().submit(_call_in_process, module.__file__, function_name, args)
+        started, result = await asyncio.wrap_future(future)
+        ok = True
+        return result
+    finally:
+        process_stats.started(max(0.0, (started or time.time()) - submitted))
+        process_stats.finished(ok)
+
+async def run_process(module, input_data, options):
+    # Run a node's synchronous process function according to its class
+    execution = execution_class(module)
+    if execution == 'inline':
+        return module.process(input_data, options)
+    if execution == 'cpu':
+        return await run_in_process(module, 'process', input_data, options)
+    return await run_in_thread(module.process, input_data, options)
+
+async def run_process_batch(module, inputs, options):
+    # The same for a node's process_batch over the inputs of many rows. Inline
+    # nodes get a thread too, as a whole column can take a while.
+    if execution_class(module) == 'cpu':
+        return await run_in_process(module, 'process_batch', inputs, options)
+    return await run_in_thread(module.process_batch, inputs, options)
+
+def get_stats():
+    return {"threads": thread_stats.to_dict(), "processes": process_stats.to_dict()}
+
+def _pool_gauge(field):
+    return lambda: {(pool,): stats[field] for pool, stats in get_stats().items()}
+
+# Saturation of the pools, as served by /metrics
+metrics.Gauge("pipeline_pool_size", "Workers of the node execution pools.", ["pool"], _pool_gauge("size"))
+metrics.Gauge("pipeline_pool_active", "Node calls executing in the pools.", ["pool"], _pool_gauge("active"))
+metrics.Gauge("pipeline_pool_queued", "Node calls waiting for a free worker of the pools.", ["pool"], _pool_gauge("queued"))
+
+def shutdown():
+    global _thread_pool, _process_pool
+    with _pool_lock:
+        if _thread_pool is not None:
+            _thread_pool.shutdown(wait=False, cancel_futures=True)
+            _thread_pool = None
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
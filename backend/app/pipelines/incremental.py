@@ -0,0 +1,68 @@
+# backend/app/pipelines/incremental.py
+
+import json
+import hashlib
+from collections import deque
+from app.pipelines.result_cache import code_version
+
+class RunState:
+    # Results retained from previous executions of a pipeline. A node whose
+    # signature is unchanged since it last completed can reuse its result
+    # instead of running again.
+    def __init__(self):
+        self.signatures = {}
+        self.results = {}   # value handed to child nodes
+        self.payloads = {}  # last payload yielded by the node, replayed to clients
+
+    def retain(self, node_id, signature, result, payload):
+        self.signatures[node_id] = signature
+        self.results[node_id] = result
+        self.payloads[node_id] = payload
+
+    def forget(self, node_id):
+        self.signatures.pop(node_id, None)
+        self.results.pop(node_id, None)
+        self.payloads.pop(node_id, None)
+
+    def prune(self, node_ids):
+        # Drop nodes that are no longer part of the pipeline
+        for node_id in list(self.signatures):
+            if node_id not in node_ids:
+                self.forget(node_id)
+
+def node_signature(node, parents, module=None):
+    # Everything that influences a node's own output apart from its parents'
+    # results; changes upstream are handled by marking descendants dirty.
+    payload = json.dumps(
+        [node['type'], node.get('options', {}), node.get('input'), list(parents),
+         code_version(module) if module is not None else ''],
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def descendants(graph, roots):
+    seen = set()
+    queue = deque(roots)
+    while queue:
+        for child in graph.get(queue.popleft(), []):
+            if child not in seen:
+                seen.add(child)
+                queue.append(child)
+    return seen
+
+def ancestors(incoming_edges, roots):
+    return descendants(incoming_edges, roots)
+
+def dirty_nodes(order, graph, signatures, state, forced=()):
+    # Nodes that changed (or were never computed) plus everything downstream
+    # of them. Every other node in `order` can reuse its retained result.
+    changed = {
+        node_id for node_id in order
+        if node_id in forced
+        or node_id not in state.results
+        or state.signatures.get(node_id) != signatures[node_id]
+    }
+    dirty = changed | descendants(graph, changed)
+    return {node_id for node_id in order if node_id in dirty}
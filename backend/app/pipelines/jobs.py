@@ -0,0 +1,315 @@
+# backend/app/pipelines/jobs.py
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+import threading
+import subprocess
+from app.pipelines import executors, registry
+from app.pipelines.journal import RUN_JOURNAL_PATH, RunJournal
+from app.pipelines.sessions import SessionStore
+from app.pipelines.runner import run_events
+from app.services import sse
+
+# With JOB_QUEUE enabled, /execute doesn't execute pipelines in the web
+# process. Runs are queued in the run journal's database and executed by
+# worker processes, which journal their events for the web process to stream
+# to clients. Workers are started with the server (JOB_WORKERS) or with
+# worker.py on any host that shares the database.
+JOB_QUEUE = os.getenv("JOB_QUEUE", "0") not in ("0", "false", "False")
+# Worker processes started with the server: a number of workers serving
+# every queue, or queue=count pairs, e.g. "default=2,gpu=1"
+JOB_WORKERS = os.getenv("JOB_WORKERS", "2")
+# Runs a worker executes at the same time
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "8"))
+# A job whose worker hasn't reported for this long is handed to another
+# worker, which resumes the run from its checkpoints
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "30"))
+# How often idle workers look for jobs and the web process for new events
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.05"))
+
+DEFAULT_QUEUE = "default"
+HEARTBEAT_INTERVAL = 1
+WORKER_SCRIPT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'worker.py'))
+
+def node_queue(node_type):
+    # Node types can route the runs they are part of to specialized workers
+    # with "queue" in their UI config, e.g. image models to GPU workers
+    ui_config = registry.get_ui_config(node_type) or {}
+    return ui_config.get('queue') or DEFAULT_QUEUE
+
+def queue_for(config):
+    for node in config.get('nodes', []):
+        queue = node_queue(node.get('type'))
+        if queue != DEFAULT_QUEUE:
+            return queue
+    return DEFAULT_QUEUE
+
+class JobQueue:
+    # Queue of runs to execute, kept in a sqlite table. Jobs are claimed by
+    # one worker at a time; a claim lasts as long as the worker keeps sending
+    # heartbeats. All calls block: use a thread when on the event loop.
+    def __init__(self, path=RUN_JOURNAL_PATH, lease=JOB_LEASE_SECONDS):
+        self.lease = lease
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "run_id TEXT PRIMARY KEY, queue TEXT, status TEXT, worker TEXT, cancel INTEGER DEFAULT 0, "
+            "created REAL, heartbeat REAL, targets TEXT)"
+        )
+        # Queues created before jobs had targets
+        if "targets" not in {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN targets TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, queue, created)")
+        self._lock = threading.Lock()
+        self.counters = {"enqueued": 0, "claimed": 0, "expired": 0, "cancelled": 0}
+
+    def enqueue(self, run_id, queue=DEFAULT_QUEUE, targets=None):
+        # Queues a run, unless it is queued or being executed already.
+        # `targets` restrict this execution of the run only.
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (run_id, queue, status, created, targets) VALUES (?, ?, 'queued', ?, ?) "
+                "ON CONFLICT (run_id) DO UPDATE SET queue = excluded.queue, status = 'queued', worker = NULL, "
+                "cancel = 0, created = excluded.created, targets = excluded.targets WHERE jobs.status = 'done'",
+                (run_id, queue, time.time(), json.dumps(targets) if targets else None),
+            )
+            self.counters["enqueued"] += 1
+
+    def claim(self, worker_id, queues=None):
+        # The run id of the oldest queued job of the given queues (any queue
+        # when None), or of a job whose worker stopped sending heartbeats
+        now = time.time()
+        queue_filter = ""
+        params = [now - self.lease]
+        if queues:
+            queue_filter = f" AND queue IN ({','.join('?' for _ in queues)})"
+            params += list(queues)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT run_id, status FROM jobs WHERE (status = 'queued' OR (status = 'claimed' AND heartbeat < ?))"
+                    + queue_filter + " ORDER BY created LIMIT 1",
+                    params,
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'claimed', worker = ?, heartbeat = ? WHERE run_id = ?",
+                        (worker_id, now, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        self.counters["claimed"] += 1
+        if row[1] == 'claimed':
+            print(f"Job {row[0]} lost its worker, resuming it")
+            self.counters["expired"] += 1
+        return row[0]
+
+    def targets(self, run_id):
+        # The targets the run was queued with, or None
+        with self._lock:
+            row = self._db.execute("SELECT targets FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def heartbeat(self, worker_id):
+        # Extends the claims of a worker and returns the ids of its runs that
+        # have been cancelled since
+        with self._lock:
+            self._db.execute("UPDATE jobs SET heartbeat = ? WHERE worker = ? AND status = 'claimed'", (time.time(), worker_id))
+            rows = self._db.execute(
+                "SELECT run_id FROM jobs WHERE worker = ? AND status = 'claimed' AND cancel = 1", (worker_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def finish(self, run_id):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'done' WHERE run_id = ?", (run_id,))
+
+    def release(self, run_id):
+        # Hands a claimed job back, e.g. when its worker shuts down
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE run_id = ? AND status = 'claimed'", (run_id,))
+
+    def cancel(self, run_id):
+        # Jobs that haven't been claimed yet are dropped, running ones are
+        # stopped by their worker
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'done' WHERE run_id = ? AND status = 'queued'", (run_id,))
+            self._db.execute("UPDATE jobs SET cancel = 1 WHERE run_id = ? AND status = 'claimed'", (run_id,))
+            self.counters["cancelled"] += 1
+
+    def is_done(self, run_id):
+        with self._lock:
+            row = self._db.execute("SELECT status FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+        return row is None or row[0] == 'done'
+
+    async def follow(self, journal, run_id, after=0, poll_interval=JOB_POLL_INTERVAL):
+        # Yields the (event id, encoded event) pairs a worker journals for a
+        # run, in lists, until the job is done; an empty list when nothing new
+        # has arrived
+        while True:
+            done = await executors.run_in_thread(self.is_done, run_id)
+            events = await executors.run_in_thread(journal.events, run_id, after)
+            if events:
+                after = events[-1][0]
+            elif done:
+                return
+            yield events
+            if not events:
+                await asyncio.sleep(poll_interval)
+
+    def stats(self):
+        with self._lock:
+            rows = self._db.execute("SELECT queue, status, COUNT(*) FROM jobs WHERE status != 'done' GROUP BY queue, status").fetchall()
+        stats = dict(self.counters)
+        stats["queues"] = {}
+        for queue, status, count in rows:
+            stats["queues"].setdefault(queue, {})[status] = count
+        return stats
+
+class Worker:
+    # Claims queued runs and executes them, up to `concurrency` at a time.
+    # Runs are restored from the journal, so they resume from the checkpoints
+    # of an earlier attempt, and their events are journaled for the web
+    # process.
+    def __init__(self, queues=None, concurrency=JOB_WORKER_CONCURRENCY, journal=None, jobs=None,
+                 poll_interval=JOB_POLL_INTERVAL):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.queues = queues
+        self.concurrency = max(1, concurrency)
+        self.journal = journal or RunJournal()
+        self.jobs = jobs or JobQueue(self.journal.path)
+        self.poll_interval = poll_interval
+        self._tasks = {}  # run id -> task
+        self._stopping = False
+
+    def serves(self, queue):
+        return not self.queues or queue in self.queues
+
+    def prewarm(self):
+        # Only the node types of PREWARM_NODES that are routed to this worker
+        node_types = [node_type.strip() for node_type in registry.PREWARM_NODES.split(',') if node_type.strip()]
+        if registry.PREWARM_NODES.strip() == 'all':
+            node_types = list(registry.get_node_types())
+        registry.prewarm([node_type for node_type in node_types if self.serves(node_queue(node_type))])
+
+    async def run(self):
+        print(f"Worker {self.worker_id} serving {', '.join(self.queues) if self.queues else 'all queues'}")
+        self.prewarm()
+        last_heartbeat = 0
+        try:
+            while True:
+                if len(self._tasks) < self.concurrency:
+                    run_id = await executors.run_in_thread(self.jobs.claim, self.worker_id, self.queues)
+                    if run_id is not None:
+                        self._tasks[run_id] = asyncio.create_task(self.execute(run_id))
+                        continue
+                if time.monotonic() - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    last_heartbeat = time.monotonic()
+                    for run_id in await executors.run_in_thread(self.jobs.heartbeat, self.worker_id):
+                        if run_id in self._tasks:
+                            print(f"Cancelling run {run_id}")
+                            self._tasks[run_id].cancel()
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            # Shutting down: runs in progress are handed back to the queue, to
+            # be resumed by another worker
+            self._stopping = True
+            tasks = list(self._tasks.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def execute(self, run_id):
+        # A fresh store, so the run and its pipeline's results are read from
+        # the journal rather than from an earlier job
+        sessions = SessionStore(journal=self.journal)
+        run = sessions.get_run(run_id)
+        status = "failed"
+        try:
+            if run is None:
+                print(f"Run {run_id} not found in the journal")
+                return
+            print(f"Executing run {run_id}")
+            targets = await executors.run_in_thread(self.jobs.targets, run_id)
+            sessions.start(run)
+            outcome = {"status": "failed"}
+
+            def record(event_id, data, event):
+                # Token deltas only reach the web process through the
+                # journal: they are kept until the run ends
+                run.last_event_id = event_id
+                self.journal.append_event(run_id, event_id, data, transient=sse.is_delta(event))
+
+            events = sse.stream(run_events(run, self.journal, outcome, targets), next_id=run.last_event_id + 1, record=record, heartbeat=0)
+            try:
+                async for _ in events:
+                    pass
+            finally:
+                await events.aclose()
+            status = outcome["status"]
+        except asyncio.CancelledError:
+            status = "interrupted" if self._stopping else "cancelled"
+            raise
+        finally:
+            if run is not None:
+                sessions.finish(run, status)
+                self.journal.drop_transient_events(run_id)
+            # Everything the run journaled is written before its job is done
+            self.journal.flush()
+            if status == "interrupted":
+                self.jobs.release(run_id)
+            else:
+                self.jobs.finish(run_id)
+            self._tasks.pop(run_id, None)
+
+def parse_workers(spec):
+    # "2" -> [(None, 2)], "default=2,gpu=1" -> [(["default"], 2), (["gpu"], 1)]
+    spec = (spec or '').strip()
+    if not spec:
+        return []
+    if spec.isdigit():
+        return [(None, int(spec))]
+    workers = []
+    for part in spec.split(','):
+        queue, count = part.split('=')
+        workers.append(([queue.strip()], int(count)))
+    return workers
+
+def start_workers(spec=JOB_WORKERS):
+    # Starts local worker processes running worker.py
+    processes = []
+    env = {**os.environ, "RUN_JOURNAL_PATH": os.path.abspath(RUN_JOURNAL_PATH)}
+    for queues, count in parse_workers(spec):
+        command = [sys.executable, WORKER_SCRIPT]
+        if queues:
+            command += ['--queues', ','.join(queues)]
+        for _ in range(count):
+            processes.append(subprocess.Popen(command, env=env))
+    if processes:
+        print(f"Started {len(processes)} pipeline workers")
+    return processes
+
+def stop_workers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+if JOB_QUEUE and not RUN_JOURNAL_PATH:
+    print("JOB_QUEUE requires the run journal (RUN_JOURNAL_PATH), executing runs in the web process")
+job_queue = JobQueue() if JOB_QUEUE and RUN_JOURNAL_PATH else None
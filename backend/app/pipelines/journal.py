@@ -0,0 +1,249 @@
+# backend/app/pipelines/journal.py
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from app.pipelines.incremental import RunState
+
+# Append-only journal of runs: their configuration and status, the events
+# sent to clients (so a client reconnecting with Last-Event-ID gets what it
+# missed) and a checkpoint of every node that completed, so that a run
+# interrupted by a disconnect or a server restart resumes where it stopped
+# instead of calling providers again. It is off unless RUN_JOURNAL_PATH
+# names the sqlite file to keep it in.
+RUN_JOURNAL_PATH = os.getenv("RUN_JOURNAL_PATH", "")
+# Runs that have not been updated for RUN_JOURNAL_TTL seconds are removed,
+# together with their events and the checkpoints of their pipelines
+RUN_JOURNAL_TTL = float(os.getenv("RUN_JOURNAL_TTL", str(7 * 24 * 3600)))
+# How often expired runs are looked for
+PRUNE_INTERVAL = 3600
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "run_id TEXT PRIMARY KEY, pipeline_id TEXT, tenant TEXT, config TEXT, status TEXT, created REAL, updated REAL)",
+    "CREATE INDEX IF NOT EXISTS runs_pipeline ON runs (pipeline_id)",
+    # A row without signature records that a node's result was dropped
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, pipeline_id TEXT, run_id TEXT, node_id TEXT, "
+    "signature TEXT, result TEXT, payload TEXT, created REAL)",
+    "CREATE INDEX IF NOT EXISTS checkpoints_pipeline ON checkpoints (pipeline_id, node_id)",
+    "CREATE INDEX IF NOT EXISTS checkpoints_run ON checkpoints (run_id)",
+    # Transient events (token deltas relayed from worker processes) are
+    # removed once their run has ended
+    "CREATE TABLE IF NOT EXISTS events ("
+    "run_id TEXT, event_id INTEGER, data BLOB, transient INTEGER DEFAULT 0, PRIMARY KEY (run_id, event_id))",
+)
+
+class RunJournal:
+    # Writes are queued and committed in batches by a background thread, so
+    # journaling doesn't block the event loop. Reads that must see every
+    # write made so far call flush() first.
+    def __init__(self, path=RUN_JOURNAL_PATH, ttl=RUN_JOURNAL_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        # Journals created before events could be transient
+        if "transient" not in {row[1] for row in self._db.execute("PRAGMA table_info(events)")}:
+            self._db.execute("ALTER TABLE events ADD COLUMN transient INTEGER DEFAULT 0")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._writes = queue.Queue()
+        self._thread = None
+        self._last_prune = 0
+        self.counters = {"checkpoints": 0, "events": 0, "restored_runs": 0, "read_events": 0, "errors": 0}
+
+    def _write(self, statement, params):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._writer, name="run-journal", daemon=True)
+                    self._thread.start()
+        self._writes.put((statement, params))
+
+    def _writer(self):
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            # Consecutive writes of the same kind are inserted together
+            groups = []
+            for statement, params in batch:
+                if groups and groups[-1][0] == statement:
+                    groups[-1][1].append(params)
+                else:
+                    groups.append((statement, [params]))
+            with self._lock:
+                for statement, rows in groups:
+                    try:
+                        self._db.executemany(statement, rows)
+                    except sqlite3.Error as e:
+                        print(f"Error writing run journal: {str(e)}")
+                        self.counters["errors"] += 1
+                self._db.commit()
+            for _ in batch:
+                self._writes.task_done()
+            if time.time() - self._last_prune > PRUNE_INTERVAL:
+                self.prune()
+
+    def flush(self):
+        # Blocks until every queued write is committed
+        self._writes.join()
+
+    def record_run(self, run):
+        now = time.time()
+        self._write(
+            "INSERT OR REPLACE INTO runs (run_id, pipeline_id, tenant, config, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run.run_id, run.pipeline_id, run.tenant, json.dumps(run.config, default=str), run.status, run.created, now),
+        )
+
+    def set_status(self, run_id, status):
+        self._write("UPDATE runs SET status = ?, updated = ? WHERE run_id = ?", (status, time.time(), run_id))
+
+    def checkpoint(self, pipeline_id, run_id, node_id, signature, result, payload):
+        try:
+            result = json.dumps(result)
+            payload = json.dumps(payload)
+        except (TypeError, ValueError):
+            # Not serializable: the node will run again after a restart
+            return
+        self.counters["checkpoints"] += 1
+        self._write(
+            "INSERT INTO checkpoints (pipeline_id, run_id, node_id, signature, result, payload, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (pipeline_id, run_id, node_id, signature, result, payload, time.time()),
+        )
+
+    def forget(self, pipeline_id, run_id, node_id):
+        self._write(
+            "INSERT INTO checkpoints (pipeline_id, run_id, node_id, created) VALUES (?, ?, ?, ?)",
+            (pipeline_id, run_id, node_id, time.time()),
+        )
+
+    def append_event(self, run_id, event_id, data, transient=False):
+        self.counters["events"] += 1
+        self._write("INSERT OR REPLACE INTO events (run_id, event_id, data, transient) VALUES (?, ?, ?, ?)",
+                    (run_id, event_id, data, int(transient)))
+
+    def drop_transient_events(self, run_id):
+        self._write("DELETE FROM events WHERE run_id = ? AND transient = 1", (run_id,))
+
+    def load_run(self, run_id):
+        # {"run_id", "pipeline_id", "tenant", "config", "status", "created",
+        # "last_event_id", "completed"} of a journaled run, or None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT pipeline_id, tenant, config, status, created FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            last_event_id = self._last_event_id(run_id)
+            completed = self._db.execute(
+                "SELECT node_id, signature FROM checkpoints WHERE id IN "
+                "(SELECT MAX(id) FROM checkpoints WHERE run_id = ? GROUP BY node_id)", (run_id,)
+            ).fetchall()
+        self.counters["restored_runs"] += 1
+        return {
+            "run_id": run_id,
+            "pipeline_id": row[0],
+            "tenant": row[1],
+            "config": json.loads(row[2]),
+            "status": row[3],
+            "created": row[4],
+            "last_event_id": last_event_id,
+            "completed": {node_id for node_id, signature in completed if signature is not None},
+        }
+
+    def _last_event_id(self, run_id):
+        return self._db.execute("SELECT COALESCE(MAX(event_id), 0) FROM events WHERE run_id = ?", (run_id,)).fetchone()[0]
+
+    def last_event_id(self, run_id):
+        self.flush()
+        with self._lock:
+            return self._last_event_id(run_id)
+
+    def run_status(self, run_id):
+        self.flush()
+        with self._lock:
+            row = self._db.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def pipeline_tenant(self, pipeline_id):
+        with self._lock:
+            row = self._db.execute("SELECT tenant FROM runs WHERE pipeline_id = ? LIMIT 1", (pipeline_id,)).fetchone()
+        return row[0] if row else None
+
+    def load_state(self, pipeline_id):
+        # The retained results of a pipeline, as of its last checkpoints
+        state = RunState()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT node_id, signature, result, payload FROM checkpoints WHERE id IN "
+                "(SELECT MAX(id) FROM checkpoints WHERE pipeline_id = ? GROUP BY node_id)", (pipeline_id,)
+            ).fetchall()
+        for node_id, signature, result, payload in rows:
+            if signature is not None:
+                state.retain(node_id, signature, json.loads(result), json.loads(payload))
+        return state
+
+    def events(self, run_id, after=0):
+        # (event id, encoded event) of the events of a run after the given id
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT event_id, data FROM events WHERE run_id = ? AND event_id > ? ORDER BY event_id", (run_id, after)
+            ).fetchall()
+        self.counters["read_events"] += len(rows)
+        return [(event_id, bytes(data)) for event_id, data in rows]
+
+    def prune(self):
+        # Remove expired runs, their events and the checkpoints of pipelines
+        # without runs left, and compact checkpoints superseded by later ones
+        self._last_prune = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM runs WHERE updated < ? AND status != 'running'", (time.time() - self.ttl,))
+            self._db.execute("DELETE FROM events WHERE run_id NOT IN (SELECT run_id FROM runs)")
+            self._db.execute("DELETE FROM checkpoints WHERE pipeline_id NOT IN (SELECT pipeline_id FROM runs)")
+            self._db.execute(
+                "DELETE FROM checkpoints WHERE id NOT IN (SELECT MAX(id) FROM checkpoints GROUP BY pipeline_id, node_id)"
+            )
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["queued_writes"] = self._writes.qsize()
+            stats["runs"] = self._db.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            return stats
+
+class JournaledState(RunState):
+    # The retained results of a run's pipeline (shared with its session), with
+    # every change written to the journal as a checkpoint of the run
+    def __init__(self, state, journal, run):
+        self.signatures = state.signatures
+        self.results = state.results
+        self.payloads = state.payloads
+        self.journal = journal
+        self.run = run
+
+    def retain(self, node_id, signature, result, payload):
+        super().retain(node_id, signature, result, payload)
+        self.run.completed.add(node_id)
+        self.journal.checkpoint(self.run.pipeline_id, self.run.run_id, node_id, signature, result, payload)
+
+    def forget(self, node_id):
+        retained = node_id in self.signatures
+        super().forget(node_id)
+        self.run.completed.discard(node_id)
+        if retained:
+            self.journal.forget(self.run.pipeline_id, self.run.run_id, node_id)
+
+run_journal = RunJournal() if RUN_JOURNAL_PATH else None
@@ -0,0 +1,364 @@
+# backend/app/pipelines/plan.py
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from app.pipelines import registry
+from app.pipelines.incremental import node_signature
+from app.services import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Compiled plans are cached by a hash of the pipeline configuration, so that
+# a pipeline executed repeatedly (e.g. for every row of a batch) is only
+# validated and analysed once
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+
+# How a node's input is assembled
+JOIN_VALUE = "value"        # Input Node: its own value
+JOIN_EXPLICIT = "explicit"  # the node's "input" field
+JOIN_NONE = "none"          # no parents: empty string
+JOIN_SINGLE = "single"      # the result of its only parent
+JOIN_CONCAT = "concat"      # the results of its parents joined with spaces
+
+# Estimated execution time of nodes that have not been observed yet, used
+# for critical path estimates
+ESTIMATED_SECONDS = {"provider": 2.0, "cpu": 1.0, "io": 0.5, "inline": 0.001}
+
+class PlanError(ValueError):
+    # An invalid pipeline configuration; `errors` lists every problem found
+    def __init__(self, errors):
+        super().__init__("; ".join(error["message"] for error in errors))
+        self.errors = errors
+
+    def to_dict(self):
+        return {"type": "invalid_pipeline", "message": str(self), "errors": self.errors}
+
+class Plan:
+    # A validated pipeline in topological order. Nodes are numbered by their
+    # position in that order; parents and children are tuples of those
+    # numbers, with id-keyed views for the engine. Parts that depend on the
+    # node implementations are computed on first execution (see prepare).
+    def __init__(self, key, nodes, parents, joins, estimates):
+        self.key = key
+        self.nodes = tuple(nodes)
+        self.node_ids = tuple(node['id'] for node in self.nodes)
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.parents = tuple(tuple(node_parents) for node_parents in parents)
+        children = [[] for _ in self.nodes]
+        for i, node_parents in enumerate(self.parents):
+            for parent in node_parents:
+                children[parent].append(i)
+        self.children = tuple(tuple(node_children) for node_children in children)
+        self.joins = tuple(joins)
+        self.estimates = tuple(estimates)
+        # Longest estimated path from each node to the end of the pipeline;
+        # nodes on the critical path are started first
+        critical = [0.0] * len(self.nodes)
+        for i in reversed(range(len(self.nodes))):
+            critical[i] = self.estimates[i] + max((critical[child] for child in self.children[i]), default=0.0)
+        self.critical = tuple(critical)
+        self.critical_path = max(self.critical, default=0.0)
+
+        self.nodes_by_id = {node['id']: node for node in self.nodes}
+        self.graph = {self.node_ids[i]: [self.node_ids[c] for c in self.children[i]] for i in range(len(self.nodes))}
+        self.incoming_edges = {self.node_ids[i]: [self.node_ids[p] for p in self.parents[i]] for i in range(len(self.nodes))}
+        self.join_by_id = dict(zip(self.node_ids, self.joins))
+        self.critical_by_id = dict(zip(self.node_ids, self.critical))
+
+        self._prepared = None
+        self._lock = threading.Lock()
+
+    def prepare(self, modules):
+        # Signatures and streaming candidates, computed once the node
+        # implementations are loaded. Returns {"signatures", "stream_candidates"}.
+        prepared = self._prepared
+        if prepared is not None and prepared["modules"] == modules:
+            return prepared
+        with self._lock:
+            signatures = {
+                node_id: node_signature(self.nodes_by_id[node_id], self.incoming_edges[node_id],
+                                        modules.get(self.nodes_by_id[node_id]['type']))
+                for node_id in self.node_ids
+            }
+            stream_candidates = {}
+            for i, node in enumerate(self.nodes):
+                if self.joins[i] != JOIN_SINGLE:
+                    continue
+                parent = self.node_ids[self.parents[i][0]]
+                module = modules.get(node['type'])
+                parent_module = modules.get(self.nodes_by_id[parent]['type'])
+                if (module is not None and parent_module is not None
+                        and _can_stream_input(module, node.get('options', {}))
+                        and (hasattr(parent_module, 'async_process') or hasattr(parent_module, 'stream_process'))):
+                    stream_candidates[node['id']] = parent
+            self._prepared = {"modules": dict(modules), "signatures": signatures, "stream_candidates": stream_candidates}
+            return self._prepared
+
+    def needed(self, targets):
+        # Ids of the targets and every node they depend on, in topological
+        # order; all nodes when no targets are given
+        if not targets:
+            return self.node_ids
+        needed = [False] * len(self.nodes)
+        stack = [self.index[target] for target in targets]
+        while stack:
+            i = stack.pop()
+            if not needed[i]:
+                needed[i] = True
+                stack.extend(self.parents[i])
+        return tuple(node_id for node_id, keep in zip(self.node_ids, needed) if keep)
+
+    def summary(self):
+        return {"nodes": len(self.nodes), "critical_path_estimate": self.critical_path}
+
+def _can_stream_input(module, options):
+    # Nodes opt in to consuming their input chunk by chunk with stream_process
+    if not hasattr(module, 'stream_process'):
+        return False
+    if hasattr(module, 'can_stream'):
+        return bool(module.can_stream(options))
+    return True
+
+def _snapshot(config):
+    # Canonical JSON of the graph part of a configuration, and its hash. This
+    # is all a plan cache hit costs, so it uses orjson where available.
+    graph = [config.get('nodes'), config.get('edges')]
+    payload = None
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(graph, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits
+    if payload is None:
+        payload = json.dumps(graph, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return payload, hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+def config_key(config):
+    return _snapshot(config)[1]
+
+def _option_error(node, field, value):
+    # Returns a message if `value` doesn't fit the field declared in the
+    # node's UI config, None if it does. Empty values are always accepted.
+    if value is None or value == '':
+        return None
+    field_type = field.get('type')
+    name = field['name']
+    if field_type == 'number':
+        if isinstance(value, bool):
+            return f"Option {name} of node {node['id']} must be a number"
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return f"Option {name} of node {node['id']} must be a number, got {value!r}"
+        if 'min' in field and number < field['min']:
+            return f"Option {name} of node {node['id']} must be at least {field['min']}"
+        if 'max' in field and number > field['max']:
+            return f"Option {name} of node {node['id']} must be at most {field['max']}"
+    elif field_type == 'checkbox':
+        if value not in (True, False, 'true', 'false', 'True', 'False', 'on', 'off', 0, 1, '0', '1'):
+            return f"Option {name} of node {node['id']} must be true or false"
+    elif field_type == 'select':
+        choices = [choice['value'] if isinstance(choice, dict) else choice for choice in field.get('options', [])]
+        if choices and value not in choices:
+            return f"Option {name} of node {node['id']} must be one of {', '.join(map(str, choices))}"
+    elif field_type == 'text':
+        if not isinstance(value, (str, int, float)):
+            return f"Option {name} of node {node['id']} must be text"
+    elif field_type == 'textarea':
+        # Text areas holding JSON (e.g. a wrapped node's options) may be
+        # given as the object itself
+        if not isinstance(value, (str, int, float, dict)):
+            return f"Option {name} of node {node['id']} must be text or a JSON object"
+    return None
+
+def _find_cycle(remaining, graph):
+    # Follow edges between nodes left over by the topological sort until one
+    # repeats; every such node lies on or leads to a cycle
+    node_id = next(iter(remaining))
+    path = []
+    seen = {}
+    while node_id not in seen:
+        seen[node_id] = len(path)
+        path.append(node_id)
+        node_id = next(child for child in graph[node_id] if child in remaining)
+    return path[seen[node_id]:] + [node_id]
+
+def _estimate(node_type, ui_config):
+    observed = metrics.average_duration(node_type)
+    if observed is not None:
+        return observed
+    if ui_config.get('provider'):
+        return ESTIMATED_SECONDS["provider"]
+    return ESTIMATED_SECONDS.get(ui_config.get('execution', 'io'), ESTIMATED_SECONDS["io"])
+
+def _check_config(config):
+    if not isinstance(config, dict) or not config.get('nodes'):
+        raise PlanError([{"type": "empty_pipeline", "message": "No nodes in the pipeline configuration"}])
+
+def _start_node_error(start_node_id):
+    return {"type": "unknown_start_node", "message": f"Start node {start_node_id} not found in the pipeline configuration"}
+
+def target_errors(targets, node_ids):
+    # Problems with the "targets" of a configuration: the nodes whose results
+    # are requested, which must be a list of node ids
+    if targets is None:
+        return []
+    if not isinstance(targets, list):
+        return [{"type": "invalid_targets", "message": "Targets must be a list of node ids"}]
+    return [{"type": "unknown_target", "message": f"Target node {target} not found in the pipeline configuration",
+             "node": target} for target in targets if target not in node_ids]
+
+def compile_plan(config):
+    # Validate a configuration and compile it into a Plan; raises PlanError
+    _check_config(config)
+    return _compile(*_snapshot(config), config.get('startNodeId'), config.get('targets'))
+
+def _compile(payload, key, start_node_id=None, targets=None):
+    # The plan works on its own copy of the nodes, so later changes to the
+    # configuration can't leak into cached plans
+    nodes, edges = json.loads(payload)
+    edges = edges or []
+    errors = []
+    if not isinstance(nodes, list):
+        raise PlanError([{"type": "invalid_nodes", "message": "Nodes must be a list"}])
+    if not isinstance(edges, list):
+        errors.append({"type": "invalid_edges", "message": "Edges must be a list"})
+        edges = []
+
+    by_id = {}
+    ui_configs = {}
+    for node in nodes:
+        node_id = node.get('id') if isinstance(node, dict) else None
+        if node_id is None:
+            errors.append({"type": "invalid_node", "message": f"Node without id: {node!r}"})
+            continue
+        if node_id in by_id:
+            errors.append({"type": "duplicate_node", "message": f"Duplicate node id {node_id}", "node": node_id})
+            continue
+        by_id[node_id] = node
+        ui_config = registry.get_ui_config(node.get('type'))
+        if ui_config is None:
+            errors.append({"type": "unknown_node_type", "message": f"Unknown node type: {node.get('type')}",
+                           "node": node_id})
+            continue
+        ui_configs[node_id] = ui_config
+        options = node.get('options') or {}
+        for field in ui_config.get('fields', []):
+            if field.get('name') in options:
+                message = _option_error(node, field, options[field['name']])
+                if message:
+                    errors.append({"type": "invalid_option", "message": message, "node": node_id, "option": field['name']})
+
+    graph = {node_id: [] for node_id in by_id}
+    incoming_edges = {node_id: [] for node_id in by_id}
+    for edge in edges:
+        if not isinstance(edge, dict):
+            errors.append({"type": "invalid_edge", "message": f"Edge without source and target: {edge!r}"})
+            continue
+        source, target = edge.get('source'), edge.get('target')
+        missing = [end for end in (source, target) if end not in by_id]
+        if missing:
+            errors.append({"type": "dangling_edge", "message": f"Edge {source} -> {target} references unknown node {missing[0]}",
+                           "edge": {"source": source, "target": target}})
+            continue
+        graph[source].append(target)
+        incoming_edges[target].append(source)
+
+    if start_node_id and start_node_id not in by_id:
+        errors.append(_start_node_error(start_node_id))
+    errors += target_errors(targets, by_id)
+
+    # Kahn's algorithm, keeping the configuration's order among ready nodes
+    in_degree = {node_id: len(parents) for node_id, parents in incoming_edges.items()}
+    queue = deque(node_id for node_id, degree in in_degree.items() if degree == 0)
+    order = []
+    while queue:
+        node_id = queue.popleft()
+        order.append(node_id)
+        for child in graph[node_id]:
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                queue.append(child)
+    if len(order) != len(by_id):
+        cycle = _find_cycle({node_id for node_id in by_id if node_id not in set(order)}, graph)
+        errors.append({"type": "cycle", "message": f"Graph has a cycle: {' -> '.join(cycle)}", "cycle": cycle})
+
+    if errors:
+        raise PlanError(errors)
+
+    index = {node_id: i for i, node_id in enumerate(order)}
+    plan_nodes = []
+    parents = []
+    joins = []
+    estimates = []
+    type_estimates = {}
+    for node_id in order:
+        node = by_id[node_id]
+        node_parents = incoming_edges[node_id]
+        if node['type'] == 'Input Node':
+            join = JOIN_VALUE
+        elif node.get('input') is not None:
+            join = JOIN_EXPLICIT
+        elif not node_parents:
+            join = JOIN_NONE
+        elif len(node_parents) == 1:
+            join = JOIN_SINGLE
+        else:
+            join = JOIN_CONCAT
+        plan_nodes.append(node)
+        parents.append([index[parent] for parent in node_parents])
+        joins.append(join)
+        if node['type'] not in type_estimates:
+            type_estimates[node['type']] = _estimate(node['type'], ui_configs[node_id])
+        estimates.append(type_estimates[node['type']])
+    return Plan(key, plan_nodes, parents, joins, estimates)
+
+class PlanCache:
+    def __init__(self, max_entries=PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, config):
+        # Compiled plan of a configuration, compiling (and validating) it on
+        # first use. Raises PlanError for invalid configurations.
+        _check_config(config)
+        start_node_id = config.get('startNodeId')
+        targets = config.get('targets')
+        payload, key = _snapshot(config)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if plan is None:
+            plan = _compile(payload, key, start_node_id, targets)
+            with self._lock:
+                self._plans[key] = plan
+                while len(self._plans) > self.max_entries:
+                    self._plans.popitem(last=False)
+        else:
+            errors = [_start_node_error(start_node_id)] if start_node_id and start_node_id not in plan.index else []
+            errors += target_errors(targets, plan.index)
+            if errors:
+                raise PlanError(errors)
+        return plan
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._plans), "hits": self.hits, "misses": self.misses}
+
+plan_cache = PlanCache()
+
+def get_plan(config):
+    return plan_cache.get(config)
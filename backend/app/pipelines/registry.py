@@ -0,0 +1,149 @@
+# backend/app/pipelines/registry.py
+
+import os
+import ast
+import threading
+import importlib.util
+
+NODES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'nodes'))
+# Node types (comma separated, or "all") to load in the background at startup
+PREWARM_NODES = os.getenv("PREWARM_NODES", "")
+
+_manifest = {}      # node type -> {"module": ..., "path": ..., "functions": [...], "ui_config": {...}}
+_manifest_mtimes = {}
+_modules = {}       # node type -> loaded module
+_type_locks = {}    # node type -> lock held while it is loaded
+_load_lock = threading.RLock()
+
+def _read_manifest_entry(path):
+    # Read a node's UI config without importing it: get_ui_config() of the
+    # built-in nodes returns a literal dict, which can be evaluated from the
+    # syntax tree. Returns None when the module has to be imported instead.
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    functions = [item.name for item in tree.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    for item in tree.body:
+        if isinstance(item, ast.FunctionDef) and item.name == 'get_ui_config':
+            body = [statement for statement in item.body if not isinstance(statement, ast.Expr)]
+            if len(body) == 1 and isinstance(body[0], ast.Return):
+                try:
+                    return functions, ast.literal_eval(body[0].value)
+                except ValueError:
+                    pass
+    return functions, None
+
+def _import_module(module_name, path):
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def scan():
+    # Build (or refresh) the manifest of available node types. Files are only
+    # re-read when they change.
+    with _load_lock:
+        for filename in sorted(os.listdir(NODES_DIR)):
+            if not filename.endswith('.py') or filename == '__init__.py':
+                continue
+            path = os.path.join(NODES_DIR, filename)
+            mtime = os.stat(path).st_mtime_ns
+            if _manifest_mtimes.get(path) == mtime:
+                continue
+            _manifest_mtimes[path] = mtime
+            module_name = filename[:-3]
+            functions, ui_config = _read_manifest_entry(path)
+            if 'process' not in functions or 'get_ui_config' not in functions:
+                print(f"Module {module_name} does not have required attributes")
+                continue
+            if ui_config is None:
+                # Dynamic UI config: import the module to evaluate it
+                print(f"Loading module: {module_name} from {path}")
+                try:
+                    module = _import_module(module_name, path)
+                    ui_config = module.get_ui_config()
+                except Exception as e:
+                    print(f"Error loading module {module_name}: {str(e)}")
+                    continue
+                _modules[ui_config['type']] = module
+            for node_type, entry in list(_manifest.items()):
+                if entry['path'] == path and node_type != ui_config['type']:
+                    del _manifest[node_type]
+            _manifest[ui_config['type']] = {
+                "module": module_name,
+                "path": path,
+                "functions": functions,
+                "ui_config": ui_config,
+            }
+    return _manifest
+
+def get_node_types():
+    scan()
+    return {node_type: entry['ui_config'] for node_type, entry in _manifest.items()}
+
+def get_ui_config(node_type):
+    entry = _manifest.get(node_type) or scan().get(node_type)
+    if entry:
+        return entry['ui_config']
+    # Registered modules that don't live in app/nodes
+    module = _modules.get(node_type)
+    return module.get_ui_config() if module is not None else None
+
+def register_module(module):
+    # Make a node implementation available that doesn't live in app/nodes
+    with _load_lock:
+        _modules[module.get_ui_config()['type']] = module
+
+def is_loaded(node_type):
+    return node_type in _modules
+
+def get_node_module(node_type):
+    # Load a node implementation on first use and run its warm_up hook.
+    # Returns None for unknown node types.
+    module = _modules.get(node_type)
+    if module is not None:
+        return module
+    with _load_lock:
+        type_lock = _type_locks.setdefault(node_type, threading.Lock())
+    # One thread loads a node type while others wait for it; warming up (e.g.
+    # loading model weights) can take a while and doesn't hold up loading
+    # other node types
+    with type_lock:
+        module = _modules.get(node_type)
+        if module is not None:
+            return module
+        with _load_lock:
+            entry = _manifest.get(node_type) or scan().get(node_type)
+        if entry is None:
+            return None
+        print(f"Loading module: {entry['module']} from {entry['path']}")
+        module = _import_module(entry['module'], entry['path'])
+        # Registered only once warmed up, so a failed warm-up is retried by
+        # the next call
+        if hasattr(module, 'warm_up'):
+            module.warm_up()
+        _modules[node_type] = module
+    return module
+
+def prewarm(node_types=None):
+    # Load the given node types (and run their warm-up hooks) on a background
+    # thread, so the first request using them doesn't pay for it
+    if node_types is None:
+        node_types = PREWARM_NODES
+    if isinstance(node_types, str):
+        node_types = list(get_node_types()) if node_types.strip() == 'all' else [
+            node_type.strip() for node_type in node_types.split(',') if node_type.strip()
+        ]
+    if not node_types:
+        return None
+
+    def warm():
+        for node_type in node_types:
+            try:
+                get_node_module(node_type)
+                print(f"Pre-warmed node type: {node_type}")
+            except Exception as e:
+                print(f"Error pre-warming {node_type}: {str(e)}")
+
+    thread = threading.Thread(target=warm, name="node-prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,229 @@
+# backend/app/pipelines/result_cache.py
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from app.pipelines import executors
+
+# In-memory tier limits. A TTL of 0 disables expiry.
+CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+# Setting RESULT_CACHE_PATH enables the on-disk (sqlite) tier
+CACHE_PATH = os.getenv("RESULT_CACHE_PATH")
+CACHE_DISK_MAX_BYTES = int(os.getenv("RESULT_CACHE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") not in ("0", "false", "False")
+
+_code_versions = {}
+
+def code_version(module):
+    # Hash of the node's source file, so editing a node invalidates its entries
+    path = getattr(module, '__file__', None)
+    if not path:
+        return ''
+    if path not in _code_versions:
+        with open(path, 'rb') as f:
+            _code_versions[path] = hashlib.sha256(f.read()).hexdigest()[:16]
+    return _code_versions[path]
+
+def normalize_options(options, ui_config):
+    # Coerce option values according to the node's field types, so that e.g.
+    # {"max_tokens": "150"} and {"max_tokens": 150} share a cache entry
+    field_types = {field['name']: field.get('type') for field in ui_config.get('fields', [])}
+    normalized = {}
+    for name, value in (options or {}).items():
+        field_type = field_types.get(name)
+        try:
+            if field_type == 'number' and value not in (None, ''):
+                value = float(value)
+            elif field_type == 'checkbox':
+                value = value in (True, 'true', 'True', 1, '1', 'on')
+        except (TypeError, ValueError):
+            pass
+        normalized[name] = value
+    return normalized
+
+def is_cacheable(module, options):
+    # Nodes opt in with "cacheable": True in their UI config, or decide per
+    # call with an is_cacheable(options) function (e.g. only at temperature 0)
+    if hasattr(module, 'is_cacheable'):
+        return bool(module.is_cacheable(options))
+    return bool(module.get_ui_config().get('cacheable', False))
+
+def make_key(node_type, module, options, input_data):
+    payload = json.dumps(
+        [node_type, normalize_options(options, module.get_ui_config()), input_data, code_version(module)],
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResultCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL,
+                 path=CACHE_PATH, disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, created)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # The disk tier has its own lock, so memory lookups never wait for it
+        self._db_lock = threading.Lock()
+        self._db = None
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expirations": 0}
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT, size INTEGER, created REAL, accessed REAL)"
+            )
+            self._db.commit()
+
+    def _expired(self, created):
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, key):
+        hit, value = self._get_memory(key)
+        if not hit and self._db is not None:
+            hit, value = self._get_disk(key)
+        if not hit:
+            self._miss()
+        return hit, value
+
+    async def get_async(self, key):
+        # get() for the event loop: the disk tier is read in the thread pool,
+        # so lookups don't hold up other runs
+        hit, value = self._get_memory(key)
+        if not hit and self._db is not None:
+            hit, value = await executors.run_in_thread(self._get_disk, key)
+        if not hit:
+            self._miss()
+        return hit, value
+
+    def set(self, key, value):
+        serialized = self._set_memory(key, value)
+        if serialized is not None and self._db is not None:
+            self._set_disk(key, serialized)
+
+    async def set_async(self, key, value):
+        # set() for the event loop, writing the disk tier in the thread pool
+        serialized = self._set_memory(key, value)
+        if serialized is not None and self._db is not None:
+            await executors.run_in_thread(self._set_disk, key, serialized)
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, size, created = entry
+            if self._expired(created):
+                self._remove(key)
+                self.counters["expirations"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return True, value
+
+    def _get_disk(self, key):
+        with self._db_lock:
+            row = self._db.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            if self._expired(row[1]):
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                expired = True
+            else:
+                expired = False
+                self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        if expired:
+            with self._lock:
+                self.counters["expirations"] += 1
+            return False, None
+        value = json.loads(row[0])
+        with self._lock:
+            self._store(key, value, len(row[0]), row[1])
+            self.counters["disk_hits"] += 1
+        return True, value
+
+    def _miss(self):
+        with self._lock:
+            self.counters["misses"] += 1
+
+    def _set_memory(self, key, value):
+        # The serialized value, or None if it can't be cached
+        try:
+            serialized = json.dumps(value)
+        except (TypeError, ValueError):
+            return None
+        with self._lock:
+            self.counters["sets"] += 1
+            self._store(key, value, len(serialized), time.time())
+        return serialized
+
+    def _set_disk(self, key, serialized):
+        now = time.time()
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized), now, now),
+            )
+            self._evict_disk()
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes})
+        if self._db is not None:
+            with self._db_lock:
+                count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            stats.update({"disk_entries": count, "disk_bytes": size})
+        return stats
+
+    def _store(self, key, value, size, created):
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, created)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.counters["evictions"] += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict_disk(self):
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM results WHERE created < ?", (time.time() - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+result_cache = ResultCache() if CACHE_ENABLED else None
@@ -0,0 +1,38 @@
+# backend/app/pipelines/runner.py
+
+from app.pipelines.dynamic_pipeline import execute_pipeline
+from app.pipelines.journal import JournaledState
+
+async def run_events(run, journal=None, outcome=None, targets=None):
+    # Executes a run and yields the events streamed to clients: the plan,
+    # node results and intermediate output, run metrics and a final
+    # completion (or error) event. outcome["status"] is set to "completed"
+    # when the run went through. With a journal, every node that completes
+    # is checkpointed. `targets` restrict this execution only; without them
+    # the targets of the run's configuration apply.
+    state = run.session.state
+    if journal is not None:
+        state = JournaledState(state, journal, run)
+    pipeline_events = execute_pipeline(run.config, run.start_node_id, state=state, plan=run.plan,
+                                       completed=run.completed, targets=targets or run.config.get('targets'))
+    try:
+        async for node_id, result in pipeline_events:
+            if node_id is None:
+                # Run-level event, e.g. which nodes are reused or recomputed
+                yield result
+            elif isinstance(result, dict) and 'intermediate' in result:
+                # Streamed tokens or progress of a node that is still running
+                yield {'id': node_id, 'intermediate': result['intermediate']}
+            else:
+                # This is a final result from other nodes
+                yield {'id': node_id, 'result': result}
+        # Send a final message to indicate the stream is complete
+        if outcome is not None:
+            outcome["status"] = "completed"
+        yield {'complete': True, 'run_id': run.run_id}
+    except Exception as e:
+        print(f"Error in execute: {str(e)}")
+        yield {'error': str(e)}
+    finally:
+        # Stops every node of the run when the consumer goes away
+        await pipeline_events.aclose()
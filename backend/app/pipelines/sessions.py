@@ -0,0 +1,194 @@
+# backend/app/pipelines/sessions.py
+
+import os
+import time
+import uuid
+from collections import OrderedDict
+from app.pipelines.incremental import RunState
+
+# Bounds for the in-memory session store. Pipelines and runs that have not
+# been used for SESSION_TTL seconds are dropped, and the least recently used
+# ones are evicted once the store is full.
+SESSION_MAX_PIPELINES = int(os.getenv("SESSION_MAX_PIPELINES", "1000"))
+SESSION_MAX_RUNS = int(os.getenv("SESSION_MAX_RUNS", "5000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+TENANT_MAX_CONCURRENT_RUNS = int(os.getenv("TENANT_MAX_CONCURRENT_RUNS", "4"))
+
+class PipelineSession:
+    def __init__(self, pipeline_id, tenant):
+        self.pipeline_id = pipeline_id
+        self.tenant = tenant
+        self.state = RunState()
+        self.last_used = time.time()
+
+class Run:
+    def __init__(self, run_id, session, config, plan=None):
+        self.run_id = run_id
+        self.session = session
+        self.config = config
+        self.plan = plan
+        self.start_node_id = config.get('startNodeId')
+        self.status = "pending"
+        self.created = time.time()
+        self.last_used = self.created
+        self.last_event_id = 0  # id of the last event sent to clients
+        self.completed = set()  # nodes that completed during this run
+        self.listeners = set()  # queues of clients following the run from another connection
+
+    def publish(self, item):
+        # Hands an (event id, encoded event) pair, or None once the run has
+        # ended, to the clients following the run
+        for queue in self.listeners:
+            queue.put_nowait(item)
+
+    @property
+    def pipeline_id(self):
+        return self.session.pipeline_id
+
+    @property
+    def tenant(self):
+        return self.session.tenant
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "pipeline_id": self.pipeline_id,
+            "status": self.status,
+            "created": self.created,
+        }
+
+class SessionStore:
+    # With a run journal, runs and the results of their pipelines outlive the
+    # in-memory store (and the server): runs that are no longer in memory are
+    # restored from the journal.
+    def __init__(self, max_pipelines=SESSION_MAX_PIPELINES, max_runs=SESSION_MAX_RUNS,
+                 ttl=SESSION_TTL, max_runs_per_tenant=TENANT_MAX_CONCURRENT_RUNS, journal=None):
+        self.max_pipelines = max_pipelines
+        self.max_runs = max_runs
+        self.ttl = ttl
+        self.max_runs_per_tenant = max_runs_per_tenant
+        self.journal = journal
+        self._pipelines = OrderedDict()
+        self._runs = OrderedDict()
+        self._latest_run = {}  # tenant -> run_id
+        self._active = {}      # tenant -> set of running run ids
+
+    def create_run(self, tenant, config, pipeline_id=None, plan=None):
+        self.expire()
+        session = self._session(pipeline_id, tenant) if pipeline_id else None
+        if session is None:
+            session = PipelineSession(uuid.uuid4().hex, tenant)
+            self._pipelines[session.pipeline_id] = session
+        session.last_used = time.time()
+        self._pipelines.move_to_end(session.pipeline_id)
+
+        run = Run(uuid.uuid4().hex, session, config, plan)
+        self._runs[run.run_id] = run
+        self._latest_run[tenant] = run.run_id
+        if self.journal is not None:
+            self.journal.record_run(run)
+        self._evict()
+        return run
+
+    def _session(self, pipeline_id, tenant):
+        # The tenant's pipeline with that id, restored from the journal when it
+        # is no longer in memory
+        session = self._pipelines.get(pipeline_id)
+        if session is None and self.journal is not None and self.journal.pipeline_tenant(pipeline_id) == tenant:
+            session = PipelineSession(pipeline_id, tenant)
+            session.state = self.journal.load_state(pipeline_id)
+            self._pipelines[pipeline_id] = session
+        if session is None or session.tenant != tenant:
+            return None
+        return session
+
+    def _restore_run(self, run_id):
+        saved = self.journal.load_run(run_id)
+        if saved is None:
+            return None
+        session = self._session(saved["pipeline_id"], saved["tenant"]) or PipelineSession(saved["pipeline_id"], saved["tenant"])
+        run = Run(run_id, session, saved["config"])
+        run.created = saved["created"]
+        # A run that was running when the server stopped can be resumed
+        run.status = "interrupted" if saved["status"] == "running" else saved["status"]
+        run.last_event_id = saved["last_event_id"]
+        run.completed = saved["completed"]
+        self._runs[run_id] = run
+        self._evict()
+        return run
+
+    def get_run(self, run_id, tenant=None):
+        # The run with that id; with a tenant, only if it is one of theirs
+        self.expire()
+        run = self._runs.get(run_id)
+        if run is None and self.journal is not None:
+            run = self._restore_run(run_id)
+        if run is not None and tenant is not None and run.tenant != tenant:
+            return None
+        if run is not None:
+            run.last_used = time.time()
+            run.session.last_used = run.last_used
+            self._runs.move_to_end(run_id)
+            self._pipelines.move_to_end(run.pipeline_id)
+        return run
+
+    def latest_run(self, tenant):
+        run_id = self._latest_run.get(tenant)
+        return self.get_run(run_id) if run_id else None
+
+    def active_runs(self, tenant):
+        return len(self._active.get(tenant, ()))
+
+    def can_start(self, run):
+        return run.status != "running" and self.active_runs(run.tenant) < self.max_runs_per_tenant
+
+    def start(self, run):
+        if not self.can_start(run):
+            return False
+        self._active.setdefault(run.tenant, set()).add(run.run_id)
+        run.status = "running"
+        if self.journal is not None:
+            self.journal.set_status(run.run_id, run.status)
+        return True
+
+    def finish(self, run, status):
+        active = self._active.get(run.tenant)
+        if active is not None:
+            active.discard(run.run_id)
+            if not active:
+                del self._active[run.tenant]
+        run.status = status
+        run.last_used = time.time()
+        if self.journal is not None:
+            self.journal.set_status(run.run_id, status)
+
+    def expire(self):
+        deadline = time.time() - self.ttl
+        for store in (self._runs, self._pipelines):
+            for key in list(store):
+                item = store[key]
+                if item.last_used >= deadline:
+                    break
+                if getattr(item, "status", None) != "running":
+                    self._drop(store, key)
+
+    def stats(self):
+        return {
+            "pipelines": len(self._pipelines),
+            "runs": len(self._runs),
+            "active_runs": sum(len(runs) for runs in self._active.values()),
+            "tenants_running": len(self._active),
+        }
+
+    def _evict(self):
+        for store, limit in ((self._runs, self.max_runs), (self._pipelines, self.max_pipelines)):
+            for key in list(store):
+                if len(store) <= limit:
+                    break
+                if getattr(store[key], "status", None) != "running":
+                    self._drop(store, key)
+
+    def _drop(self, store, key):
+        item = store.pop(key)
+        if isinstance(item, Run) and self._latest_run.get(item.tenant) == key:
+            del self._latest_run[item.tenant]
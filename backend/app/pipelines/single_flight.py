@@ -0,0 +1,97 @@
+# backend/app/pipelines/single_flight.py
+
+import os
+import asyncio
+
+# Identical node calls (same node type, options and input) that are executing
+# at the same time, e.g. the shared first steps of many runs started together,
+# are made only once: the first caller starts the call, and every caller
+# receives all of its output, including chunks streamed before it joined.
+# This complements the result cache, which only helps once a call finished.
+SINGLE_FLIGHT_ENABLED = os.getenv("PIPELINE_SINGLE_FLIGHT", "1") not in ("0", "false", "False")
+
+class Flight:
+    def __init__(self, key):
+        self.key = key
+        self.loop = asyncio.get_running_loop()
+        self.outputs = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self.task = None
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self.counters = {"calls": 0, "shared": 0, "abandoned": 0}
+
+    def join(self, key, start):
+        # Returns (outputs, shared): an async iterator over the outputs of the
+        # call with this key, which is started with start() unless one is
+        # already in flight (then shared is True)
+        flight = self._flights.get(key)
+        shared = flight is not None and flight.loop is asyncio.get_running_loop()
+        if shared:
+            self.counters["shared"] += 1
+        else:
+            flight = self._flights[key] = Flight(key)
+            flight.task = asyncio.create_task(self._produce(flight, start()))
+            self.counters["calls"] += 1
+        return self._follow(flight), shared
+
+    def _forget(self, flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    async def _produce(self, flight, outputs):
+        try:
+            async for output in outputs:
+                flight.outputs.append(output)
+                flight.notify()
+                if isinstance(output, dict) and "error" in output:
+                    break
+        except asyncio.CancelledError:
+            flight.error = RuntimeError("Shared node call was cancelled")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            # Later calls start anew (or hit the result cache)
+            flight.done = True
+            self._forget(flight)
+            flight.notify()
+            await outputs.aclose()
+
+    async def _follow(self, flight):
+        # Counted here rather than in join(): a caller that goes away before
+        # it starts reading never runs this body, so it mustn't be counted
+        flight.waiters += 1
+        index = 0
+        try:
+            while True:
+                while index < len(flight.outputs):
+                    output = flight.outputs[index]
+                    index += 1
+                    yield output
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.changed.wait()
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.done:
+                # Every caller went away: stop the call
+                self.counters["abandoned"] += 1
+                self._forget(flight)
+                flight.task.cancel()
+
+    def stats(self):
+        return {**self.counters, "in_flight": len(self._flights)}
+
+single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
@@ -1,46 +1,324 @@
 # backend\app\routes.py
 
-from quart import jsonify, request, Response
+from quart import jsonify, request, session, Response, send_file
 from app import app
-from app.pipelines.dynamic_pipeline import execute_pipeline, get_node_types
-import json
+from app.pipelines.dynamic_pipeline import get_node_types, get_stats
+from app.pipelines.sessions import SessionStore
+from app.pipelines.journal import run_journal
+from app.pipelines.runner import run_events
+from app.pipelines.jobs import job_queue, queue_for
+from app.pipelines import executors
+from app.pipelines.plan import PlanError, get_plan, target_errors
+from app.pipelines.batch import BatchJob, BatchJobStore, run_batch, batch_settings, BATCH_CONCURRENCY
+from app.services.flux_worker import flux_worker
+from app.services.local_models import model_manager
+from app.services.clients import client_manager
+from app.services.artifacts import artifact_store
+from app.services.prompt_cache import prompt_cache
+from app.services import provider_limits, metrics, sse
+import os
+import uuid
 import asyncio
 
-pipeline_config = None
+# Pipelines and runs of every tenant. Each pipeline keeps the results of its
+# previous run, which are reused for nodes that did not change. Runs and
+# results are journaled, so they survive a restart of the server.
+sessions = SessionStore(journal=run_journal)
+
+# Batch jobs started through /batch. Their input and output files must live
+# inside BATCH_DATA_DIR.
+BATCH_DATA_DIR = os.path.abspath(os.getenv("BATCH_DATA_DIR", "batches"))
+batch_jobs = BatchJobStore()
+
+def current_tenant():
+    # Callers are identified by the signed session cookie /start-pipeline
+    # issues; requests without one have no runs
+    return session.get('tenant')
+
+def issue_tenant():
+    if 'tenant' not in session:
+        session['tenant'] = uuid.uuid4().hex
+    return session['tenant']
+
+def tenant_run(run_id):
+    tenant = current_tenant()
+    return sessions.get_run(run_id, tenant) if tenant else None
 
 @app.route('/start-pipeline', methods=['POST'])
 async def start_pipeline():
-    global pipeline_config
-    pipeline_config = await request.get_json()
-    return jsonify({"status": "Pipeline configuration received"}), 200
+    config = await request.get_json()
+    if not config:
+        return jsonify({"error": "No pipeline configuration received"}), 400
+    # Invalid configurations are rejected before anything runs. The compiled
+    # plan is cached, so repeated runs of the same pipeline skip this step.
+    try:
+        plan = get_plan(config)
+    except PlanError as e:
+        return jsonify({"error": "Invalid pipeline configuration", "errors": e.errors}), 400
+    # Passing the pipelineId of an earlier call continues that pipeline, so
+    # unchanged nodes reuse their previous results
+    run = sessions.create_run(issue_tenant(), config, config.get('pipelineId'), plan)
+    return jsonify({
+        "status": "Pipeline configuration received",
+        "pipeline_id": run.pipeline_id,
+        "run_id": run.run_id,
+        "plan": plan.summary()
+    }), 200
 
 @app.route('/execute', methods=['GET'])
 async def execute():
-    global pipeline_config
-
-    if pipeline_config is None:
+    # Runs the most recent pipeline configuration of the calling tenant
+    tenant = current_tenant()
+    run = sessions.latest_run(tenant) if tenant else None
+    if run is None:
         return jsonify({"error": "No pipeline configuration received"}), 400
+    return await stream_run(run)
+
+@app.route('/execute/<run_id>', methods=['GET'])
+async def execute_run(run_id):
+    # Runs of other tenants are treated as unknown
+    run = tenant_run(run_id)
+    if run is None:
+        return jsonify({"error": f"Run {run_id} not found"}), 404
+    return await stream_run(run)
+
+@app.route('/runs/<run_id>', methods=['GET'])
+async def get_run(run_id):
+    run = tenant_run(run_id)
+    if run is None:
+        return jsonify({"error": f"Run {run_id} not found"}), 404
+    return jsonify(run.to_dict())
+
+async def stream_run(run):
+    # A client reconnecting with Last-Event-ID is sent the events it missed
+    # first. Unless the run has completed, it then resumes: nodes that have
+    # completed before are not executed again.
+    last_event_id = request.headers.get('Last-Event-ID')
+    if run_journal is not None and last_event_id is not None and not last_event_id.isdigit():
+        return jsonify({"error": f"Invalid Last-Event-ID {last_event_id}"}), 400
+
+    # Events are compressed when the client accepts it (EventSource requests
+    # normally do)
+    encoding = sse.negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if run.status == "running":
+        if run_journal is None or last_event_id is None:
+            return jsonify({"error": f"Run {run.run_id} is already running"}), 409
+        # The client reconnected before its previous connection was noticed
+        # to be gone: it follows the run that is executing
+        if job_queue is not None:
+            batches = job_queue.follow(run_journal, run.run_id, int(last_event_id))
+        else:
+            batches = live_events(run, int(last_event_id))
+        return event_stream_response(sse.relay(batches, encoding=encoding), encoding)
+
+    replay = []
+    if run_journal is not None and last_event_id is not None:
+        # Queued runs get the missed events from the worker's journal instead
+        if job_queue is None or run.status == "completed":
+            replay = await executors.run_in_thread(run_journal.events, run.run_id, int(last_event_id))
+        if run.status == "completed":
+            return event_stream_response(
+                b"".join(sse.frame(data, event_id) for event_id, data in replay), None)
+    elif run.status == "completed":
+        # Executing a completed run again starts over
+        run.completed = set()
+
+    # ?targets=a,b only computes those nodes and the nodes they depend on,
+    # e.g. to preview one branch of a large pipeline. They apply to this
+    # execution only, not to later ones of the run.
+    targets = request.args.get('targets')
+    if targets is not None:
+        targets = [target for target in targets.split(',') if target]
+        errors = target_errors(targets, {node['id'] for node in run.config['nodes']})
+        if errors:
+            return jsonify({"error": "Invalid pipeline configuration", "errors": errors}), 400
+    if not sessions.can_start(run):
+        return jsonify({"error": "Too many concurrent runs"}), 429
+
+    if job_queue is not None:
+        return event_stream_response(queued_run(run, last_event_id, encoding, targets), encoding)
 
-    start_node_id = pipeline_config.get('startNodeId')
-    print('Received pipeline configuration:', pipeline_config)
+    def record(event_id, data, event):
+        run.last_event_id = event_id
+        if not sse.is_delta(event):
+            run_journal.append_event(run.run_id, event_id, data)
+        run.publish((event_id, data))
 
     async def generate():
+        if not sessions.start(run):
+            yield sse.frame(sse.get_encoder()({'error': 'Too many concurrent runs'}))
+            return
+
+        outcome = {"status": "failed"}
+        # Journaled events are numbered, continuing after those of earlier
+        # executions of the run
+        chunks = sse.stream(run_events(run, run_journal, outcome, targets), encoding=encoding, replay=replay,
+                            next_id=run.last_event_id + 1 if run_journal is not None else None, record=record)
+        status = "failed"
         try:
-            async for node_id, result in execute_pipeline(pipeline_config, start_node_id):
-                if isinstance(result, dict) and 'step' in result:
-                    # This is an intermediate result from the FLUX generator
-                    yield f"data: {json.dumps({'id': node_id, 'intermediate': result})}\n\n"
-                else:
-                    # This is a final result from other nodes
-                    yield f"data: {json.dumps({'id': node_id, 'result': result})}\n\n"
-            # Send a final message to indicate the stream is complete
-            yield f"data: {json.dumps({'complete': True})}\n\n"
-        except Exception as e:
-            print(f"Error in execute: {str(e)}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-
-    return Response(generate(), mimetype='text/event-stream')
+            async for chunk in chunks:
+                yield chunk
+            status = outcome["status"]
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client disconnected: stop every node of this run
+            status = "cancelled"
+            raise
+        finally:
+            await chunks.aclose()
+            sessions.finish(run, status)
+            run.publish(None)
+
+    return event_stream_response(generate(), encoding)
+
+async def live_events(run, after):
+    # Lists of (event id, encoded event) of a run executing for another
+    # connection: the journaled events after `after`, then new events as they
+    # are sent, until the run ends. An empty list means that nothing new has
+    # arrived. A run that ended without completing, e.g. because the other
+    # connection was closed, is resumed when the client reconnects.
+    queue = asyncio.Queue()
+    run.listeners.add(queue)
+    try:
+        replay = await executors.run_in_thread(run_journal.events, run.run_id, after)
+        if replay:
+            after = replay[-1][0]
+        yield replay
+        while True:
+            try:
+                items = [await asyncio.wait_for(queue.get(), sse.SSE_HEARTBEAT_SECONDS)]
+            except asyncio.TimeoutError:
+                yield []
+                continue
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            # Events sent before the journal was read are there already
+            batch = [item for item in items if item is not None and item[0] > after]
+            if batch:
+                after = batch[-1][0]
+                yield batch
+            if None in items:
+                return
+    finally:
+        run.listeners.discard(queue)
+
+async def queued_run(run, last_event_id, encoding, targets=None):
+    # Hands the run to a worker process and streams the events it journals
+    if not sessions.start(run):
+        yield sse.frame(sse.get_encoder()({'error': 'Too many concurrent runs'}))
+        return
+    status = "failed"
+    try:
+        # The worker reads the run from the journal: write it out first
+        await executors.run_in_thread(run_journal.flush)
+        if last_event_id is not None:
+            after = int(last_event_id)
+        else:
+            after = await executors.run_in_thread(run_journal.last_event_id, run.run_id)
+        await executors.run_in_thread(job_queue.enqueue, run.run_id, queue_for(run.config), targets)
+        async for chunk in sse.relay(job_queue.follow(run_journal, run.run_id, after), encoding=encoding):
+            yield chunk
+        status = await executors.run_in_thread(run_journal.run_status, run.run_id) or "failed"
+    except (asyncio.CancelledError, GeneratorExit):
+        # The client disconnected: the worker stops the run
+        status = "cancelled"
+        job_queue.cancel(run.run_id)
+        raise
+    finally:
+        sessions.finish(run, status)
+
+def event_stream_response(body, encoding):
+    response = Response(body, mimetype='text/event-stream')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+    # Keep proxies from buffering the stream, and don't let Quart's response
+    # timeout cut off long runs
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
+
+def batch_path(path):
+    full_path = os.path.abspath(os.path.join(BATCH_DATA_DIR, path))
+    if os.path.commonpath([full_path, BATCH_DATA_DIR]) != BATCH_DATA_DIR:
+        raise ValueError(f"Path {path} is outside the batch data directory")
+    return full_path
+
+@app.route('/batch', methods=['POST'])
+async def start_batch():
+    body = await request.get_json()
+    if not body or 'pipeline' not in body or 'input' not in body:
+        return jsonify({"error": "A pipeline and an input file are required"}), 400
+    try:
+        input_path = batch_path(body['input'])
+        output_path = batch_path(body.get('output') or os.path.splitext(body['input'])[0] + '.results.jsonl')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not os.path.exists(input_path):
+        return jsonify({"error": f"Input file {body['input']} not found"}), 404
+    try:
+        get_plan(body['pipeline'])
+    except PlanError as e:
+        return jsonify({"error": "Invalid pipeline configuration", "errors": e.errors}), 400
+    try:
+        batch_settings(body.get('concurrency', BATCH_CONCURRENCY), body.get('rateLimits'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        start_offset = int(body.get('startOffset', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": f"Invalid startOffset {body.get('startOffset')!r}"}), 400
+
+    job = BatchJob(input_path, output_path)
+    batch_jobs.add(job)
+    app.add_background_task(
+        run_batch,
+        body['pipeline'],
+        input_path,
+        output_path,
+        concurrency=body.get('concurrency', BATCH_CONCURRENCY),
+        rate_limits=body.get('rateLimits'),
+        resume=body.get('resume', False),
+        start_offset=start_offset,
+        input_field=body.get('inputField', 'input'),
+        job=job,
+    )
+    return jsonify(job.to_dict()), 202
+
+@app.route('/batch/<batch_id>', methods=['GET'])
+async def get_batch(batch_id):
+    job = batch_jobs.get(batch_id)
+    if job is None:
+        return jsonify({"error": f"Batch {batch_id} not found"}), 404
+    return jsonify(job.to_dict())
 
 @app.route('/node-types', methods=['GET'])
 async def node_types():
-    return jsonify(get_node_types())
\ No newline at end of file
+    return jsonify(get_node_types())
+
+@app.route('/artifacts/<artifact_id>', methods=['GET'])
+async def get_artifact(artifact_id):
+    entry = artifact_store.get(artifact_id)
+    if entry is None:
+        return jsonify({"error": f"Artifact {artifact_id} not found"}), 404
+    # Artifacts are content-addressed, so their id is a strong ETag and they
+    # never change; Range requests are answered with partial content
+    response = await send_file(entry["path"], mimetype=entry["content_type"], add_etags=False, cache_timeout=31536000)
+    response.set_etag(artifact_id)
+    response.headers["Accept-Ranges"] = "bytes"
+    await response.make_conditional(request, accept_ranges=True, complete_length=entry["size"])
+    return response
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    # Node and run metrics in the Prometheus text exposition format
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/stats', methods=['GET'])
+async def stats():
+    return jsonify({**get_stats(), "sessions": sessions.stats(), "flux_worker": flux_worker.stats(),
+                    "local_models": model_manager.stats(),
+                    "http_clients": client_manager.stats(), "provider_limits": provider_limits.get_stats(),
+                    "run_journal": run_journal.stats() if run_journal is not None else None,
+                    "jobs": job_queue.stats() if job_queue is not None else None,
+                    "prompt_cache": prompt_cache.stats() if prompt_cache is not None else None})
@@ -0,0 +1,170 @@
+# backend/app/services/artifacts.py
+
+import os
+import re
+import mmap
+import hashlib
+import tempfile
+import threading
+import mimetypes
+from collections import OrderedDict
+
+# Binary node outputs such as images are written once to a content-addressed
+# file store and passed between nodes (and to the frontend) as small handles
+# pointing at /artifacts/<id>, instead of as base64 data URLs. The least
+# recently used artifacts are deleted once the store exceeds ARTIFACT_MAX_BYTES.
+ARTIFACT_DIR = os.path.abspath(os.getenv("ARTIFACT_DIR", "artifacts"))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(2 * 1024 ** 3)))
+
+URL_PREFIX = "/artifacts/"
+_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+class _HashingWriter:
+    # Hashes everything written through it. Deliberately has no fileno(), so
+    # that writers like PIL go through write() instead of the raw descriptor.
+    def __init__(self, f):
+        self._f = f
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    def flush(self):
+        self._f.flush()
+
+def _extension(content_type):
+    return mimetypes.guess_extension(content_type or '') or '.bin'
+
+class ArtifactStore:
+    def __init__(self, root=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # id -> {"path", "size", "content_type"}, least recently used first
+        self._bytes = 0
+        self._scanned = False
+        self._lock = threading.Lock()
+        self.counters = {"writes": 0, "duplicates": 0, "evictions": 0, "reads": 0, "misses": 0}
+
+    def _scan(self):
+        # Index artifacts left by earlier runs of the server, oldest first
+        if self._scanned:
+            return
+        found = []
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    artifact_id, extension = os.path.splitext(filename)
+                    if not _ID_PATTERN.match(artifact_id):
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    stat = os.stat(path)
+                    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                    found.append((stat.st_mtime, artifact_id, {"path": path, "size": stat.st_size, "content_type": content_type}))
+        for _, artifact_id, entry in sorted(found):
+            self._entries[artifact_id] = entry
+            self._bytes += entry["size"]
+        self._scanned = True
+
+    def write(self, writer, content_type):
+        # Calls writer(f) to write the artifact's content to a file-like
+        # object and returns the artifact's handle. Blocking: call it from a
+        # thread when on the event loop.
+        os.makedirs(self.root, exist_ok=True)
+        f = tempfile.NamedTemporaryFile(dir=self.root, suffix='.tmp', delete=False)
+        try:
+            with f:
+                hashing = _HashingWriter(f)
+                writer(hashing)
+        except BaseException:
+            os.remove(f.name)
+            raise
+        artifact_id = hashing.hash.hexdigest()
+        path = os.path.join(self.root, artifact_id[:2], artifact_id + _extension(content_type))
+        with self._lock:
+            self._scan()
+            if artifact_id in self._entries and os.path.exists(self._entries[artifact_id]["path"]):
+                # Same content written before
+                os.remove(f.name)
+                self._entries.move_to_end(artifact_id)
+                self.counters["duplicates"] += 1
+                return self.handle(artifact_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(f.name, path)
+            self._entries[artifact_id] = {"path": path, "size": hashing.size, "content_type": content_type}
+            self._bytes += hashing.size
+            self.counters["writes"] += 1
+            self._evict()
+            return self.handle(artifact_id)
+
+    def put(self, data, content_type):
+        return self.write(lambda f: f.write(data), content_type)
+
+    def _evict(self):
+        # Keep at least the artifact just written
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            artifact_id, entry = self._entries.popitem(last=False)
+            self._bytes -= entry["size"]
+            self.counters["evictions"] += 1
+            try:
+                os.remove(entry["path"])
+            except OSError as e:
+                print(f"Error removing artifact {artifact_id}: {str(e)}")
+
+    def handle(self, artifact_id):
+        entry = self._entries[artifact_id]
+        return {"artifact": artifact_id, "url": URL_PREFIX + artifact_id,
+                "content_type": entry["content_type"], "size": entry["size"]}
+
+    def get(self, artifact_id):
+        # The artifact's {"path", "size", "content_type"}, or None
+        with self._lock:
+            self._scan()
+            entry = self._entries.get(artifact_id)
+            if entry is None or not os.path.exists(entry["path"]):
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(artifact_id)
+            self.counters["reads"] += 1
+            return dict(entry)
+
+    def exists(self, artifact_id):
+        with self._lock:
+            self._scan()
+            return artifact_id in self._entries
+
+    def open(self, ref):
+        # Read-only view of an artifact's content, memory-mapped so nothing is
+        # copied until it is used. `ref` can be an id, a handle or a URL.
+        entry = self.get(artifact_id(ref))
+        if entry is None:
+            raise KeyError(f"Artifact {ref} not found")
+        if entry["size"] == 0:
+            return memoryview(b'')
+        with open(entry["path"], 'rb') as f:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def stats(self):
+        with self._lock:
+            self._scan()
+            stats = dict(self.counters)
+            stats["artifacts"] = len(self._entries)
+            stats["bytes"] = self._bytes
+            stats["max_bytes"] = self.max_bytes
+            return stats
+
+def artifact_id(ref):
+    # The id of an artifact given as id, handle or /artifacts/<id> URL
+    if isinstance(ref, dict):
+        ref = ref.get("artifact")
+    if isinstance(ref, str) and ref.startswith(URL_PREFIX):
+        ref = ref[len(URL_PREFIX):]
+    return ref if isinstance(ref, str) and _ID_PATTERN.match(ref) else None
+
+def is_stale(value):
+    # A node result referencing an artifact that has been evicted since
+    return isinstance(value, dict) and "artifact" in value and not artifact_store.exists(value["artifact"])
+
+artifact_store = ArtifactStore()
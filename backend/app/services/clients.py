@@ -0,0 +1,203 @@
+# backend/app/services/clients.py
+
+import os
+import time
+import asyncio
+import threading
+import importlib
+import httpx
+
+# One pooled client per provider and API key, shared by all nodes and runs, so
+# connections (and their TLS sessions) are reused instead of being opened for
+# every call. Limits apply per client.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+# How long a call may wait for a free connection when the pool is exhausted
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "30"))
+
+PROVIDER_API_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+}
+# API endpoints can be pointed elsewhere, e.g. at a local mock provider
+PROVIDER_BASE_URLS = {
+    "openai": "OPENAI_BASE_URL",
+    "anthropic": "ANTHROPIC_BASE_URL",
+}
+
+def http_limits():
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def http_timeout():
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT)
+
+class ClientStats:
+    # Request counters for one pooled client, collected by its transport
+    def __init__(self, provider):
+        self.provider = provider
+        self.requests = 0
+        self.in_flight = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.created = time.time()
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+        return time.monotonic()
+
+    def request_finished(self, started, status=None):
+        # `status` is None when the request raised (connect errors, timeouts,
+        # cancellation), which counts as an error
+        with self._lock:
+            self.in_flight -= 1
+            self.total_time += time.monotonic() - started
+            if status is None or status >= 400:
+                self.errors += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "errors": self.errors,
+                "average_time": self.total_time / self.requests if self.requests else 0,
+            }
+
+def _pool_stats(http_client):
+    # Connection counts from the underlying connection pool, when available
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {"connections": len(connections), "idle_connections": idle, "active_connections": len(connections) - idle}
+
+class CountingTransport(httpx.HTTPTransport):
+    # Connection pool of a sync client that counts the requests it sends
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request):
+        started = self.stats.request_started()
+        status = None
+        try:
+            response = super().handle_request(request)
+            status = response.status_code
+            return response
+        finally:
+            self.stats.request_finished(started, status)
+
+class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request):
+        started = self.stats.request_started()
+        status = None
+        try:
+            response = await super().handle_async_request(request)
+            status = response.status_code
+            return response
+        finally:
+            self.stats.request_finished(started, status)
+
+def load_sdk(provider):
+    # The provider SDKs take a while to import; nodes load them from their
+    # warm_up hook, which runs off the event loop
+    if provider not in PROVIDER_API_KEYS:
+        raise ValueError(f"Unknown provider: {provider}")
+    return importlib.import_module(provider)
+
+def _create_client(provider, api_key, sync):
+    stats = ClientStats(provider)
+    transport_class = CountingTransport if sync else AsyncCountingTransport
+    sdk = load_sdk(provider)
+    if provider == "openai":
+        http_client_class = sdk.DefaultHttpxClient if sync else sdk.DefaultAsyncHttpxClient
+        client_class = sdk.OpenAI if sync else sdk.AsyncOpenAI
+    else:
+        http_client_class = sdk.DefaultHttpxClient if sync else sdk.DefaultAsyncHttpxClient
+        client_class = sdk.Anthropic if sync else sdk.AsyncAnthropic
+    http_client = http_client_class(transport=transport_class(stats, limits=http_limits()), timeout=http_timeout())
+    # Retries are left to app.services.provider_limits, which spaces them out
+    # across all calls to the provider
+    client = client_class(
+        api_key=api_key,
+        base_url=os.getenv(PROVIDER_BASE_URLS[provider]) or None,
+        http_client=http_client,
+        timeout=http_timeout(),
+        max_retries=0,
+    )
+    return client, http_client, stats
+
+class ClientManager:
+    def __init__(self):
+        self._clients = {}  # (provider, api key, sync) -> {"client", "http_client", "stats", "loop"}
+        self._lock = threading.Lock()
+
+    def get(self, provider, api_key=None, sync=False):
+        # Return the shared client for a provider and API key (by default the
+        # key from the provider's environment variable), creating it on first use
+        api_key = api_key or os.getenv(PROVIDER_API_KEYS.get(provider, ""), "") or None
+        key = (provider, api_key, sync)
+        # Async connection pools belong to the event loop they were created on
+        loop = None if sync else asyncio.get_running_loop()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is None or entry["loop"] is not loop:
+                client, http_client, stats = _create_client(provider, api_key, sync)
+                entry = {"client": client, "http_client": http_client, "stats": stats, "loop": loop}
+                self._clients[key] = entry
+            return entry["client"]
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._clients.values())
+        clients = []
+        for entry in entries:
+            stats = entry["stats"].to_dict()
+            stats["sync"] = entry["loop"] is None
+            stats.update(_pool_stats(entry["http_client"]))
+            clients.append(stats)
+        return {
+            "clients": clients,
+            "limits": {
+                "max_connections": HTTP_MAX_CONNECTIONS,
+                "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                "keepalive_expiry": HTTP_KEEPALIVE_EXPIRY,
+            },
+        }
+
+    async def close(self):
+        # Close all clients; async clients created on another (now finished)
+        # event loop can't be awaited here and are simply dropped
+        with self._lock:
+            entries = list(self._clients.values())
+            self._clients.clear()
+        loop = asyncio.get_running_loop()
+        for entry in entries:
+            try:
+                if entry["loop"] is None:
+                    entry["http_client"].close()
+                elif entry["loop"] is loop:
+                    await entry["http_client"].aclose()
+            except Exception as e:
+                print(f"Error closing {entry['stats'].provider} client: {str(e)}")
+
+client_manager = ClientManager()
+
+def get_client(provider, api_key=None, sync=False):
+    return client_manager.get(provider, api_key, sync)
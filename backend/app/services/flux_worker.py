@@ -0,0 +1,179 @@
+# backend/app/services/flux_worker.py
+
+import os
+import time
+import queue
+import asyncio
+import threading
+from app.services.local_models import model_manager
+
+# Requests for the same model with the same size, steps and guidance that
+# arrive within FLUX_MAX_WAIT_MS of each other are rendered in one batched
+# forward pass
+FLUX_MAX_BATCH_SIZE = int(os.getenv("FLUX_MAX_BATCH_SIZE", "4"))
+FLUX_MAX_WAIT_MS = float(os.getenv("FLUX_MAX_WAIT_MS", "50"))
+
+class FluxRequest:
+    def __init__(self, loop, model, prompt, height, width, num_inference_steps, guidance_scale, seed):
+        self.loop = loop
+        self.model = model
+        self.prompt = prompt
+        self.height = height
+        self.width = width
+        self.num_inference_steps = num_inference_steps
+        self.guidance_scale = guidance_scale
+        self.seed = seed
+        self.future = loop.create_future()
+        self.updates = asyncio.Queue()
+        self.submitted = time.time()
+
+    @property
+    def batch_key(self):
+        # Only requests that agree on these can share a forward pass
+        return (self.model, self.height, self.width, self.num_inference_steps, self.guidance_scale)
+
+    def cancel(self):
+        # Called from the event loop when the caller goes away; the worker
+        # drops cancelled requests before rendering them
+        self.future.cancel()
+
+    def notify(self, update):
+        self.loop.call_soon_threadsafe(self.updates.put_nowait, update)
+
+    def resolve(self, image=None, error=None):
+        def _set():
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(image)
+            self.updates.put_nowait(None)
+        self.loop.call_soon_threadsafe(_set)
+
+    async def progress(self):
+        # Yields progress updates until the image is ready
+        while True:
+            update = await self.updates.get()
+            if update is None:
+                return
+            yield update
+
+class FluxWorker:
+    # Renders with the FLUX pipelines of the model manager on a dedicated
+    # thread, so rendering never blocks the event loop, and coalesces
+    # compatible requests into batches.
+    def __init__(self, models=model_manager, max_batch_size=FLUX_MAX_BATCH_SIZE, max_wait=FLUX_MAX_WAIT_MS / 1000):
+        self.models = models
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        self._pending = []  # requests that did not fit into the previous batch
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "batches": 0, "images": 0, "cancelled": 0, "errors": 0, "busy_seconds": 0.0}
+
+    def submit(self, prompt, height=1024, width=1024, num_inference_steps=6, guidance_scale=4.0, seed=None, model=None):
+        # `model` names one of the local models; the default one if not given
+        model = self.models.get(model).name
+        self._ensure_started()
+        request = FluxRequest(asyncio.get_running_loop(), model, prompt, height, width, num_inference_steps, guidance_scale, seed)
+        self.counters["requests"] += 1
+        self._requests.put(request)
+        request.notify({"step": 0, "total": num_inference_steps, "status": "queued", "queue_depth": self._requests.qsize()})
+        return request
+
+    def load(self, model=None):
+        # Load a model ahead of its first request, e.g. at warm-up
+        return self.models.load(model)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["queue_depth"] = self._requests.qsize() + len(self._pending)
+        stats["average_batch_size"] = stats["images"] / stats["batches"] if stats["batches"] else 0
+        stats["loaded"] = self.models.is_loaded()
+        return stats
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="flux-worker", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        first = self._pending.pop(0) if self._pending else self._requests.get()
+        batch = [first]
+        # Take compatible requests that are already waiting, then keep
+        # collecting new arrivals until the batch is full or the window closes
+        for request in list(self._pending):
+            if len(batch) < self.max_batch_size and request.batch_key == first.batch_key:
+                self._pending.remove(request)
+                batch.append(request)
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request.batch_key == first.batch_key:
+                batch.append(request)
+            else:
+                self._pending.append(request)
+        live = [request for request in batch if not request.future.cancelled()]
+        self.counters["cancelled"] += len(batch) - len(live)
+        return live
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            started = time.time()
+            try:
+                if not self.models.is_loaded(batch[0].model):
+                    for request in batch:
+                        request.notify({"step": 0, "total": request.num_inference_steps, "status": "loading model"})
+                with self.models.use(batch[0].model) as pipe:
+                    images = self._render(pipe, batch)
+                for request, image in zip(batch, images):
+                    request.resolve(image=image)
+                self.counters["batches"] += 1
+                self.counters["images"] += len(batch)
+            except Exception as e:
+                print(f"Error in FLUX worker: {str(e)}")
+                self.counters["errors"] += 1
+                for request in batch:
+                    request.resolve(error=e)
+            finally:
+                self.counters["busy_seconds"] += time.time() - started
+
+    def _render(self, pipe, batch):
+        import torch
+
+        first = batch[0]
+        generators = []
+        for request in batch:
+            seed = request.seed if request.seed is not None else torch.randint(0, 1000000, (1,)).item()
+            generators.append(torch.Generator("cpu").manual_seed(int(seed)))
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            for request in batch:
+                request.notify({"step": step + 1, "total": first.num_inference_steps, "batch_size": len(batch)})
+            return callback_kwargs
+
+        result = pipe(
+            [request.prompt for request in batch],
+            height=first.height,
+            width=first.width,
+            guidance_scale=first.guidance_scale,
+            num_inference_steps=first.num_inference_steps,
+            generator=generators,
+            output_type="pil",
+            callback_on_step_end=on_step_end,
+        )
+        return result.images
+
+flux_worker = FluxWorker()
@@ -0,0 +1,245 @@
+# backend/app/services/local_models.py
+
+import os
+import gc
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from app.services import metrics
+
+# Local diffusers pipelines, loaded on first use and unloaded again when RAM
+# is needed for another model or when they have not been used for a while.
+# Every model has a residency profile trading speed for memory:
+#   resident            everything on the GPU (or CPU); fastest, most memory
+#   model_offload       whole components moved to the GPU while they run
+#   sequential_offload  single layers moved to the GPU while they run;
+#                       slowest, least GPU memory
+#   quantized           weights quantized to 8 bits with optimum-quanto,
+#                       then resident; about half the memory of bfloat16
+# "quantize" (qfloat8, qint8 or qint4) quantizes the weights with any profile.
+#   LOCAL_MODELS='{"flux-dev": {"path": "/models/flux-dev", "profile": "model_offload"}}'
+FLUX_MODEL_PATH = os.getenv("FLUX_MODEL_PATH", "C:\\Projects\\flux1\\")  # Update this path to your local FLUX model
+FLUX_PROFILE = os.getenv("FLUX_PROFILE", "sequential_offload")
+DEFAULT_LOCAL_MODELS = {
+    "flux": {"path": FLUX_MODEL_PATH, "pipeline": "FluxPipeline", "profile": FLUX_PROFILE},
+}
+LOCAL_MODELS = {**DEFAULT_LOCAL_MODELS, **json.loads(os.getenv("LOCAL_MODELS", "{}"))}
+# Bytes of RAM the loaded models may take together (0 = no limit); the least
+# recently used idle models are unloaded to make room for another one
+MODEL_RAM_BUDGET = int(os.getenv("MODEL_RAM_BUDGET", "0"))
+# Seconds after which a model that isn't used is unloaded (0 = never)
+MODEL_IDLE_TIMEOUT = float(os.getenv("MODEL_IDLE_TIMEOUT", "0"))
+
+PROFILES = ("resident", "model_offload", "sequential_offload", "quantized")
+# Components of a pipeline that are worth quantizing
+QUANTIZED_COMPONENTS = ("transformer", "unet", "text_encoder", "text_encoder_2")
+
+def default_device():
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+def quantize_weights(pipe, weights):
+    from optimum import quanto
+
+    qtype = getattr(quanto, weights)
+    for name in QUANTIZED_COMPONENTS:
+        component = getattr(pipe, name, None)
+        if component is not None:
+            quanto.quantize(component, weights=qtype)
+            quanto.freeze(component)
+
+def load_pipeline(config):
+    import torch
+    import diffusers
+
+    pipeline_class = getattr(diffusers, config.get("pipeline", "FluxPipeline"))
+    pipe = pipeline_class.from_pretrained(config["path"], torch_dtype=getattr(torch, config.get("dtype", "bfloat16")))
+    profile = config.get("profile", "sequential_offload")
+    weights = config.get("quantize") or ("qfloat8" if profile == "quantized" else None)
+    if weights:
+        quantize_weights(pipe, weights)
+    if profile == "model_offload":
+        pipe.enable_model_cpu_offload()
+    elif profile == "sequential_offload":
+        pipe.enable_sequential_cpu_offload()
+    else:
+        pipe.to(default_device())
+    return pipe
+
+def pipeline_bytes(pipe):
+    # Size of the weights of a pipeline's components
+    total = 0
+    for component in getattr(pipe, "components", {}).values():
+        if hasattr(component, "parameters"):
+            for tensor in list(component.parameters()) + list(component.buffers()):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+def free_memory():
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+class LocalModel:
+    def __init__(self, name, config):
+        if config.get("profile", "sequential_offload") not in PROFILES:
+            raise ValueError(f"Unknown profile {config['profile']} of local model {name}, expected one of {', '.join(PROFILES)}")
+        self.name = name
+        self.config = config
+        self.profile = config.get("profile", "sequential_offload")
+        self.pipe = None
+        # Configured size, or the size measured when the model was last loaded
+        self.bytes = config.get("ram_bytes", 0)
+        self.users = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.evictions = 0
+        self.load_lock = threading.Lock()
+
+class ModelManager:
+    # Models are used with `with model_manager.use(name) as pipe:`, which loads
+    # the model if needed and keeps it from being unloaded until the block ends
+    def __init__(self, models=LOCAL_MODELS, budget=MODEL_RAM_BUDGET, idle_timeout=MODEL_IDLE_TIMEOUT, loader=load_pipeline):
+        self.models = {name: LocalModel(name, config) for name, config in models.items()}
+        self.budget = budget
+        self.idle_timeout = idle_timeout
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def get(self, name=None):
+        # The model of a name; the first configured one by default
+        if not name:
+            name = next(iter(self.models))
+        model = self.models.get(name)
+        if model is None:
+            raise ValueError(f"Unknown local model {name}, expected one of {', '.join(self.models)}")
+        return model
+
+    def is_loaded(self, name=None):
+        return self.get(name).pipe is not None
+
+    def acquire(self, name=None):
+        model = self.get(name)
+        with self._lock:
+            model.users += 1
+            model.last_used = time.monotonic()
+        try:
+            with model.load_lock:
+                if model.pipe is None:
+                    self._load(model)
+            return model.pipe
+        except Exception:
+            self.release(model.name)
+            raise
+
+    def release(self, name=None):
+        model = self.get(name)
+        with self._lock:
+            model.users -= 1
+            model.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, name=None):
+        pipe = self.acquire(name)
+        try:
+            yield pipe
+        finally:
+            self.release(name)
+
+    def load(self, name=None):
+        # Load a model without using it, e.g. to warm it up
+        with self.use(name) as pipe:
+            return pipe
+
+    def unload(self, name=None):
+        with self._lock:
+            model = self.get(name)
+            if model.pipe is not None:
+                self._unload(model, "manual")
+
+    def _load(self, model):
+        self._make_room(model)
+        print(f"Loading local model {model.name} ({model.profile})")
+        started = time.monotonic()
+        pipe = self.loader(model.config)
+        duration = time.monotonic() - started
+        with self._lock:
+            model.pipe = pipe
+            model.bytes = model.config.get("ram_bytes") or pipeline_bytes(pipe)
+            model.loads += 1
+        metrics.model_loads.inc(model=model.name, profile=model.profile)
+        metrics.model_load_duration.observe(duration, model=model.name)
+        # The measured size may be larger than expected
+        self._make_room(model)
+        self._start_reaper()
+
+    def _make_room(self, model):
+        # Unload the least recently used models that aren't in use until
+        # `model` fits into the budget
+        if not self.budget:
+            return
+        with self._lock:
+            while True:
+                loaded = [other for other in self.models.values() if other.pipe is not None and other is not model]
+                if sum(other.bytes for other in loaded) + model.bytes <= self.budget:
+                    return
+                idle = [other for other in loaded if other.users == 0]
+                if not idle:
+                    print(f"Local model {model.name} exceeds the RAM budget, but every other model is in use")
+                    return
+                self._unload(min(idle, key=lambda other: other.last_used), "budget")
+
+    def _unload(self, model, reason):
+        # Called with the lock held
+        print(f"Unloading local model {model.name} ({reason})")
+        model.pipe = None
+        model.evictions += 1
+        metrics.model_evictions.inc(model=model.name, reason=reason)
+        free_memory()
+
+    def _start_reaper(self):
+        if self.idle_timeout <= 0 or self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap(self):
+        # Unloads models that haven't been used for idle_timeout seconds
+        while True:
+            time.sleep(min(self.idle_timeout / 2, 60))
+            now = time.monotonic()
+            with self._lock:
+                for model in self.models.values():
+                    if model.pipe is not None and model.users == 0 and now - model.last_used > self.idle_timeout:
+                        self._unload(model, "idle")
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            models = {
+                name: {
+                    "profile": model.profile,
+                    "loaded": model.pipe is not None,
+                    "bytes": model.bytes,
+                    "in_use": model.users,
+                    "idle_seconds": now - model.last_used if model.pipe is not None and not model.users else 0,
+                    "loads": model.loads,
+                    "evictions": model.evictions,
+                }
+                for name, model in self.models.items()
+            }
+            used = sum(model.bytes for model in self.models.values() if model.pipe is not None)
+        return {"budget_bytes": self.budget, "used_bytes": used, "models": models}
+
+model_manager = ModelManager()
@@ -0,0 +1,228 @@
+# backend/app/services/metrics.py
+
+import json
+import time
+import threading
+import contextvars
+
+# Metrics of every node execution, aggregated into histograms and counters
+# that /metrics serves in the Prometheus text format.
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_lock = threading.Lock()
+_metrics = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with _lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, entry in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, entry):
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(entry[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+class Gauge:
+    # Current values, read with collect() when the metrics are rendered;
+    # collect returns {label values: value}
+    def __init__(self, name, help_text, labelnames=(), collect=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        _metrics.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+node_queue_wait = Histogram(
+    "pipeline_node_queue_wait_seconds", "Time a ready node waited for a free execution slot.", ["node_type"])
+node_duration = Histogram(
+    "pipeline_node_duration_seconds", "Time from starting a node to its result.", ["node_type", "status"])
+node_first_chunk = Histogram(
+    "pipeline_node_time_to_first_chunk_seconds", "Time from starting a node to its first output.", ["node_type"])
+node_rate_limit_wait = Histogram(
+    "pipeline_node_rate_limit_wait_seconds", "Time a node waited for provider rate limits.", ["node_type"])
+node_input_bytes = Histogram(
+    "pipeline_node_input_bytes", "Size of node inputs.", ["node_type"], SIZE_BUCKETS)
+node_output_bytes = Histogram(
+    "pipeline_node_output_bytes", "Size of node results.", ["node_type"], SIZE_BUCKETS)
+node_cache = Counter(
+    "pipeline_node_cache_total", "Result cache lookups of node executions.", ["node_type", "result"])
+prompt_cache = Counter(
+    "pipeline_prompt_cache_total", "Prompt cache lookups of LLM nodes.", ["provider", "model", "result"])
+prompt_cache_tokens_saved = Counter(
+    "pipeline_prompt_cache_tokens_saved_total", "Provider tokens saved by prompt cache hits.", ["provider", "model"])
+node_single_flight = Counter(
+    "pipeline_node_single_flight_total", "Node calls made (call) or joined while in flight (shared).", ["node_type", "result"])
+provider_tokens = Counter(
+    "pipeline_provider_tokens_total", "Tokens used by provider calls.", ["provider", "model", "kind"])
+model_loads = Counter(
+    "pipeline_model_loads_total", "Loads of local models.", ["model", "profile"])
+model_load_duration = Histogram(
+    "pipeline_model_load_seconds", "Time taken to load a local model.", ["model"])
+model_evictions = Counter(
+    "pipeline_model_evictions_total", "Local models unloaded, by reason (budget, idle or manual).", ["model", "reason"])
+run_duration = Histogram(
+    "pipeline_run_duration_seconds", "Duration of pipeline runs.", ["status"])
+
+def render():
+    with _lock:
+        lines = []
+        for metric in _metrics:
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def size_of(value):
+    # Approximate size in bytes of a node's input or output
+    if value is None:
+        return 0
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    return len(json.dumps(value, default=str))
+
+# The metrics of the node that is currently executing (set per node task), so
+# that provider calls deep inside a node can report their token usage
+current_node = contextvars.ContextVar("current_node_metrics", default=None)
+
+class NodeMetrics:
+    def __init__(self, node_type, ready=None):
+        self.node_type = node_type
+        self.ready = ready or time.monotonic()
+        self.started = None
+        self.first_chunk = None
+        self.finished = None
+        self.input_bytes = None
+        self.output_bytes = None
+        self.rate_limit_wait = 0.0
+        self.cached = False
+        self.shared = False
+        self.usage = {}
+
+    def start(self):
+        self.started = time.monotonic()
+
+    def chunk(self):
+        if self.first_chunk is None:
+            self.first_chunk = time.monotonic()
+
+    def finish(self, output=None):
+        # Called with the node's result (or error)
+        self.chunk()
+        self.finished = time.monotonic()
+        if output is not None:
+            self.output_bytes = size_of(output)
+
+    def observe(self, status):
+        # Add the node's execution to the aggregated metrics
+        node_type = self.node_type
+        node_queue_wait.observe(self.started - self.ready, node_type=node_type)
+        if self.finished is None:
+            return
+        node_duration.observe(self.finished - self.started, node_type=node_type, status=status)
+        node_first_chunk.observe(self.first_chunk - self.started, node_type=node_type)
+        if self.rate_limit_wait:
+            node_rate_limit_wait.observe(self.rate_limit_wait, node_type=node_type)
+        if self.input_bytes is not None:
+            node_input_bytes.observe(self.input_bytes, node_type=node_type)
+        if self.output_bytes is not None:
+            node_output_bytes.observe(self.output_bytes, node_type=node_type)
+
+    def to_dict(self):
+        metrics = {
+            "queue_wait": self.started - self.ready,
+            "duration": (self.finished or time.monotonic()) - self.started,
+            "time_to_first_chunk": self.first_chunk - self.started if self.first_chunk else None,
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes,
+            "cached": self.cached,
+        }
+        if self.shared:
+            metrics["shared"] = True
+        if self.rate_limit_wait:
+            metrics["rate_limit_wait"] = self.rate_limit_wait
+        if self.usage:
+            metrics["usage"] = self.usage
+        return metrics
+
+def record_usage(provider, model, input_tokens=0, output_tokens=0):
+    # Called by provider nodes with the token usage reported by the API
+    input_tokens = int(input_tokens or 0)
+    output_tokens = int(output_tokens or 0)
+    provider_tokens.inc(input_tokens, provider=provider, model=model, kind="input")
+    provider_tokens.inc(output_tokens, provider=provider, model=model, kind="output")
+    node = current_node.get()
+    if node is not None:
+        node.usage["input_tokens"] = node.usage.get("input_tokens", 0) + input_tokens
+        node.usage["output_tokens"] = node.usage.get("output_tokens", 0) + output_tokens
+
+def average_duration(node_type):
+    # Mean duration of successful executions of a node type, None if it
+    # hasn't run yet
+    with _lock:
+        entry = node_duration.values.get((node_type, "ok"))
+        return entry[-2] / entry[-1] if entry else None
+
+def record_rate_limit_wait(seconds):
+    node = current_node.get()
+    if node is not None:
+        node.rate_limit_wait += seconds
@@ -0,0 +1,210 @@
+# backend/app/services/prompt_cache.py
+
+import os
+import re
+import time
+import zlib
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from app.services import metrics
+from app.services.provider_limits import estimate_tokens
+
+# Completions of the LLM nodes, reused for prompts that are the same or
+# nearly the same (differing in whitespace, casing or a few characters) as
+# an earlier one. Prompts are compared by the MinHash signatures of their
+# character shingles, which estimate their Jaccard similarity; signatures
+# are kept in one NumPy matrix per model and request settings, so a lookup
+# is a single vectorized comparison. Nodes opt in with their "prompt_cache"
+# option.
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "1") not in ("0", "false", "False")
+# Minimum estimated similarity (0-1) of a prompt to a cached one to reuse its completion
+PROMPT_CACHE_THRESHOLD = float(os.getenv("PROMPT_CACHE_THRESHOLD", "0.9"))
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "10000"))
+# Seconds after which cached completions expire (0 = never)
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "86400"))
+# Signature length: more hash functions estimate the similarity more precisely
+PROMPT_CACHE_NUM_HASHES = int(os.getenv("PROMPT_CACHE_NUM_HASHES", "128"))
+SHINGLE_SIZE = 5
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2^32
+_MASK = np.uint64(0xFFFFFFFF)
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize(prompt):
+    # Differences in whitespace, casing and Unicode representation don't count
+    text = unicodedata.normalize("NFKC", str(prompt))
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+class MinHasher:
+    def __init__(self, num_hashes=PROMPT_CACHE_NUM_HASHES, shingle_size=SHINGLE_SIZE, seed=1):
+        rng = np.random.default_rng(seed)
+        # Random hash functions h(x) = (a * x + b) mod p; a * x + b fits
+        # into 64 bits for 32-bit a, b and x
+        self.a = rng.integers(1, 2 ** 32, size=(num_hashes, 1), dtype=np.uint64)
+        self.b = rng.integers(0, 2 ** 32, size=(num_hashes, 1), dtype=np.uint64)
+        self.shingle_size = shingle_size
+
+    def shingles(self, text):
+        size = self.shingle_size
+        if len(text) <= size:
+            return {text}
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def signature(self, text):
+        # The minimum of every hash function over the prompt's shingles
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in self.shingles(text)), dtype=np.uint64)
+        return (((self.a * hashes[np.newaxis, :] + self.b) % _PRIME) & _MASK).min(axis=1).astype(np.uint32)
+
+class _Scope:
+    # Cached completions of one model with the same request settings. Rows of
+    # `signatures` and `last_used` are the entries, in the order of `entries`.
+    def __init__(self, num_hashes):
+        self.signatures = np.zeros((16, num_hashes), dtype=np.uint32)
+        self.last_used = np.zeros(16, dtype=np.float64)
+        self.entries = []  # {"digest", "completion", "tokens", "created"}
+        self.digests = {}  # digest of the normalized prompt -> row
+
+    def add(self, signature, entry, now):
+        row = len(self.entries)
+        if row == len(self.signatures):
+            self.signatures = np.concatenate([self.signatures, np.zeros_like(self.signatures)])
+            self.last_used = np.concatenate([self.last_used, np.zeros_like(self.last_used)])
+        self.signatures[row] = signature
+        self.last_used[row] = now
+        self.entries.append(entry)
+        self.digests[entry["digest"]] = row
+
+    def remove(self, row):
+        # Move the last entry into the freed row
+        last = len(self.entries) - 1
+        del self.digests[self.entries[row]["digest"]]
+        if row != last:
+            self.signatures[row] = self.signatures[last]
+            self.last_used[row] = self.last_used[last]
+            self.entries[row] = self.entries[last]
+            self.digests[self.entries[row]["digest"]] = row
+        self.entries.pop()
+
+    def closest(self, signature):
+        # (row, estimated similarity) of the most similar cached prompt
+        count = len(self.entries)
+        if not count:
+            return None, 0.0
+        similarity = (self.signatures[:count] == signature).mean(axis=1)
+        row = int(similarity.argmax())
+        return row, float(similarity[row])
+
+class PromptCache:
+    def __init__(self, threshold=PROMPT_CACHE_THRESHOLD, max_entries=PROMPT_CACHE_MAX_ENTRIES, ttl=PROMPT_CACHE_TTL,
+                 num_hashes=PROMPT_CACHE_NUM_HASHES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.num_hashes = num_hashes
+        self.hasher = MinHasher(num_hashes)
+        self._scopes = {}  # (provider, model, settings) -> _Scope
+        self._size = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0,
+                         "evictions": 0, "expirations": 0, "tokens_saved": 0}
+
+    def _expired(self, entry, now):
+        return self.ttl > 0 and now - entry["created"] > self.ttl
+
+    def lookup(self, provider, model, prompt, settings=()):
+        # The cached completion of the same or a similar prompt sent to the
+        # same model with the same settings (system message, temperature, ...),
+        # or None
+        text = normalize(prompt)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        now = time.time()
+        with self._lock:
+            scope = self._scopes.get((provider, model, repr(settings)))
+            row, similarity, exact = None, 0.0, False
+            if scope is not None:
+                row = scope.digests.get(digest)
+                if row is not None:
+                    similarity, exact = 1.0, True
+                else:
+                    row, similarity = scope.closest(self.hasher.signature(text))
+            if row is not None and similarity >= self.threshold and self._expired(scope.entries[row], now):
+                scope.remove(row)
+                self._size -= 1
+                self.counters["expirations"] += 1
+                row = None
+            if row is None or similarity < self.threshold:
+                self.counters["misses"] += 1
+                metrics.prompt_cache.inc(provider=provider, model=model, result="miss")
+                return None
+            entry = scope.entries[row]
+            scope.last_used[row] = now
+            self.counters["hits"] += 1
+            self.counters["exact_hits" if exact else "near_hits"] += 1
+            self.counters["tokens_saved"] += entry["tokens"]
+        metrics.prompt_cache.inc(provider=provider, model=model, result="hit" if exact else "near_hit")
+        metrics.prompt_cache_tokens_saved.inc(entry["tokens"], provider=provider, model=model)
+        node = metrics.current_node.get()
+        if node is not None:
+            node.cached = True
+        return entry["completion"]
+
+    def store(self, provider, model, prompt, completion, settings=()):
+        text = normalize(prompt)
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        # Tokens a hit saves: those the provider reported for the call that
+        # produced the completion, or an estimate
+        node = metrics.current_node.get()
+        if node is not None and node.usage:
+            tokens = sum(node.usage.values())
+        else:
+            tokens = estimate_tokens(text, 0) + estimate_tokens(completion, 0)
+        entry = {"digest": digest, "completion": completion, "tokens": tokens, "created": time.time()}
+        signature = self.hasher.signature(text)
+        with self._lock:
+            scope = self._scopes.get((provider, model, repr(settings)))
+            if scope is None:
+                scope = self._scopes[(provider, model, repr(settings))] = _Scope(self.num_hashes)
+            if digest in scope.digests:
+                row = scope.digests[digest]
+                scope.entries[row] = entry
+                scope.last_used[row] = entry["created"]
+                return
+            scope.add(signature, entry, entry["created"])
+            self._size += 1
+            self.counters["stores"] += 1
+            while self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # Drop the least recently used entry of all scopes
+        oldest = None
+        for key, scope in self._scopes.items():
+            if scope.entries:
+                row = int(scope.last_used[:len(scope.entries)].argmin())
+                if oldest is None or scope.last_used[row] < oldest[2]:
+                    oldest = (key, row, scope.last_used[row])
+        key, row, _ = oldest
+        self._scopes[key].remove(row)
+        if not self._scopes[key].entries:
+            del self._scopes[key]
+        self._size -= 1
+        self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats.update({"entries": self._size, "scopes": len(self._scopes), "threshold": self.threshold})
+            return stats
+
+prompt_cache = PromptCache() if PROMPT_CACHE_ENABLED else None
+
+def enabled(options):
+    # Whether a node reuses completions of similar prompts
+    return prompt_cache is not None and str(options.get("prompt_cache", False)).lower() in ("true", "1", "on")
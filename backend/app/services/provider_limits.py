@@ -0,0 +1,360 @@
+# backend/app/services/provider_limits.py
+
+import os
+import json
+import time
+import random
+import asyncio
+import contextlib
+import contextvars
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from app.services import metrics
+
+# Requests and tokens per minute allowed for each provider, optionally
+# overridden per model with "provider/model" keys, e.g.
+#   PROVIDER_LIMITS='{"openai": {"rpm": 500, "tpm": 30000}, "openai/gpt-4o-mini": {"rpm": 500, "tpm": 200000}}'
+# A limit of 0 disables it.
+DEFAULT_PROVIDER_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 30000},
+    "anthropic": {"rpm": 50, "tpm": 40000},
+}
+PROVIDER_LIMITS = {**DEFAULT_PROVIDER_LIMITS, **json.loads(os.getenv("PROVIDER_LIMITS", "{}"))}
+# Seconds worth of quota that may be used in a single burst
+PROVIDER_BURST_SECONDS = float(os.getenv("PROVIDER_BURST_SECONDS", "1"))
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "5"))
+PROVIDER_BACKOFF_BASE = float(os.getenv("PROVIDER_BACKOFF_BASE", "1"))
+PROVIDER_BACKOFF_MAX = float(os.getenv("PROVIDER_BACKOFF_MAX", "60"))
+
+# After a 429 the allowed rate is halved, and it recovers by a small step with
+# every successful call, so the limiter settles just below the real quota
+ADAPTIVE_DECREASE = 0.5
+ADAPTIVE_INCREASE = 0.05
+ADAPTIVE_MIN_FACTOR = 0.05
+
+# The run a call belongs to; queued calls are served round-robin across runs
+# so that one large run can't starve the others
+current_run = contextvars.ContextVar("provider_limits_run", default=None)
+
+class ProviderError(Exception):
+    # A failed provider call, reported to the client as a structured error
+    def __init__(self, message, provider=None, model=None, kind="error", status=None,
+                 retryable=False, retry_after=None, attempts=1):
+        super().__init__(message)
+        self.message = message
+        self.provider = provider
+        self.model = model
+        self.kind = kind
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.attempts = attempts
+
+    def to_dict(self):
+        return {
+            "type": self.kind,
+            "message": self.message,
+            "provider": self.provider,
+            "model": self.model,
+            "status": self.status,
+            "retryable": self.retryable,
+            "attempts": self.attempts,
+        }
+
+def _retry_after(headers):
+    # Seconds to wait as requested by the provider, if it said so
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def classify(e, provider, model, attempts=1):
+    # Map an exception raised by the OpenAI or Anthropic SDK (or httpx) to a
+    # ProviderError, deciding whether the call may be retried
+    if isinstance(e, ProviderError):
+        return e
+    status = getattr(e, "status_code", None)
+    response = getattr(e, "response", None)
+    retry_after = _retry_after(getattr(response, "headers", None))
+    names = {cls.__name__ for cls in type(e).__mro__}
+    if status == 429:
+        kind, retryable = "rate_limited", True
+    elif status == 529 or status == 503:
+        kind, retryable = "overloaded", True
+    elif status is not None and status >= 500:
+        kind, retryable = "server_error", True
+    elif status in (401, 403):
+        kind, retryable = "auth_error", False
+    elif status is not None:
+        kind, retryable = "bad_request", status in (408, 409)
+    elif names & {"APITimeoutError", "TimeoutException"}:
+        kind, retryable = "timeout", True
+    elif names & {"APIConnectionError", "TransportError"}:
+        kind, retryable = "connection_error", True
+    else:
+        kind, retryable = "error", False
+    return ProviderError(str(e), provider, model, kind, status, retryable, retry_after, attempts)
+
+def estimate_tokens(text, max_tokens):
+    # Rough cost of a call against the tokens-per-minute quota: about four
+    # characters per prompt token plus the completion budget
+    return len(text or '') // 4 + 1 + int(max_tokens or 0)
+
+def backoff_delay(attempt, retry_after=None):
+    # Full-jitter exponential backoff; a retry-after from the provider is a
+    # lower bound, with a little jitter so waiting calls don't retry in lockstep
+    if retry_after is not None:
+        return retry_after + random.uniform(0, min(1.0, retry_after * 0.1 + 0.1))
+    return random.uniform(0, min(PROVIDER_BACKOFF_MAX, PROVIDER_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+class Bucket:
+    # Token bucket refilled at `per_minute` units per minute (scaled by the
+    # limiter's adaptive factor); 0 means unlimited
+    def __init__(self, per_minute):
+        self.set_rate(per_minute)
+        self.level = self.capacity
+
+    def set_rate(self, per_minute):
+        self.per_minute = float(per_minute or 0)
+        self.capacity = max(1.0, self.per_minute * PROVIDER_BURST_SECONDS / 60)
+        self.level = min(getattr(self, "level", self.capacity), self.capacity)
+
+    def refill(self, elapsed, factor):
+        if self.per_minute:
+            self.level = min(self.capacity, self.level + elapsed * self.per_minute / 60 * factor)
+
+    def wait_time(self, cost, factor):
+        # Seconds until `cost` units are available (0 if they are now). A call
+        # costing more than the capacity goes through once the bucket is full;
+        # it is charged in full, so the level goes negative and later calls
+        # wait until the whole cost has been refilled.
+        if not self.per_minute:
+            return 0.0
+        needed = min(cost, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / (self.per_minute / 60 * factor)
+
+    def take(self, cost):
+        if self.per_minute:
+            self.level -= cost
+
+class ModelLimiter:
+    # Requests/min and tokens/min limits for one provider model, shared by all
+    # runs. Waiting calls are queued per run and granted round-robin.
+    def __init__(self, provider, model, rpm, tpm):
+        self.provider = provider
+        self.model = model
+        self.requests = Bucket(rpm)
+        self.tokens = Bucket(tpm)
+        self.factor = 1.0
+        self.paused_until = 0.0
+        self.updated = time.monotonic()
+        self.loop = asyncio.get_running_loop()
+        self._waiters = OrderedDict()  # run -> deque of (future, cost)
+        self._timer = None
+        self.counters = {"requests": 0, "tokens": 0, "rate_limited": 0, "retries": 0, "failures": 0, "wait_seconds": 0.0}
+
+    async def acquire(self, cost):
+        run = current_run.get()
+        future = self.loop.create_future()
+        self._waiters.setdefault(run, deque()).append((future, cost))
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Let the calls queued behind this one move up
+            self._dispatch()
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.counters["wait_seconds"] += waited
+            metrics.record_rate_limit_wait(waited)
+        self.counters["requests"] += 1
+        self.counters["tokens"] += cost
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        self.requests.refill(now - self.updated, self.factor)
+        self.tokens.refill(now - self.updated, self.factor)
+        self.updated = now
+        while self._waiters:
+            if now < self.paused_until:
+                self._timer = self.loop.call_later(self.paused_until - now, self._dispatch)
+                return
+            run, queue = next(iter(self._waiters.items()))
+            future, cost = queue[0]
+            if future.done():
+                # The caller was cancelled while waiting
+                queue.popleft()
+            else:
+                wait = max(self.requests.wait_time(1, self.factor), self.tokens.wait_time(cost, self.factor))
+                if wait > 0:
+                    self._timer = self.loop.call_later(wait, self._dispatch)
+                    return
+                self.requests.take(1)
+                self.tokens.take(cost)
+                queue.popleft()
+                future.set_result(None)
+            # Next turn goes to the next run
+            del self._waiters[run]
+            if queue:
+                self._waiters[run] = queue
+
+    def succeeded(self):
+        self.factor = min(1.0, self.factor + ADAPTIVE_INCREASE)
+
+    def rate_limited(self, retry_after=None):
+        # The provider pushed back: slow down and hold every queued call until
+        # it accepts requests again, instead of letting them all hit the 429
+        self.counters["rate_limited"] += 1
+        self.factor = max(ADAPTIVE_MIN_FACTOR, self.factor * ADAPTIVE_DECREASE)
+        self.requests.level = min(self.requests.level, 0.0)
+        pause = retry_after if retry_after is not None else backoff_delay(1)
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def stats(self):
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "rpm": self.requests.per_minute,
+            "tpm": self.tokens.per_minute,
+            "factor": self.factor,
+            "waiting": sum(len(queue) for queue in self._waiters.values()),
+            "paused_for": max(0.0, self.paused_until - time.monotonic()),
+            **self.counters,
+        }
+
+_limiters = {}
+# provider -> requests per minute set with limit_requests(), e.g. by running
+# batches; the lowest one applies on top of PROVIDER_LIMITS
+_request_caps = {}
+
+def get_limits(provider, model):
+    limits = {**PROVIDER_LIMITS.get(provider, {}), **PROVIDER_LIMITS.get(f"{provider}/{model}", {})}
+    rpm = limits.get("rpm", 0)
+    if _request_caps.get(provider):
+        cap = min(_request_caps[provider])
+        rpm = min(rpm, cap) if rpm else cap
+    return rpm, limits.get("tpm", 0)
+
+def parse_request_limits(spec):
+    # "openai=500,anthropic=50" or {"openai": 500, ...} -> {"openai": 500.0, ...};
+    # raises ValueError for malformed specs and limits that aren't positive
+    if not spec:
+        return {}
+    if isinstance(spec, dict):
+        items = list(spec.items())
+    elif isinstance(spec, str):
+        items = [part.split('=', 1) for part in spec.split(',') if part.strip()]
+    else:
+        raise ValueError(f"Invalid rate limits {spec!r}, expected provider=requests_per_minute pairs")
+    limits = {}
+    for item in items:
+        if len(item) != 2:
+            raise ValueError(f"Invalid rate limit {item[0]!r}, expected provider=requests_per_minute")
+        provider, limit = item
+        try:
+            limit = float(limit)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid rate limit for {provider}: {limit!r}")
+        if limit <= 0:
+            raise ValueError(f"Rate limit for {provider} must be positive")
+        limits[str(provider).strip()] = limit
+    return limits
+
+@contextlib.contextmanager
+def limit_requests(limits):
+    # Lowers the requests per minute of the given providers ({"openai": 500,
+    # ...}) while in effect, for every model and every run sharing the limiter
+    for provider, rpm in limits.items():
+        _request_caps.setdefault(provider, []).append(rpm)
+    _update_rates(limits)
+    try:
+        yield
+    finally:
+        for provider, rpm in limits.items():
+            _request_caps[provider].remove(rpm)
+            if not _request_caps[provider]:
+                del _request_caps[provider]
+        _update_rates(limits)
+
+def _update_rates(providers):
+    for (provider, model), limiter in list(_limiters.items()):
+        if provider in providers:
+            limiter.requests.set_rate(get_limits(provider, model)[0])
+
+def get_limiter(provider, model):
+    limiter = _limiters.get((provider, model))
+    # Limiters (like the futures they hand out) belong to one event loop
+    if limiter is None or limiter.loop is not asyncio.get_running_loop():
+        limiter = ModelLimiter(provider, model, *get_limits(provider, model))
+        _limiters[(provider, model)] = limiter
+    return limiter
+
+def _handle_failure(limiter, e, attempt, started):
+    # Returns the delay before retrying, or raises the structured error
+    error = classify(e, limiter.provider, limiter.model, attempt)
+    if error.kind == "rate_limited":
+        limiter.rate_limited(error.retry_after)
+    if started or not error.retryable or attempt > PROVIDER_MAX_RETRIES:
+        limiter.counters["failures"] += 1
+        raise error from e
+    limiter.counters["retries"] += 1
+    return backoff_delay(attempt, error.retry_after)
+
+async def call(provider, model, estimated_tokens, request):
+    # Run `request()` (a coroutine function making one provider call) within
+    # the provider's limits, retrying transient failures
+    limiter = get_limiter(provider, model)
+    attempt = 0
+    while True:
+        attempt += 1
+        await limiter.acquire(estimated_tokens)
+        try:
+            result = await request()
+        except Exception as e:
+            await asyncio.sleep(_handle_failure(limiter, e, attempt, False))
+            continue
+        limiter.succeeded()
+        return result
+
+async def stream(provider, model, estimated_tokens, open_stream):
+    # Like call(), for streaming responses: `open_stream()` returns an async
+    # iterator. A call is only retried if it fails before anything was yielded.
+    limiter = get_limiter(provider, model)
+    attempt = 0
+    while True:
+        attempt += 1
+        await limiter.acquire(estimated_tokens)
+        started = False
+        try:
+            async for item in open_stream():
+                started = True
+                yield item
+        except Exception as e:
+            await asyncio.sleep(_handle_failure(limiter, e, attempt, started))
+            continue
+        limiter.succeeded()
+        return
+
+def get_stats():
+    return [limiter.stats() for limiter in list(_limiters.values())]
@@ -0,0 +1,243 @@
+# backend/app/services/sse.py
+
+import os
+import json
+import time
+import zlib
+import asyncio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Server-sent event streams of pipeline runs. Events are encoded with
+# SSE_ENCODER, bursts of intermediate events (tokens, progress) of a node are
+# merged within SSE_COALESCE_MS, everything that is ready is written in one
+# chunk, and an idle stream gets a comment every SSE_HEARTBEAT_SECONDS so that
+# proxies don't close it during long-running nodes.
+SSE_ENCODER = os.getenv("SSE_ENCODER", "orjson")
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "20"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Content encodings offered to clients, in order of preference
+SSE_COMPRESSION = [name.strip() for name in os.getenv("SSE_COMPRESSION", "br,gzip").split(',') if name.strip()]
+
+HEARTBEAT = b": keep-alive\n\n"
+
+def _encode_json(event):
+    return json.dumps(event, default=str).encode('utf-8')
+
+def _encode_orjson(event):
+    return orjson.dumps(event, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+encoders = {"json": _encode_json}
+if orjson is not None:
+    encoders["orjson"] = _encode_orjson
+
+def register_encoder(name, encode):
+    # encode(event) must return the event's JSON as bytes
+    encoders[name] = encode
+
+def get_encoder(name=None):
+    name = name or SSE_ENCODER
+    if name not in encoders:
+        print(f"SSE encoder {name} is not available, using json")
+        return encoders["json"]
+    return encoders[name]
+
+def frame(data, event_id=None):
+    if event_id is not None:
+        return b"id: %d\ndata: %s\n\n" % (event_id, data)
+    return b"data: " + data + b"\n\n"
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        # Sync-flushed, so every chunk reaches the client right away
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=5)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+_compressors = {"gzip": _Gzip}
+if brotli is not None:
+    _compressors["br"] = _Brotli
+
+def negotiate_encoding(accept_encoding):
+    # The preferred SSE_COMPRESSION encoding the client accepts, or None
+    accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+    for name in SSE_COMPRESSION:
+        if name in accepted and name in _compressors:
+            return name
+    return None
+
+def is_delta(event):
+    # Streamed tokens of a node. Its result repeats them in full, so they
+    # aren't needed to catch up on a run.
+    return isinstance(event, dict) and isinstance(event.get("intermediate"), dict) and "delta" in event["intermediate"]
+
+# Keys of a pure progress update, such as the denoising steps of an image
+# model. Updates with anything else, e.g. the per-chunk results of Map
+# Chunks, are never merged away.
+PROGRESS_KEYS = {"step", "total", "status", "queue_depth", "batch_size"}
+
+def _is_progress(intermediate):
+    return "step" in intermediate and set(intermediate) <= PROGRESS_KEYS
+
+def _merge(pending, event):
+    # Folds an intermediate event into the pending one of the same node:
+    # token deltas are concatenated, progress updates replaced by the latest
+    previous = pending["intermediate"]
+    current = event["intermediate"]
+    if set(previous) == set(current) == {"delta"} and isinstance(previous["delta"], str) and isinstance(current["delta"], str):
+        pending["intermediate"] = {"delta": previous["delta"] + current["delta"]}
+        return True
+    if _is_progress(previous) and _is_progress(current):
+        pending["intermediate"] = current
+        return True
+    return False
+
+_END = object()
+_TICK = object()
+
+async def stream(events, encode=None, encoding=None, coalesce=SSE_COALESCE_MS / 1000, heartbeat=SSE_HEARTBEAT_SECONDS,
+                 replay=(), next_id=None, record=None):
+    # Turns an async iterator of event dicts into SSE response chunks (bytes).
+    # `replay` are (event id, encoded event) pairs sent first, e.g. the events
+    # a reconnecting client missed. With `next_id`, the events sent get ids
+    # counting up from it, and record(event_id, data, event) is called for
+    # each.
+    encode = encode or get_encoder()
+    compressor = _compressors[encoding]() if encoding else None
+    queue = asyncio.Queue()
+
+    def emit(event):
+        nonlocal next_id
+        data = encode(event)
+        if next_id is None:
+            return frame(data)
+        event_id = next_id
+        next_id += 1
+        if record is not None:
+            record(event_id, data, event)
+        return frame(data, event_id)
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_END)
+
+    loop = asyncio.get_running_loop()
+    task = asyncio.create_task(pump())
+    pending = {}  # node id -> intermediate event waiting to be merged with the next ones
+    pending_since = None
+    last_write = time.monotonic()
+    try:
+        if replay:
+            data = b"".join(frame(encoded, event_id) for event_id, encoded in replay)
+            yield compressor.compress(data) if compressor else data
+        done = False
+        while not done:
+            # Wait for the next event, but no longer than the coalescing window
+            # of pending events or the heartbeat interval
+            now = time.monotonic()
+            timeout = heartbeat - (now - last_write) if heartbeat else None
+            if pending:
+                flush_in = coalesce - (now - pending_since)
+                timeout = flush_in if timeout is None else min(timeout, flush_in)
+            batch = []
+            if queue.empty() and (timeout is None or timeout > 0):
+                # A timer wakes us up with a tick if nothing arrives in time
+                timer = loop.call_later(timeout, queue.put_nowait, _TICK) if timeout is not None else None
+                batch.append(await queue.get())
+                if timer is not None:
+                    timer.cancel()
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+
+            out = []
+            for event in batch:
+                if event is _TICK:
+                    continue
+                if event is _END:
+                    done = True
+                    break
+                if isinstance(event, Exception):
+                    raise event
+                node_id = event.get("id")
+                if "intermediate" in event and node_id is not None and coalesce > 0:
+                    if node_id in pending and _merge(pending[node_id], event):
+                        continue
+                    if node_id in pending:
+                        out.append(emit(pending.pop(node_id)))
+                    if not pending:
+                        pending_since = time.monotonic()
+                    pending[node_id] = dict(event)
+                    continue
+                # Anything else goes out right away, after the pending
+                # intermediate events it follows
+                for pending_event in pending.values():
+                    out.append(emit(pending_event))
+                pending.clear()
+                out.append(emit(event))
+            if pending and (done or time.monotonic() - pending_since >= coalesce):
+                for pending_event in pending.values():
+                    out.append(emit(pending_event))
+                pending.clear()
+
+            if out:
+                data = b"".join(out)
+            elif heartbeat and time.monotonic() - last_write >= heartbeat:
+                data = HEARTBEAT
+            else:
+                continue
+            last_write = time.monotonic()
+            yield compressor.compress(data) if compressor else data
+        if compressor:
+            yield compressor.finish()
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+async def relay(batches, encoding=None, heartbeat=SSE_HEARTBEAT_SECONDS):
+    # Turns an async iterator of lists of (event id, encoded event), e.g. the
+    # events a worker process journals, into SSE response chunks. An empty
+    # list means that nothing new has arrived.
+    compressor = _compressors[encoding]() if encoding else None
+    last_write = time.monotonic()
+    async for batch in batches:
+        if batch:
+            data = b"".join(frame(encoded, event_id) for event_id, encoded in batch)
+        elif heartbeat and time.monotonic() - last_write >= heartbeat:
+            data = HEARTBEAT
+        else:
+            continue
+        last_write = time.monotonic()
+        yield compressor.compress(data) if compressor else data
+    if compressor:
+        yield compressor.finish()
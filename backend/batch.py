@@ -0,0 +1,36 @@
+# backend/batch.py
+
+import json
+import asyncio
+import argparse
+from app.pipelines.batch import run_batch, BATCH_CONCURRENCY
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a pipeline over every row of a JSONL or CSV file")
+    parser.add_argument('pipeline', help="Pipeline configuration (JSON file with nodes and edges)")
+    parser.add_argument('input', help="Input rows (.jsonl or .csv)")
+    parser.add_argument('output', help="JSONL file the results are appended to")
+    parser.add_argument('--concurrency', type=int, default=BATCH_CONCURRENCY, help="Rows processed at the same time")
+    parser.add_argument('--rate-limit', default=None, help="Requests per minute per provider, e.g. openai=500,anthropic=50")
+    parser.add_argument('--input-field', default='input', help="Field of a row that is fed into the Input Node")
+    parser.add_argument('--resume', action='store_true', help="Skip rows that are already in the output file")
+    parser.add_argument('--start-offset', type=int, default=0, help="Skip all rows before this offset")
+    args = parser.parse_args()
+
+    with open(args.pipeline, encoding='utf-8') as f:
+        config = json.load(f)
+
+    job = asyncio.run(run_batch(
+        config,
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        rate_limits=args.rate_limit,
+        resume=args.resume,
+        start_offset=args.start_offset,
+        input_field=args.input_field,
+    ))
+    print(json.dumps(job.to_dict(), indent=2))
+
+if __name__ == '__main__':
+    main()
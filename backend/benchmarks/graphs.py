@@ -0,0 +1,103 @@
+# backend/benchmarks/graphs.py
+
+import random
+
+# Synthetic pipelines built from the existing node types. Nodes with several
+# parents are always analysis nodes, whose short output keeps the joined
+# inputs of large graphs from growing without bound.
+TEXT_NODES = [
+    ("Text Transformation", {"to_uppercase": True}),
+    ("Text Analysis", {}),
+    ("Sentiment Analysis", {}),
+]
+JOIN_NODES = [
+    ("Text Analysis", {}),
+    ("Sentiment Analysis", {}),
+]
+PROVIDER_NODES = [
+    ("GPT Node", {"model": "gpt-4o-mini", "max_tokens": 32, "temperature": 0.7}),
+    ("Claude Node", {"model": "claude-3-haiku-20240307", "max_tokens": 32, "temperature": 0.7}),
+]
+
+def make_node(node_id, node_type, options):
+    return {"id": node_id, "type": node_type, "options": dict(options)}
+
+def input_node(value="It was a good day"):
+    return make_node("input", "Input Node", {"value": value})
+
+def pick(rng, index, provider_ratio, choices=TEXT_NODES):
+    if provider_ratio and rng.random() < provider_ratio:
+        return PROVIDER_NODES[index % len(PROVIDER_NODES)]
+    return rng.choice(choices)
+
+def chain(length, provider_ratio=0.0, seed=0):
+    # input -> n1 -> n2 -> ... -> n<length>
+    rng = random.Random(seed)
+    nodes = [input_node()]
+    edges = []
+    previous = "input"
+    for i in range(length):
+        node_id = f"n{i}"
+        nodes.append(make_node(node_id, *pick(rng, i, provider_ratio)))
+        edges.append({"source": previous, "target": node_id})
+        previous = node_id
+    return {"nodes": nodes, "edges": edges}
+
+def fan_out(width, provider_ratio=0.0, seed=0):
+    # input -> <width> independent nodes
+    rng = random.Random(seed)
+    nodes = [input_node()]
+    edges = []
+    for i in range(width):
+        node_id = f"n{i}"
+        nodes.append(make_node(node_id, *pick(rng, i, provider_ratio)))
+        edges.append({"source": "input", "target": node_id})
+    return {"nodes": nodes, "edges": edges}
+
+def diamond(width, provider_ratio=0.0, seed=0):
+    # input -> <width> nodes -> one node joining them all
+    config = fan_out(width, provider_ratio, seed)
+    config["nodes"].append(make_node("join", "Text Analysis", {}))
+    config["edges"].extend({"source": f"n{i}", "target": "join"} for i in range(width))
+    return config
+
+def random_dag(size, max_parents=3, provider_ratio=0.0, seed=0):
+    # Every node gets 1..max_parents parents among the nodes created before it
+    rng = random.Random(seed)
+    nodes = [input_node()]
+    edges = []
+    ids = ["input"]
+    for i in range(size):
+        node_id = f"n{i}"
+        parents = rng.sample(ids, min(len(ids), rng.randint(1, max_parents)))
+        choices = JOIN_NODES if len(parents) > 1 else TEXT_NODES
+        nodes.append(make_node(node_id, *pick(rng, i, provider_ratio, choices)))
+        edges.extend({"source": parent, "target": node_id} for parent in parents)
+        ids.append(node_id)
+    return {"nodes": nodes, "edges": edges}
+
+def with_input(config, value):
+    # A copy of the pipeline fed with a different input, so that runs don't
+    # hit the result cache
+    nodes = [
+        {**node, "options": {**node["options"], "value": value}} if node["type"] == "Input Node" else node
+        for node in config["nodes"]
+    ]
+    return {**config, "nodes": nodes}
+
+def input_values(config, value):
+    # The same, as values for execute_pipeline's `inputs`, which reuses the
+    # pipeline's compiled plan
+    return {node["id"]: value for node in config["nodes"] if node["type"] == "Input Node"}
+
+SCENARIOS = {
+    "chain-10": lambda: chain(10),
+    "chain-100": lambda: chain(100),
+    "fan-out-100": lambda: fan_out(100),
+    "diamond-50": lambda: diamond(50),
+    "dag-1000": lambda: random_dag(1000),
+    "llm-chain-5": lambda: chain(5, provider_ratio=1.0),
+    "llm-fan-out-20": lambda: fan_out(20, provider_ratio=1.0),
+    "llm-diamond-10": lambda: diamond(10, provider_ratio=1.0),
+    "mixed-dag-200": lambda: random_dag(200, provider_ratio=0.1),
+}
@@ -0,0 +1,215 @@
+# backend/benchmarks/mock_providers.py
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from aiohttp import web
+
+# Local stand-ins for the OpenAI and Anthropic APIs with configurable latency,
+# used by the benchmarks. Point the backend at them with
+#   OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:<port>
+
+# A 1x1 PNG, returned for image requests with response_format "b64_json"
+PNG_PIXEL = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+
+WORDS = "the quick brown fox jumps over the lazy dog and it was a good day".split()
+
+class MockConfig:
+    def __init__(self, latency=0.05, token_delay=0.002, tokens=20, rate_limit_rps=0, retry_after=0.5):
+        self.latency = latency                # seconds before the first token
+        self.token_delay = token_delay        # seconds between streamed tokens
+        self.tokens = tokens                  # tokens per completion
+        self.rate_limit_rps = rate_limit_rps  # requests per second before answering 429 (0 = never)
+        self.retry_after = retry_after
+
+def completion_tokens(count):
+    return [WORDS[i % len(WORDS)] + ' ' for i in range(count)]
+
+def prompt_tokens(messages):
+    text = ' '.join(str(message.get('content', '')) for message in messages)
+    return len(text) // 4 + 1
+
+class MockProviders:
+    def __init__(self, config=None):
+        self.config = config or MockConfig()
+        self.requests = 0
+        self.rate_limited = 0
+        self._window = []
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.openai_chat)
+        app.router.add_post('/v1/images/generations', self.openai_images)
+        app.router.add_post('/v1/messages', self.anthropic_messages)
+        return app
+
+    def _rate_limit(self):
+        # Returns a 429 response when over the configured requests per second
+        self.requests += 1
+        if not self.config.rate_limit_rps:
+            return None
+        now = time.monotonic()
+        self._window = [t for t in self._window if t > now - 1]
+        if len(self._window) < self.config.rate_limit_rps:
+            self._window.append(now)
+            return None
+        self.rate_limited += 1
+        return web.json_response(
+            {"error": {"type": "rate_limit_error", "message": "Rate limit reached"}},
+            status=429,
+            headers={"retry-after-ms": str(int(self.config.retry_after * 1000))},
+        )
+
+    async def _sse(self, request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        return response
+
+    async def openai_chat(self, request):
+        limited = self._rate_limit()
+        if limited is not None:
+            return limited
+        body = await request.json()
+        model = body.get('model', 'gpt-4')
+        tokens = completion_tokens(min(self.config.tokens, int(body.get('max_tokens') or self.config.tokens)))
+        usage = {"prompt_tokens": prompt_tokens(body.get('messages', [])), "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        await asyncio.sleep(self.config.latency)
+        if not body.get('stream'):
+            await asyncio.sleep(self.config.token_delay * len(tokens))
+            return web.json_response({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": ''.join(tokens)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        response = await self._sse(request)
+        for token in tokens:
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.config.token_delay)
+        if (body.get('stream_options') or {}).get('include_usage'):
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [], "usage": usage}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def openai_images(self, request):
+        limited = self._rate_limit()
+        if limited is not None:
+            return limited
+        body = await request.json()
+        await asyncio.sleep(self.config.latency)
+        if body.get('response_format') == 'b64_json':
+            return web.json_response({"created": int(time.time()), "data": [{"b64_json": PNG_PIXEL}]})
+        return web.json_response({"created": int(time.time()), "data": [{"url": "http://127.0.0.1/mock-image.png"}]})
+
+    async def anthropic_messages(self, request):
+        limited = self._rate_limit()
+        if limited is not None:
+            return limited
+        body = await request.json()
+        model = body.get('model', 'claude-3-opus-20240229')
+        tokens = completion_tokens(min(self.config.tokens, int(body.get('max_tokens') or self.config.tokens)))
+        input_tokens = prompt_tokens(body.get('messages', [])) + len(body.get('system') or '') // 4
+        await asyncio.sleep(self.config.latency)
+        if not body.get('stream'):
+            await asyncio.sleep(self.config.token_delay * len(tokens))
+            return web.json_response({
+                "id": "msg_mock", "type": "message", "role": "assistant", "model": model,
+                "content": [{"type": "text", "text": ''.join(tokens)}],
+                "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": len(tokens)},
+            })
+        response = await self._sse(request)
+
+        async def event(name, data):
+            await response.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode())
+
+        await event("message_start", {"type": "message_start", "message": {
+            "id": "msg_mock", "type": "message", "role": "assistant", "model": model, "content": [],
+            "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": input_tokens, "output_tokens": 1}}})
+        await event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for token in tokens:
+            await event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}})
+            await asyncio.sleep(self.config.token_delay)
+        await event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        await event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                      "usage": {"output_tokens": len(tokens)}})
+        await event("message_stop", {"type": "message_stop"})
+        await response.write_eof()
+        return response
+
+class MockProviderServer:
+    # Runs the mock providers in a separate process, so that they don't
+    # compete with the code being measured for the interpreter
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or MockConfig()
+        self.host = host
+        self.port = port
+        self._process = None
+
+    @property
+    def openai_base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def anthropic_base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout=30):
+        if not self.port:
+            with socket.socket() as sock:
+                sock.bind((self.host, 0))
+                self.port = sock.getsockname()[1]
+        config = self.config
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.mock_providers', '--host', self.host, '--port', str(self.port),
+             '--latency', str(config.latency), '--token-delay', str(config.token_delay),
+             '--tokens', str(config.tokens), '--rate-limit', str(config.rate_limit_rps),
+             '--retry-after', str(config.retry_after)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                return self
+            except OSError:
+                if self._process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("Mock provider server did not start")
+                time.sleep(0.05)
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait()
+            self._process = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock OpenAI and Anthropic APIs")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument('--token-delay', type=float, default=0.002, help="Seconds between streamed tokens")
+    parser.add_argument('--tokens', type=int, default=20, help="Tokens per completion")
+    parser.add_argument('--rate-limit', type=float, default=0, help="Requests per second before answering 429")
+    parser.add_argument('--retry-after', type=float, default=0.5, help="Seconds clients are asked to wait after a 429")
+    args = parser.parse_args()
+
+    providers = MockProviders(MockConfig(args.latency, args.token_delay, args.tokens, args.rate_limit, args.retry_after))
+    print(f"OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print(f"ANTHROPIC_BASE_URL=http://{args.host}:{args.port}")
+    web.run_app(providers.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+# backend/benchmarks/run.py
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import shutil
+import tempfile
+import platform
+import subprocess
+import tracemalloc
+import zlib
+from datetime import datetime, timezone
+from benchmarks.graphs import SCENARIOS, with_input, input_values
+from benchmarks.mock_providers import MockConfig, MockProviderServer
+
+# Runs synthetic pipelines through execute_pipeline and through the /execute
+# SSE endpoint against local mock providers, and writes the measurements as
+# JSON. Run from the backend directory:
+#   python -m benchmarks.run --scenarios chain-10,dag-1000 --compare old.json
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def percentile(values, p):
+    # Nearest-rank percentile
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+def summarize(latencies, elapsed, runs, node_count, events, cpu):
+    return {
+        "runs": runs,
+        "elapsed": elapsed,
+        "cpu_per_run": cpu / runs,
+        "cpu_per_event": cpu / events if events else None,
+        "runs_per_second": runs / elapsed if elapsed else None,
+        "nodes_per_second": runs * node_count / elapsed if elapsed else None,
+        "events_per_second": events / elapsed if elapsed else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies) if latencies else None,
+    }
+
+class LoopLagMonitor:
+    # Measures how late the event loop wakes up a task that sleeps for a fixed
+    # interval; large values mean something is blocking the loop
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return {
+            "loop_lag_p50": percentile(self.samples, 50),
+            "loop_lag_p99": percentile(self.samples, 99),
+            "loop_lag_max": max(self.samples) if self.samples else None,
+        }
+
+async def run_parallel(count, parallel, run_one):
+    # Calls run_one(i) for i in range(count) with at most `parallel` at a time;
+    # returns (latencies, events, elapsed, cpu), cpu being the CPU time used by
+    # this process (the mock providers run in another one)
+    latencies = []
+    events = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, events
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            events += await run_one(index)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    await asyncio.gather(*(worker() for _ in range(parallel)))
+    return latencies, events, time.perf_counter() - started, time.process_time() - cpu_started
+
+async def bench_engine(config, runs, parallel):
+    from app.pipelines.dynamic_pipeline import execute_pipeline
+    from app.pipelines.plan import get_plan
+
+    errors = 0
+    plan = get_plan(config)
+
+    async def run_one(index):
+        nonlocal errors
+        count = 0
+        inputs = input_values(config, f"It was a good day, run {index}")
+        async for node_id, event in execute_pipeline(config, plan=plan, inputs=inputs):
+            count += 1
+            if isinstance(event, dict) and "error" in event:
+                errors += 1
+        return count
+
+    await run_one(-1)  # warm up: load node modules, open connections
+    monitor = LoopLagMonitor()
+    monitor.start()
+    latencies, events, elapsed, cpu = await run_parallel(runs, parallel, run_one)
+    result = summarize(latencies, elapsed, runs, len(config["nodes"]), events, cpu)
+    result.update(await monitor.stop())
+    result["node_errors"] = errors
+    return result
+
+async def bench_plan(config, runs):
+    # Cost of looking up the plan of a pipeline per run: /start-pipeline gets
+    # a freshly parsed copy of the configuration every time
+    from app.pipelines.plan import PlanCache
+
+    cache = PlanCache()
+    copies = [json.loads(json.dumps(config)) for _ in range(runs + 1)]
+    started = time.perf_counter()
+    cache.get(copies[0])
+    miss = time.perf_counter() - started
+    hits = []
+    for copy in copies[1:]:
+        started = time.perf_counter()
+        cache.get(copy)
+        hits.append(time.perf_counter() - started)
+    return {"miss_seconds": miss, "hit_p50": percentile(hits, 50), "hit_max": max(hits) if hits else None}
+
+async def bench_memory(config, runs):
+    # Peak traced allocation of single runs; measured separately as tracing
+    # slows execution down considerably
+    from app.pipelines.dynamic_pipeline import execute_pipeline
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for index in range(runs):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            async for _ in execute_pipeline(with_input(config, f"It was a good day, memory run {index}")):
+                pass
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return {"memory_peak_bytes_p50": percentile(peaks, 50), "memory_peak_bytes_max": max(peaks) if peaks else None}
+
+async def bench_batch(config, rows):
+    # A batch of `rows` rows through run_batch, which executes pipelines of
+    # local nodes column-wise
+    from app.pipelines.batch import run_batch, load_batch_modules
+    from app.pipelines.plan import get_plan
+
+    directory = tempfile.mkdtemp(prefix="benchmark-batch-")
+    try:
+        input_path = os.path.join(directory, "rows.jsonl")
+        with open(input_path, 'w', encoding='utf-8') as f:
+            for index in range(rows):
+                f.write(json.dumps(f"It was a good day, batch row {index % 1000}") + '\n')
+        cpu_started = time.process_time()
+        job = await run_batch(config, input_path, os.path.join(directory, "results.jsonl"))
+        cpu = time.process_time() - cpu_started
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    elapsed = job.finished - job.started
+    return {
+        "rows": rows,
+        "elapsed": elapsed,
+        "rows_per_second": job.rows_done / elapsed if elapsed else None,
+        "cpu_per_row": cpu / rows,
+        "column_wise": load_batch_modules(get_plan(config)) is not None,
+        "failed_rows": job.rows_failed,
+    }
+
+def decode_body(body, encoding):
+    if encoding == 'gzip':
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(body)
+    return body
+
+async def bench_sse(config, runs, parallel, accept_encoding=None):
+    from app import app
+
+    # Separate tenants (each client keeps its own session cookie), so the
+    # per-tenant run limit doesn't throttle the benchmark
+    clients = [app.test_client() for _ in range(parallel)]
+    errors = 0
+    wire_bytes = 0
+
+    async def run_one(index):
+        nonlocal errors, wire_bytes
+        client = clients[index % parallel]
+        headers = {}
+        response = await client.post('/start-pipeline', json=with_input(config, f"It was a good day, sse {index}"))
+        run_id = (await response.get_json())["run_id"]
+        if accept_encoding:
+            headers["Accept-Encoding"] = accept_encoding
+        response = await client.get(f'/execute/{run_id}', headers=headers)
+        body = await response.get_data()
+        if index >= 0:
+            wire_bytes += len(body)
+        body = decode_body(body, response.headers.get('Content-Encoding')).decode()
+        events = [frame for frame in body.split('\n\n') if 'data: ' in frame]
+        if not events or '"complete":' not in events[-1]:
+            errors += 1
+        return len(events)
+
+    await run_one(-1)
+    monitor = LoopLagMonitor()
+    monitor.start()
+    latencies, events, elapsed, cpu = await run_parallel(runs, parallel, run_one)
+    result = summarize(latencies, elapsed, runs, len(config["nodes"]), events, cpu)
+    result.update(await monitor.stop())
+    result["wire_bytes_per_run"] = wire_bytes / runs
+    result["incomplete_streams"] = errors
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    # Print the relative change of the main numbers against an earlier result file
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+    print(f"\nCompared with {baseline_path}:")
+    for scenario, benches in results.items():
+        for bench, numbers in benches.items():
+            old = baseline.get(scenario, {}).get(bench)
+            if not old:
+                continue
+            changes = []
+            for key in ("runs_per_second", "latency_p50", "latency_p99", "cpu_per_run", "cpu_per_row", "loop_lag_p99",
+                        "memory_peak_bytes_p50", "wire_bytes_per_run"):
+                if numbers.get(key) is not None and old.get(key):
+                    changes.append(f"{key} {100 * (numbers[key] - old[key]) / old[key]:+.1f}%")
+            print(f"  {scenario:16} {bench:8} " + ", ".join(changes))
+
+async def run_benchmarks(args):
+    results = {}
+    workers = []
+    if args.job_workers:
+        # /execute runs are executed by worker processes (the engine and
+        # memory benchmarks still run in this process)
+        from app.pipelines import jobs
+        workers = jobs.start_workers(str(args.job_workers))
+    try:
+        await run_scenarios(args, results)
+    finally:
+        if workers:
+            jobs.stop_workers(workers)
+    return results
+
+async def run_scenarios(args, results):
+    for name in args.scenarios:
+        config = SCENARIOS[name]()
+        print(f"{name}: {len(config['nodes'])} nodes, {len(config['edges'])} edges")
+        results[name] = {}
+        if 'engine' in args.benches:
+            results[name]["engine"] = await bench_engine(config, args.runs, args.parallel)
+        if 'plan' in args.benches:
+            results[name]["plan"] = await bench_plan(config, args.runs)
+        if 'memory' in args.benches:
+            results[name]["memory"] = await bench_memory(config, args.memory_runs)
+        if 'sse' in args.benches:
+            results[name]["sse"] = await bench_sse(config, args.runs, args.parallel, args.accept_encoding)
+        if 'batch' in args.benches:
+            results[name]["batch"] = await bench_batch(config, args.batch_rows)
+        for bench, numbers in results[name].items():
+            print(f"  {bench}: " + ", ".join(f"{key}={value:.4g}" for key, value in numbers.items()
+                                             if isinstance(value, (int, float))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline engine against mock providers")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--benches', default='engine,memory,sse', help="Which of engine, plan, memory, sse and batch to run")
+    parser.add_argument('--runs', type=int, default=20, help="Runs per scenario and benchmark")
+    parser.add_argument('--parallel', type=int, default=4, help="Runs executed at the same time")
+    parser.add_argument('--memory-runs', type=int, default=3)
+    parser.add_argument('--batch-rows', type=int, default=10000, help="Rows of the batch benchmark")
+    parser.add_argument('--latency', type=float, default=0.05, help="Mock provider time to first token")
+    parser.add_argument('--token-delay', type=float, default=0.002, help="Mock provider delay between tokens")
+    parser.add_argument('--tokens', type=int, default=20, help="Tokens per mock completion")
+    parser.add_argument('--cache', action='store_true', help="Keep the result cache enabled")
+    parser.add_argument('--job-workers', type=int, default=0,
+                        help="Execute SSE runs on this many worker processes through the job queue")
+    parser.add_argument('--accept-encoding', help="Accept-Encoding sent with SSE requests, e.g. gzip")
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', help="Earlier result file to compare with")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    args.benches = [name.strip() for name in args.benches.split(',') if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    mock = MockProviderServer(MockConfig(args.latency, args.token_delay, args.tokens)).start()
+    # Configure the app before it is imported: providers point at the mock and
+    # aren't rate limited, and runs don't hit the cache unless asked to
+    os.environ["OPENAI_BASE_URL"] = mock.openai_base_url
+    os.environ["ANTHROPIC_BASE_URL"] = mock.anthropic_base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "mock")
+    os.environ["PROVIDER_LIMITS"] = json.dumps({"openai": {"rpm": 0, "tpm": 0}, "anthropic": {"rpm": 0, "tpm": 0}})
+    if not args.cache:
+        os.environ["RESULT_CACHE_ENABLED"] = "0"
+    # Runs are journaled to a throwaway database
+    journal_dir = tempfile.mkdtemp(prefix="benchmark-journal-")
+    os.environ["RUN_JOURNAL_PATH"] = os.path.join(journal_dir, "runs.db")
+    if args.job_workers:
+        os.environ["JOB_QUEUE"] = "1"
+
+    try:
+        results = asyncio.run(run_benchmarks(args))
+    finally:
+        mock.stop()
+        shutil.rmtree(journal_dir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": commit,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit or 'unknown'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# backend/tests/conftest.py
+
+import os
+import sys
+import types
+import asyncio
+import pytest
+
+# Tests import the backend as the server does, from the backend directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Tests that need a run journal create their own
+os.environ.setdefault("RUN_JOURNAL_PATH", "")
+
+@pytest.fixture
+def node_type():
+    # Registers a fake node implementation: node_type("Name", process=...,
+    # async_process=..., ui={...}) returns the module
+    from app.pipelines import registry
+
+    def register(name, process=None, ui=None, **functions):
+        ui_config = {"type": name, "execution": "inline", "fields": [], **(ui or {})}
+        module = types.SimpleNamespace(
+            process=process or (lambda input_data, options: input_data),
+            get_ui_config=lambda: ui_config,
+            __file__=__file__,
+            **functions,
+        )
+        registry.register_module(module)
+        return module
+
+    return register
+
+@pytest.fixture
+def calls(node_type):
+    # "Tag Step" returns "<tag>(<input>)" and records which nodes ran; with
+    # the "hang" option it reports progress and waits until it is cancelled
+    calls = []
+
+    async def async_process(input_data, options):
+        calls.append(options["tag"])
+        if options.get("hang"):
+            yield {"step": 1, "total": 2}
+            await asyncio.Event().wait()
+        yield f"{options['tag']}({input_data})"
+
+    node_type("Tag Step", async_process=async_process)
+    return calls
+
+# Helpers for building and running pipelines, imported by the tests with
+# `from conftest import ...`
+
+def step(node_id, node_type="Tag Step", **options):
+    return {"id": node_id, "type": node_type, "options": {"tag": node_id, **options}}
+
+def edges(*pairs):
+    return [{"source": source, "target": target} for source, target in pairs]
+
+def pipeline(value="x", targets=None, **node_options):
+    # in -> a -> b -> c, and in -> d; node_options holds extra options by
+    # node id, e.g. pipeline(b={"hang": True})
+    config = {
+        "nodes": [{"id": "in", "type": "Input Node", "options": {"value": value}}]
+                 + [step(node_id, **node_options.get(node_id, {})) for node_id in ("a", "b", "c", "d")],
+        "edges": edges(("in", "a"), ("a", "b"), ("b", "c"), ("in", "d")),
+    }
+    if targets is not None:
+        config["targets"] = targets
+    return config
+
+def run(config, state=None, **kwargs):
+    # Executes a pipeline; returns its plan event and the result and error
+    # events by node id
+    from app.pipelines.dynamic_pipeline import execute_pipeline
+
+    async def main():
+        plan, results, errors = None, {}, {}
+        async for node_id, event in execute_pipeline(config, state=state, **kwargs):
+            if node_id is None:
+                plan = event.get("plan", plan)
+            elif "result" in event:
+                results[node_id] = event
+            elif "error" in event:
+                errors[node_id] = event["error"]
+        return plan, results, errors
+    return asyncio.run(main())
@@ -0,0 +1,47 @@
+# backend/tests/test_artifacts.py
+
+import asyncio
+import pytest
+from app.services.artifacts import ArtifactStore
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    from app import routes
+    store = ArtifactStore(root=str(tmp_path / "artifacts"), max_bytes=25)
+    monkeypatch.setattr(routes, "artifact_store", store)
+    return store
+
+def get(url, headers=None):
+    from app import app
+
+    async def main():
+        response = await app.test_client().get(url, headers=headers or {})
+        return response.status_code, response.headers, await response.get_data()
+    return asyncio.run(main())
+
+def test_same_content_is_stored_once_and_old_artifacts_are_evicted(store):
+    first = store.put(b"0123456789", "image/png")
+    assert store.put(b"0123456789", "image/png") == first
+    assert bytes(store.open(first["url"])) == b"0123456789"
+    store.put(b"abcdefghij", "image/png")
+    store.put(b"ABCDEFGHIJ", "image/png")
+    assert store.get(first["artifact"]) is None
+    assert (store.counters["duplicates"], store.counters["evictions"]) == (1, 1)
+
+def test_artifacts_are_served_with_their_id_as_etag(store):
+    handle = store.put(b"0123456789", "image/png")
+    status, headers, body = get(handle["url"])
+    assert (status, body) == (200, b"0123456789")
+    assert headers["ETag"] == f'"{handle["artifact"]}"'
+    assert headers["Content-Type"] == "image/png"
+    assert headers["Accept-Ranges"] == "bytes"
+    status, _, body = get(handle["url"], {"If-None-Match": headers["ETag"]})
+    assert (status, body) == (304, b"")
+
+def test_range_requests_get_partial_content(store):
+    handle = store.put(b"0123456789", "image/png")
+    status, headers, body = get(handle["url"], {"Range": "bytes=2-5"})
+    assert (status, body) == (206, b"2345")
+    assert headers["Content-Range"] == "bytes 2-5/10"
+    assert get(handle["url"], {"Range": "bytes=20-30"})[0] == 416
+    assert get("/artifacts/" + "0" * 64)[0] == 404
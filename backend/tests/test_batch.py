@@ -0,0 +1,76 @@
+# backend/tests/test_batch.py
+
+import json
+import asyncio
+import pytest
+from app.pipelines.batch import BatchJob, BatchJobStore, batch_settings, run_batch, run_columns, run_row, load_batch_modules
+from app.pipelines.plan import get_plan
+from app.nodes import sentiment_analysis, text_analysis, text_transformation
+
+def test_batch_settings_rejects_invalid_values():
+    concurrency, rate_limits = batch_settings("8", "openai=500,anthropic=50")
+    assert concurrency == 8
+    assert set(rate_limits) == {"openai", "anthropic"}
+    for concurrency, rate_limits in [("many", None), (0, None), (4, "openai"), (4, {"openai": "fast"}), (4, {"openai": 0}), (4, [1])]:
+        with pytest.raises(ValueError):
+            batch_settings(concurrency, rate_limits)
+
+def test_invalid_settings_fail_the_job(tmp_path):
+    input_path = tmp_path / "rows.jsonl"
+    input_path.write_text(json.dumps("row") + "\n")
+    config = {"nodes": [{"id": "in", "type": "Input Node", "options": {}}], "edges": []}
+    job = asyncio.run(run_batch(config, str(input_path), str(tmp_path / "out.jsonl"), concurrency="many"))
+    assert job.status == "failed"
+    assert "concurrency" in job.error
+
+def test_job_store_keeps_running_jobs_and_evicts_finished_ones():
+    store = BatchJobStore(max_jobs=2, ttl=60)
+    running = BatchJob("in", "out")
+    store.add(running)
+    finished = []
+    for _ in range(3):
+        job = BatchJob("in", "out")
+        job.finished = 1e12
+        finished.append(job)
+        store.add(job)
+    assert len(store) == 2
+    assert store.get(running.batch_id) is running
+    assert store.get(finished[-1].batch_id) is finished[-1]
+    finished[-1].finished = 1.0  # long ago
+    assert store.get(finished[-1].batch_id) is None
+
+ROWS = ["It was a good day", "", "GOOD good. bad BAD terrible", "  spaced\tout \n words ", "İstanbul ß straße great",
+        "a \x00 separator good", "sad", "good", "good"]
+
+@pytest.mark.parametrize("module, options", [
+    (sentiment_analysis, {}),
+    (text_analysis, {}),
+    (text_transformation, {}),
+    (text_transformation, {"to_uppercase": True, "reverse": True}),
+])
+def test_process_batch_matches_process_row_by_row(module, options):
+    assert module.process_batch(ROWS, options) == [module.process(row, options) for row in ROWS]
+
+def test_column_wise_batches_match_running_each_row():
+    config = {
+        "nodes": [{"id": "in", "type": "Input Node", "options": {}},
+                  {"id": "upper", "type": "Text Transformation", "options": {"to_uppercase": True}},
+                  {"id": "sentiment", "type": "Sentiment Analysis", "options": {}},
+                  {"id": "stats", "type": "Text Analysis", "options": {}}],
+        "edges": [{"source": "in", "target": "upper"}, {"source": "upper", "target": "sentiment"},
+                  {"source": "in", "target": "stats"}, {"source": "sentiment", "target": "stats"}],
+    }
+    plan = get_plan(config)
+    modules = load_batch_modules(plan)
+    assert modules is not None
+
+    async def main():
+        chunk = list(enumerate(ROWS))
+        columns = await run_columns(plan, modules, chunk)
+        rows = [await run_row(config, offset, row, plan=plan) for offset, row in chunk]
+        return columns, rows
+    columns, rows = asyncio.run(main())
+    assert columns[0]["results"]["stats"] == "Word count: 6, Character count: 26"
+    for column_record, row_record in zip(columns, rows):
+        assert column_record["results"] == row_record["results"]
+        assert column_record["errors"] == row_record["errors"] == {}
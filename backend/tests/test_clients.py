@@ -0,0 +1,67 @@
+# backend/tests/test_clients.py
+
+import socket
+import asyncio
+import threading
+import pytest
+import httpx
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from app.services.clients import ClientStats, AsyncCountingTransport, CountingTransport
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(500 if self.path == "/fail" else 200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_sync_transport_counts_responses_and_failures(server):
+    stats = ClientStats("test")
+    with httpx.Client(transport=CountingTransport(stats)) as client:
+        client.get(server + "/")
+        client.get(server + "/fail")
+        with pytest.raises(httpx.ConnectError):
+            client.get(f"http://127.0.0.1:{closed_port()}/")
+    assert stats.to_dict()["requests"] == 3
+    assert stats.to_dict()["in_flight"] == 0
+    assert stats.to_dict()["errors"] == 2
+
+def test_async_transport_counts_connect_errors_and_cancellation(server):
+    stats = ClientStats("test")
+
+    async def main():
+        async with httpx.AsyncClient(transport=AsyncCountingTransport(stats)) as client:
+            await client.get(server + "/")
+            with pytest.raises(httpx.ConnectError):
+                await client.get(f"http://127.0.0.1:{closed_port()}/")
+            # A request to a server that never answers, cancelled while in flight
+            with socket.socket() as silent:
+                silent.bind(("127.0.0.1", 0))
+                silent.listen()
+                task = asyncio.create_task(client.get(f"http://127.0.0.1:{silent.getsockname()[1]}/", timeout=5))
+                await asyncio.sleep(0.1)
+                assert stats.to_dict()["in_flight"] == 1
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+    asyncio.run(main())
+    assert stats.to_dict()["requests"] == 3
+    assert stats.to_dict()["in_flight"] == 0
+    assert stats.to_dict()["errors"] == 2
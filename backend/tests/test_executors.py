@@ -0,0 +1,35 @@
+# backend/tests/test_executors.py
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.pipelines import executors
+from app.services import metrics
+
+def test_calls_cancelled_while_queued_leave_the_queue(monkeypatch):
+    stats = executors.PoolStats(1)
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(executors, "thread_stats", stats)
+    monkeypatch.setattr(executors, "_thread_pool", pool)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(executors.run_in_thread(release.wait))
+        queued = asyncio.create_task(executors.run_in_thread(lambda: "never"))
+        while stats.active < 1:
+            await asyncio.sleep(0.01)
+        assert (stats.active, stats.queued) == (1, 1)
+        assert 'pipeline_pool_queued{pool="threads"} 1' in metrics.render()
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert (stats.active, stats.queued) == (1, 0)
+        release.set()
+        await running
+    try:
+        asyncio.run(main())
+    finally:
+        release.set()
+        pool.shutdown()
+    assert (stats.active, stats.queued, stats.completed) == (0, 0, 1)
+    assert 'pipeline_pool_active{pool="threads"} 0' in metrics.render()
@@ -0,0 +1,63 @@
+# backend/tests/test_incremental.py
+
+from app.pipelines.incremental import RunState, node_signature, dirty_nodes
+from conftest import pipeline, run
+
+def test_signature_covers_type_options_input_and_parents():
+    node = {"id": "a", "type": "Tag Step", "options": {"tag": "a"}}
+    signature = node_signature(node, ["in"])
+    assert node_signature(dict(node), ["in"]) == signature
+    assert node_signature({**node, "options": {"tag": "b"}}, ["in"]) != signature
+    assert node_signature({**node, "input": "text"}, ["in"]) != signature
+    assert node_signature({**node, "type": "Other"}, ["in"]) != signature
+    assert node_signature(node, ["other"]) != signature
+
+def test_dirty_nodes_are_the_changed_ones_and_their_descendants():
+    graph = {"in": ["a", "d"], "a": ["b"], "b": ["c"], "c": [], "d": []}
+    order = ["in", "a", "d", "b", "c"]
+    state = RunState()
+    for node_id in order:
+        state.retain(node_id, node_id, "result", "result")
+    signatures = {node_id: node_id for node_id in order}
+    assert dirty_nodes(order, graph, signatures, state) == set()
+    assert dirty_nodes(order, graph, {**signatures, "b": "changed"}, state) == {"b", "c"}
+    assert dirty_nodes(order, graph, signatures, state, forced=["a"]) == {"a", "b", "c"}
+    state.forget("d")
+    assert dirty_nodes(order, graph, signatures, state) == {"d"}
+
+def test_unchanged_pipeline_reuses_every_result(calls):
+    state = RunState()
+    run(pipeline(), state)
+    assert sorted(calls) == ["a", "b", "c", "d"]
+    calls.clear()
+    plan, results, _ = run(pipeline(), state)
+    assert calls == []
+    assert plan["recomputed"] == []
+    assert all(event.get("reused") for event in results.values())
+    assert results["c"]["result"] == "c(b(a(x)))"
+
+def test_changed_node_recomputes_only_its_descendants(calls):
+    state = RunState()
+    run(pipeline(), state)
+    calls.clear()
+    plan, results, _ = run(pipeline(b={"extra": 1}), state)
+    assert sorted(calls) == ["b", "c"]
+    assert sorted(plan["reused"]) == ["a", "d", "in"]
+    assert results["c"]["result"] == "c(b(a(x)))"
+
+def test_changed_input_recomputes_everything_downstream(calls):
+    state = RunState()
+    run(pipeline(), state)
+    calls.clear()
+    plan, results, _ = run(pipeline(value="y"), state)
+    assert sorted(calls) == ["a", "b", "c", "d"]
+    assert results["d"]["result"] == "d(y)"
+
+def test_start_node_is_always_recomputed(calls):
+    state = RunState()
+    run(pipeline(), state)
+    calls.clear()
+    plan, _, _ = run(pipeline(), state, start_node_id="b")
+    assert sorted(calls) == ["b", "c"]
+    # Only the start node's ancestors and descendants are part of the run
+    assert "d" not in plan["reused"] + plan["recomputed"]
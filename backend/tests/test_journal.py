@@ -0,0 +1,155 @@
+# backend/tests/test_journal.py
+
+import json
+import asyncio
+import pytest
+from app.pipelines.journal import RunJournal
+from app.pipelines.runner import run_events
+from app.pipelines.sessions import SessionStore
+from conftest import edges, pipeline, step
+
+@pytest.fixture
+def journal(tmp_path):
+    return RunJournal(str(tmp_path / "runs.db"))
+
+def test_events_after_an_id_are_replayed_in_order(journal):
+    store = SessionStore(journal=journal)
+    run = store.create_run("tenant", pipeline())
+    other = store.create_run("tenant", pipeline())
+    for event_id in (3, 1, 2):
+        journal.append_event(run.run_id, event_id, f"event {event_id}".encode())
+    journal.append_event(other.run_id, 4, b"other run")
+    assert journal.events(run.run_id) == [(1, b"event 1"), (2, b"event 2"), (3, b"event 3")]
+    assert journal.events(run.run_id, after=1) == [(2, b"event 2"), (3, b"event 3")]
+    assert journal.events(run.run_id, after=3) == []
+    assert journal.last_event_id(run.run_id) == 3
+
+def test_checkpoints_restore_the_latest_retained_results(journal):
+    # Checkpoints are kept as long as their pipeline has runs
+    store = SessionStore(journal=journal)
+    first = store.create_run("tenant", pipeline())
+    second = store.create_run("tenant", pipeline(), pipeline_id=first.pipeline_id)
+    other = store.create_run("tenant", pipeline())
+    journal.checkpoint(first.pipeline_id, first.run_id, "a", "sig-a", "result a", "payload a")
+    journal.checkpoint(first.pipeline_id, first.run_id, "b", "sig-b", "result b", "payload b")
+    journal.checkpoint(first.pipeline_id, second.run_id, "a", "sig-a2", "result a2", "payload a2")
+    journal.forget(first.pipeline_id, second.run_id, "b")
+    journal.checkpoint(other.pipeline_id, other.run_id, "c", "sig-c", "result c", "payload c")
+    journal.flush()
+    state = journal.load_state(first.pipeline_id)
+    assert state.signatures == {"a": "sig-a2"}
+    assert state.results == {"a": "result a2"}
+    assert state.payloads == {"a": "payload a2"}
+
+def test_an_interrupted_run_resumes_without_running_completed_nodes(journal, calls):
+    store = SessionStore(journal=journal)
+    run = store.create_run("tenant", pipeline(b={"hang": True}))
+    assert store.start(run)
+
+    async def interrupt():
+        # Stops the run once "a" and "d" completed, while "b" is still running
+        events = run_events(run, journal)
+        async for event in events:
+            if event.get("id") == "b" and "intermediate" in event:
+                break
+        await events.aclose()
+    asyncio.run(interrupt())
+    assert sorted(calls) == ["a", "b", "d"]
+    journal.flush()
+
+    # After a restart, the run is restored from the journal
+    restarted = SessionStore(journal=journal)
+    restored = restarted.get_run(run.run_id, "tenant")
+    assert restored.status == "interrupted"
+    assert restored.completed == {"in", "a", "d"}
+    assert restarted.get_run(run.run_id, "other tenant") is None
+
+    # Resuming it only runs what did not complete
+    restored.config = pipeline()
+    del calls[:]
+
+    async def resume():
+        results = {}
+        async for event in run_events(restored, journal):
+            if "result" in event:
+                results[event["id"]] = event["result"]
+        return results
+    results = asyncio.run(resume())
+    assert calls == ["b", "c"]
+    assert results["a"]["reused"] is True
+    assert results["c"]["result"] == "c(b(a(x)))"
+
+@pytest.fixture
+def streaming(node_type):
+    # "Token Step" streams its tag letter by letter
+    async def async_process(input_data, options):
+        for letter in options["tag"]:
+            yield {"delta": letter}
+        yield options["tag"]
+
+    node_type("Token Step", async_process=async_process)
+    return {"nodes": [step("word", "Token Step")], "edges": []}
+
+def decoded(journal, run_id):
+    return [json.loads(data) for _, data in journal.events(run_id)]
+
+def test_token_deltas_are_not_journaled(journal, streaming, monkeypatch):
+    from app import app, routes
+    monkeypatch.setattr(routes, "run_journal", journal)
+    monkeypatch.setattr(routes, "sessions", SessionStore(journal=journal))
+
+    async def main():
+        client = app.test_client()
+        run_id = (await (await client.post('/start-pipeline', json=streaming)).get_json())["run_id"]
+        body = await (await client.get(f'/execute/{run_id}')).get_data()
+        return run_id, body
+    run_id, body = asyncio.run(main())
+    assert b'"delta"' in body
+    events = decoded(journal, run_id)
+    assert not any("intermediate" in event for event in events)
+    assert any(event.get("id") == "word" and event["result"]["result"] == "word" for event in events)
+
+def test_workers_drop_relayed_token_deltas_when_the_run_ends(journal, streaming):
+    from app.pipelines.jobs import JobQueue, Worker
+    jobs = JobQueue(journal.path)
+    run = SessionStore(journal=journal).create_run("tenant", streaming)
+    journal.flush()
+    asyncio.run(Worker(journal=journal, jobs=jobs).execute(run.run_id))
+    events = decoded(journal, run.run_id)
+    assert not any("intermediate" in event for event in events)
+    assert events[-1]["complete"] is True
+
+def test_a_client_reconnecting_to_a_running_run_follows_it(journal, node_type, monkeypatch):
+    from app import app, routes
+    monkeypatch.setattr(routes, "run_journal", journal)
+    monkeypatch.setattr(routes, "sessions", SessionStore(journal=journal))
+    release = asyncio.Event()
+
+    async def async_process(input_data, options):
+        await release.wait()
+        yield f"waited({input_data})"
+
+    node_type("Wait Step", async_process=async_process)
+    config = {"nodes": [{"id": "in", "type": "Input Node", "options": {"value": "x"}}, step("w", "Wait Step")],
+              "edges": edges(("in", "w"))}
+
+    async def main():
+        client = app.test_client()
+        run_id = (await (await client.post('/start-pipeline', json=config)).get_json())["run_id"]
+        run = routes.sessions.get_run(run_id)
+        first = asyncio.create_task(client.get(f'/execute/{run_id}'))
+        while run.last_event_id < 2:
+            await asyncio.sleep(0.01)
+        # The first connection saw the plan event only
+        second = asyncio.create_task(client.get(f'/execute/{run_id}', headers={"Last-Event-ID": "1"}))
+        while not run.listeners:
+            await asyncio.sleep(0.01)
+        release.set()
+        first, second = await asyncio.gather(first, second)
+        return second.status_code, await first.get_data(), await second.get_data()
+    status, first, second = asyncio.run(asyncio.wait_for(main(), 10))
+    assert status == 200
+    assert b'id: 1\n' in first and b'id: 1\n' not in second
+    assert b'id: 2\n' in second
+    assert b'"result":"waited(x)"' in second
+    assert second.rstrip().endswith(first.rstrip().rsplit(b'\n\n', 1)[-1])
@@ -0,0 +1,108 @@
+# backend/tests/test_map_reduce.py
+
+import json
+import asyncio
+from app.pipelines.dynamic_pipeline import execute_pipeline
+from app.nodes import split_text
+
+def map_reduce_config(text, node_type, max_parallel=3):
+    return {
+        "nodes": [
+            {"id": "in", "type": "Input Node", "options": {"value": text}},
+            {"id": "split", "type": "Split Text", "options": {"chunk_size": 20, "overlap": 0, "unit": "characters"}},
+            {"id": "map", "type": "Map Chunks", "options": {"node_type": node_type, "node_options": json.dumps({"suffix": "!"}),
+                                                            "max_parallel": max_parallel}},
+            {"id": "reduce", "type": "Reduce Chunks", "options": {"separator": "|"}},
+        ],
+        "edges": [{"source": "in", "target": "split"}, {"source": "split", "target": "map"}, {"source": "map", "target": "reduce"}],
+    }
+
+async def collect(config):
+    events = []
+    async for node_id, event in execute_pipeline(config):
+        events.append((node_id, event))
+    return events
+
+def test_split_breaks_at_words_with_overlap():
+    chunks = split_text.split("one two three four five six seven", 10, 4)
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    assert chunks[0] == "one two"
+    # Every chunk after the first repeats the end of the one before
+    assert chunks[1].split()[0] in chunks[0].split()
+
+def test_map_runs_chunks_in_parallel_and_reduce_keeps_their_order(node_type):
+    running = {"now": 0, "peak": 0}
+
+    async def async_process(input_data, options):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        try:
+            # Later chunks finish first
+            await asyncio.sleep(0.05 - len(input_data) / 10000)
+            yield input_data.upper() + options["suffix"]
+        finally:
+            running["now"] -= 1
+
+    node_type("Upper Chunk", async_process=async_process)
+    text = " ".join(f"word{i}" for i in range(40))
+    events = asyncio.run(collect(map_reduce_config(text, "Upper Chunk")))
+    chunks = next(event["result"] for node_id, event in events if node_id == "split" and "result" in event)
+    progress = [event["intermediate"] for node_id, event in events if node_id == "map" and "intermediate" in event]
+    reduced = next(event["result"] for node_id, event in events if node_id == "reduce" and "result" in event)
+    assert len(progress) == len(chunks)
+    assert progress[-1]["step"] == len(chunks)
+    assert running["peak"] == 3
+    assert reduced == "|".join(chunk.upper() + "!" for chunk in chunks)
+
+def test_failing_chunk_stops_the_others(node_type):
+    state = {"started": 0, "finished": 0, "stopped": 0}
+
+    async def async_process(input_data, options):
+        state["started"] += 1
+        try:
+            if "word3" in input_data:
+                raise ValueError("provider down")
+            await asyncio.sleep(0.2)
+            state["finished"] += 1
+            yield input_data
+        except asyncio.CancelledError:
+            # Cleaning up takes a moment, e.g. closing a provider stream
+            await asyncio.sleep(0.01)
+            state["stopped"] += 1
+            raise
+
+    node_type("Flaky Chunk", async_process=async_process)
+    text = " ".join(f"word{i}" for i in range(10))
+
+    async def main():
+        stopped_when_failed = None
+        async for node_id, event in execute_pipeline(map_reduce_config(text, "Flaky Chunk", max_parallel=10)):
+            if node_id == "map" and "error" in event:
+                assert event["error"]["message"] == "provider down"
+                stopped_when_failed = state["stopped"]
+            if node_id == "reduce":
+                assert event["error"]["type"] == "upstream_error"
+        return stopped_when_failed
+
+    stopped_when_failed = asyncio.run(main())
+    # Every other chunk was stopped before the node reported its failure
+    assert state["started"] > 1
+    assert stopped_when_failed == state["started"] - 1
+    assert state["finished"] == 0
+
+def test_wrapped_node_options_may_be_an_object_and_decide_caching(node_type):
+    from app.pipelines.plan import compile_plan
+    from app.pipelines import registry
+
+    node_type("Deterministic Chunk", ui={"cacheable": True})
+    node_type("Random Chunk")
+    config = map_reduce_config("some text", "Deterministic Chunk")
+    config["nodes"][2]["options"]["node_options"] = {"suffix": "!"}
+    compile_plan(config)
+    map_chunks = registry.get_node_module("Map Chunks")
+    assert map_chunks.is_cacheable({"node_type": "Deterministic Chunk", "node_options": {"suffix": "!"}})
+    assert not map_chunks.is_cacheable({"node_type": "Random Chunk"})
+    assert not map_chunks.is_cacheable({"node_type": "Unknown Chunk"})
+    # Also before the wrapped node type has been loaded
+    registry._modules.pop("Text Transformation", None)
+    assert map_chunks.is_cacheable({"node_type": "Text Transformation"})
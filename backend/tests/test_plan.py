@@ -0,0 +1,40 @@
+# backend/tests/test_plan.py
+
+import asyncio
+import json
+import pytest
+from app.pipelines.plan import PlanCache, PlanError
+
+def pipeline(edges):
+    return {"nodes": [{"id": "a", "type": "Input Node", "value": "A"},
+                      {"id": "b", "type": "Input Node", "value": "B"}],
+            "edges": edges}
+
+@pytest.mark.parametrize("edges, error", [
+    (["a->b"], "invalid_edge"),
+    ([None], "invalid_edge"),
+    ({"source": "a", "target": "b"}, "invalid_edges"),
+])
+def test_malformed_edges_are_plan_errors(edges, error):
+    with pytest.raises(PlanError) as raised:
+        PlanCache().get(pipeline(edges))
+    assert [e["type"] for e in raised.value.errors] == [error]
+
+def test_malformed_edges_are_rejected_with_400():
+    from app import app
+
+    async def main():
+        client = app.test_client()
+        response = await client.post('/start-pipeline', json=pipeline([["a", "b"]]))
+        assert response.status_code == 400
+        body = await response.get_json()
+        assert [e["type"] for e in body["errors"]] == ["invalid_edge"]
+    asyncio.run(main())
+
+def test_copies_of_a_configuration_share_a_plan():
+    cache = PlanCache()
+    config = pipeline([{"source": "a", "target": "b"}])
+    plan = cache.get(config)
+    assert cache.get(json.loads(json.dumps(config))) is plan
+    assert cache.get(pipeline([{"source": "b", "target": "a"}])) is not plan
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 2)
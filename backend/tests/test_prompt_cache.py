@@ -0,0 +1,54 @@
+# backend/tests/test_prompt_cache.py
+
+import pytest
+from app.services.prompt_cache import MinHasher, PromptCache
+
+PROMPT = "Summarize the following review in one sentence: the battery lasts two days and the screen is bright."
+# One word changed
+NEAR = "Summarize the following review in one sentence: the battery lasts three days and the screen is bright."
+
+def jaccard(hasher, a, b):
+    a, b = hasher.shingles(a), hasher.shingles(b)
+    return len(a & b) / len(a | b)
+
+def test_signatures_estimate_the_jaccard_similarity():
+    hasher = MinHasher(256)
+    for other in (PROMPT, NEAR, "Translate this sentence to French: the battery lasts two days."):
+        estimate = (hasher.signature(PROMPT) == hasher.signature(other)).mean()
+        assert estimate == pytest.approx(jaccard(hasher, PROMPT, other), abs=0.1)
+
+def test_whitespace_and_casing_differences_are_exact_hits():
+    cache = PromptCache(threshold=0.99)
+    cache.store("openai", "gpt-4o", PROMPT, "Good battery, bright screen.")
+    assert cache.lookup("openai", "gpt-4o", "  " + PROMPT.upper().replace(" ", "\n ")) == "Good battery, bright screen."
+    assert cache.counters["exact_hits"] == 1
+
+def test_near_duplicates_hit_only_above_the_threshold():
+    assert 0.5 < jaccard(MinHasher(), PROMPT, NEAR) < 0.99
+    for threshold, hit in ((0.5, True), (0.99, False)):
+        cache = PromptCache(threshold=threshold)
+        cache.store("openai", "gpt-4o", PROMPT, "Good battery, bright screen.")
+        assert (cache.lookup("openai", "gpt-4o", NEAR) is not None) is hit
+        assert cache.lookup("openai", "gpt-4o", "Write a poem about the sea.") is None
+        assert cache.counters["near_hits"] == int(hit)
+
+def test_entries_are_scoped_by_model_and_settings_and_evicted_lru():
+    cache = PromptCache(threshold=0.5, max_entries=2)
+    cache.store("openai", "gpt-4o", PROMPT, "A", settings=("system", 0.0))
+    assert cache.lookup("openai", "gpt-4o-mini", PROMPT, settings=("system", 0.0)) is None
+    assert cache.lookup("openai", "gpt-4o", PROMPT, settings=("system", 1.0)) is None
+    cache.store("openai", "gpt-4o", "Write a poem about the sea.", "B", settings=("system", 0.0))
+    assert cache.lookup("openai", "gpt-4o", PROMPT, settings=("system", 0.0)) == "A"
+    cache.store("anthropic", "claude", "Name three colours.", "C")
+    assert cache.lookup("openai", "gpt-4o", "Write a poem about the sea.", settings=("system", 0.0)) is None
+    assert cache.lookup("openai", "gpt-4o", PROMPT, settings=("system", 0.0)) == "A"
+    assert cache.stats()["evictions"] == 1
+
+def test_expired_completions_are_not_reused():
+    cache = PromptCache(ttl=1)
+    cache.store("openai", "gpt-4o", PROMPT, "A")
+    for scope in cache._scopes.values():
+        for entry in scope.entries:
+            entry["created"] -= 2
+    assert cache.lookup("openai", "gpt-4o", PROMPT) is None
+    assert cache.stats()["expirations"] == 1
@@ -0,0 +1,50 @@
+# backend/tests/test_provider_limits.py
+
+import time
+import asyncio
+from app.services import provider_limits
+from app.services.provider_limits import Bucket, ModelLimiter
+
+def test_bucket_charges_calls_larger_than_capacity_in_full(monkeypatch):
+    monkeypatch.setattr(provider_limits, "PROVIDER_BURST_SECONDS", 1)
+    bucket = Bucket(6000)
+    assert bucket.capacity == 100
+    assert bucket.wait_time(1000, 1.0) == 0.0
+    bucket.take(1000)
+    assert bucket.level == -900
+    # The whole cost has to be refilled before the next call
+    assert bucket.wait_time(1000, 1.0) == 10.0
+
+def test_token_limit_holds_for_calls_larger_than_capacity(monkeypatch):
+    # 60000 tokens/min refill 1000 tokens/s into a bucket of 10 tokens; calls
+    # of 100 tokens are ten times the capacity
+    monkeypatch.setattr(provider_limits, "PROVIDER_BURST_SECONDS", 0.01)
+
+    async def main():
+        limiter = ModelLimiter("test", "model", 0, 60000)
+        started = time.monotonic()
+        await asyncio.gather(*(limiter.acquire(100) for _ in range(6)))
+        return time.monotonic() - started, limiter.counters["tokens"]
+
+    elapsed, tokens = asyncio.run(main())
+    assert tokens == 600
+    # Everything but the initial capacity has to be refilled first
+    assert elapsed >= (600 - 10 - 100) / 1000
+    assert tokens / elapsed * 60 <= 60000 * 1.3
+
+def test_request_limits_lower_the_shared_limiter_while_in_effect(monkeypatch):
+    monkeypatch.setattr(provider_limits, "PROVIDER_LIMITS", {"test": {"rpm": 600, "tpm": 1000}})
+
+    async def main():
+        limiter = provider_limits.get_limiter("test", "model")
+        assert limiter.requests.per_minute == 600
+        with provider_limits.limit_requests({"test": 120, "other": 10}):
+            assert limiter.requests.per_minute == 120
+            assert provider_limits.get_limits("test", "new") == (120, 1000)
+            assert provider_limits.get_limits("other", "model") == (10, 0)
+            with provider_limits.limit_requests({"test": 300}):
+                # The lowest limit in effect applies
+                assert limiter.requests.per_minute == 120
+        assert limiter.requests.per_minute == 600
+        assert provider_limits.get_limits("other", "model") == (0, 0)
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+# backend/tests/test_registry.py
+
+import pytest
+from app.pipelines import registry
+
+NODE_SOURCE = """
+import os
+
+def warm_up():
+    # Fails until the marker file exists
+    if not os.path.exists(os.path.join(os.path.dirname(__file__), "ready")):
+        raise RuntimeError("model not downloaded yet")
+
+def process(input_data, options):
+    return input_data
+
+def get_ui_config():
+    return {"type": "Warm Node", "fields": []}
+"""
+
+def test_failed_warm_up_is_retried(tmp_path, monkeypatch):
+    (tmp_path / "warm_node.py").write_text(NODE_SOURCE)
+    monkeypatch.setattr(registry, "NODES_DIR", str(tmp_path))
+    try:
+        with pytest.raises(RuntimeError):
+            registry.get_node_module("Warm Node")
+        assert not registry.is_loaded("Warm Node")
+        (tmp_path / "ready").write_text("")
+        module = registry.get_node_module("Warm Node")
+        assert module.process("x", {}) == "x"
+        assert registry.is_loaded("Warm Node")
+    finally:
+        registry._modules.pop("Warm Node", None)
+        registry._manifest.pop("Warm Node", None)
@@ -0,0 +1,55 @@
+# backend/tests/test_result_cache.py
+
+import asyncio
+import threading
+from app.pipelines import executors
+from app.pipelines.result_cache import ResultCache
+
+def test_hits_and_misses_are_counted():
+    cache = ResultCache(path=None)
+    assert cache.get("a") == (False, None)
+    cache.set("a", {"text": "A"})
+    assert cache.get("a") == (True, {"text": "A"})
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["sets"], stats["entries"]) == (1, 1, 1, 1)
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = ResultCache(max_entries=2, path=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.stats()["evictions"] == 1
+
+def test_expired_entries_are_misses():
+    cache = ResultCache(ttl=0.01, path=None)
+    cache.set("a", 1)
+    threading.Event().wait(0.05)
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["expirations"] == 1
+
+def test_the_disk_tier_is_used_off_the_event_loop(tmp_path, monkeypatch):
+    cache = ResultCache(max_entries=1, path=str(tmp_path / "cache.db"))
+    threads = []
+    run_in_thread = executors.run_in_thread
+
+    async def tracked(call, *args):
+        threads.append(call.__name__)
+        return await run_in_thread(call, *args)
+    monkeypatch.setattr(executors, "run_in_thread", tracked)
+
+    async def main():
+        await cache.set_async("a", {"text": "A"})
+        await cache.set_async("b", {"text": "B"})
+        assert await cache.get_async("b") == (True, {"text": "B"})
+        assert await cache.get_async("a") == (True, {"text": "A"})
+        assert await cache.get_async("missing") == (False, None)
+    asyncio.run(main())
+
+    # b came from memory; a was evicted there and read back from disk
+    assert threads == ["_set_disk", "_set_disk", "_get_disk", "_get_disk"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"], stats["disk_entries"]) == (1, 1, 1, 2)
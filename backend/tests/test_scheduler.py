@@ -0,0 +1,78 @@
+# backend/tests/test_scheduler.py
+
+import time
+import asyncio
+import pytest
+from app.pipelines.dynamic_pipeline import execute_pipeline
+from conftest import edges, run, step
+
+@pytest.fixture
+def slow_node(node_type):
+    # A slow "Tag Step": waits `seconds`, then returns "<tag>(<input>)";
+    # nodes with "fail" set raise instead
+    calls = {"running": 0, "peak": 0, "order": []}
+
+    async def async_process(input_data, options):
+        calls["running"] += 1
+        calls["peak"] = max(calls["peak"], calls["running"])
+        calls["order"].append(options["tag"])
+        try:
+            await asyncio.sleep(float(options.get("seconds", 0.01)))
+            if options.get("fail"):
+                raise ValueError(f"{options['tag']} failed")
+            yield f"{options['tag']}({input_data})"
+        finally:
+            calls["running"] -= 1
+
+    node_type("Tag Step", async_process=async_process)
+    return calls
+
+def test_independent_branches_run_concurrently(slow_node):
+    config = {
+        "nodes": [{"id": "in", "type": "Input Node", "options": {"value": "x"}},
+                  step("a", seconds=0.2), step("b", seconds=0.2), step("c", seconds=0.2), step("join")],
+        "edges": edges(("in", "a"), ("in", "b"), ("in", "c"), ("a", "join"), ("b", "join"), ("c", "join")),
+    }
+    started = time.monotonic()
+    _, results, errors = run(config)
+    elapsed = time.monotonic() - started
+    assert not errors
+    assert slow_node["peak"] == 3
+    assert elapsed < 0.5
+    # The join waits for every parent and concatenates their results in edge order
+    assert results["join"]["result"] == "join(a(x) b(x) c(x))"
+    assert slow_node["order"][-1] == "join"
+
+def test_max_concurrency_bounds_running_nodes(slow_node):
+    config = {
+        "nodes": [step(f"n{i}", seconds=0.05) for i in range(6)],
+        "edges": [],
+    }
+    _, results, errors = run(config, max_concurrency=2)
+    assert len(results) == 6
+    assert slow_node["peak"] == 2
+
+def test_failure_skips_descendants_but_not_other_branches(slow_node):
+    config = {
+        "nodes": [step("bad", fail=True), step("after_bad"), step("good", seconds=0.05), step("after_good")],
+        "edges": edges(("bad", "after_bad"), ("good", "after_good")),
+    }
+    _, results, errors = run(config)
+    assert errors["bad"]["message"] == "bad failed"
+    assert errors["after_bad"] == {"type": "upstream_error", "message": "Upstream node bad failed", "upstream": "bad"}
+    assert results["after_good"]["result"] == "after_good(good())"
+    assert "after_bad" not in slow_node["order"]
+
+def test_closing_the_stream_stops_running_nodes_before_it_returns(slow_node):
+    config = {"nodes": [step("fast"), step("slow", seconds=5)], "edges": []}
+
+    async def main():
+        events = execute_pipeline(config)
+        async for node_id, event in events:
+            if node_id == "fast" and "result" in event:
+                break
+        await events.aclose()
+        return slow_node["running"]
+    started = time.monotonic()
+    assert asyncio.run(main()) == 0
+    assert time.monotonic() - started < 1
@@ -0,0 +1,37 @@
+# backend/tests/test_sessions.py
+
+import asyncio
+from app import app
+
+CONFIG = {"nodes": [{"id": "in", "type": "Input Node", "options": {"value": "x"}}], "edges": []}
+
+def test_runs_belong_to_the_session_that_started_them():
+    async def main():
+        owner, other = app.test_client(), app.test_client()
+        response = await owner.post('/start-pipeline', json=CONFIG)
+        assert "session=" in response.headers.get("Set-Cookie", "")
+        run_id = (await response.get_json())["run_id"]
+        assert (await owner.get(f'/runs/{run_id}')).status_code == 200
+        # Neither another session nor a client claiming a tenant id sees it
+        assert (await other.get(f'/runs/{run_id}')).status_code == 404
+        assert (await other.get(f'/runs/{run_id}', headers={"X-Tenant-ID": "anything"})).status_code == 404
+        assert (await other.get('/execute')).status_code == 400
+        # The same session keeps its identity across pipelines
+        second = await owner.post('/start-pipeline', json=CONFIG)
+        assert "Set-Cookie" not in second.headers
+        assert (await owner.get(f'/runs/{run_id}')).status_code == 200
+    asyncio.run(main())
+
+def test_a_forged_session_cookie_is_ignored():
+    async def main():
+        owner, forger = app.test_client(), app.test_client()
+        response = await owner.post('/start-pipeline', json=CONFIG)
+        run_id = (await response.get_json())["run_id"]
+        cookie = response.headers["Set-Cookie"].split(';')[0]
+        name, value = cookie.split('=', 1)
+        tampered = value[:-2] + ("AA" if not value.endswith("AA") else "BB")
+        response = await forger.get(f'/runs/{run_id}', headers={"Cookie": f"{name}={tampered}"})
+        assert response.status_code == 404
+        response = await forger.get(f'/runs/{run_id}', headers={"Cookie": cookie})
+        assert response.status_code == 200
+    asyncio.run(main())
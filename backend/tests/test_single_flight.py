@@ -0,0 +1,65 @@
+# backend/tests/test_single_flight.py
+
+import asyncio
+from app.pipelines.single_flight import SingleFlight
+
+def test_callers_share_one_call_and_its_earlier_outputs():
+    flights = SingleFlight()
+    starts = []
+    release = None
+
+    async def call():
+        starts.append(1)
+        yield {"delta": "a"}
+        await release.wait()
+        yield {"text": "ab"}
+
+    async def read(outputs):
+        return [output async for output in outputs]
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        first, shared = flights.join("key", call)
+        assert not shared
+        first_task = asyncio.create_task(read(first))
+        await asyncio.sleep(0.01)
+        second, shared = flights.join("key", call)
+        assert shared
+        second_task = asyncio.create_task(read(second))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await first_task, await second_task
+
+    first, second = asyncio.run(main())
+    assert first == second == [{"delta": "a"}, {"text": "ab"}]
+    assert starts == [1]
+    assert flights.stats() == {"calls": 1, "shared": 1, "abandoned": 0, "in_flight": 0}
+
+def test_the_call_is_cancelled_when_every_reader_went_away():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def call():
+        try:
+            yield {"delta": "a"}
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        first, _ = flights.join("key", call)
+        second, _ = flights.join("key", call)
+        # The first caller goes away before it reads anything
+        await first.aclose()
+        assert await second.__anext__() == {"delta": "a"}
+        reader = asyncio.create_task(second.__anext__())
+        await asyncio.sleep(0.01)
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert cancelled == [1]
+    assert flights.stats() == {"calls": 1, "shared": 1, "abandoned": 1, "in_flight": 0}
@@ -0,0 +1,79 @@
+# backend/tests/test_sse.py
+
+import json
+import zlib
+import asyncio
+import pytest
+from app.services import sse
+
+def chunks(events, **kwargs):
+    # The response chunks of an SSE stream of `events` (a list), all sent at once
+    async def source():
+        for event in events:
+            yield event
+
+    async def main():
+        return [chunk async for chunk in sse.stream(source(), encode=sse.encoders["json"], heartbeat=0, **kwargs)]
+    return asyncio.run(main())
+
+def parse(body):
+    return [json.loads(frame[len(b"data: "):]) for frame in body.split(b"\n\n") if frame]
+
+def collect(events, **kwargs):
+    return parse(b"".join(chunks(events, **kwargs)))
+
+def test_bursts_of_deltas_and_progress_are_merged():
+    events = [{"id": "a", "intermediate": {"delta": "He"}}, {"id": "a", "intermediate": {"delta": "llo"}},
+              {"id": "b", "intermediate": {"step": 1, "total": 3}}, {"id": "b", "intermediate": {"step": 2, "total": 3}},
+              {"id": "a", "result": "Hello"}]
+    assert collect(events, coalesce=1) == [
+        {"id": "a", "intermediate": {"delta": "Hello"}},
+        {"id": "b", "intermediate": {"step": 2, "total": 3}},
+        {"id": "a", "result": "Hello"},
+    ]
+
+def test_progress_with_chunk_results_is_never_dropped():
+    events = [{"id": "map", "intermediate": {"step": step, "total": 3, "chunk": chunk, "result": f"r{chunk}"}}
+              for step, chunk in ((1, 2), (2, 0), (3, 1))]
+    events.append({"id": "map", "result": ["r0", "r1", "r2"]})
+    assert collect(events, coalesce=1) == events
+
+def test_the_preferred_accepted_encoding_is_chosen(monkeypatch):
+    monkeypatch.setattr(sse, "SSE_COMPRESSION", ["br", "gzip"])
+    monkeypatch.setitem(sse._compressors, "br", sse._Gzip)  # whether or not brotli is installed
+    assert sse.negotiate_encoding("gzip, deflate, br") == "br"
+    assert sse.negotiate_encoding("GZIP;q=1.0") == "gzip"
+    assert sse.negotiate_encoding("deflate") is None
+    assert sse.negotiate_encoding(None) is None
+    monkeypatch.setattr(sse, "SSE_COMPRESSION", ["gzip"])
+    assert sse.negotiate_encoding("br, gzip") == "gzip"
+
+def test_gzip_chunks_can_be_decoded_as_they_arrive():
+    events = [{"id": "a", "result": "x" * 100}, {"id": "b", "result": "y"}]
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Every chunk but the trailer decodes to whole events on its own
+    decoded = [decompressor.decompress(chunk) for chunk in chunks(events, coalesce=0, encoding="gzip")]
+    assert decoded[-1] == b""
+    assert all(data.endswith(b"\n\n") for data in decoded[:-1])
+    assert parse(b"".join(decoded)) == events
+
+def test_brotli_streams_decode_to_the_events():
+    brotli = pytest.importorskip("brotli")
+    events = [{"id": "a", "result": "x"}]
+    assert parse(brotli.decompress(b"".join(chunks(events, encoding="br")))) == events
+
+def test_the_execute_stream_is_compressed_when_accepted(monkeypatch):
+    from app import app
+    monkeypatch.setattr(sse, "SSE_COMPRESSION", ["gzip"])
+    config = {"nodes": [{"id": "in", "type": "Input Node", "options": {"value": "x"}}], "edges": []}
+
+    async def main():
+        client = app.test_client()
+        run_id = (await (await client.post('/start-pipeline', json=config)).get_json())["run_id"]
+        response = await client.get(f'/execute/{run_id}', headers={"Accept-Encoding": "gzip"})
+        return response.headers, await response.get_data()
+    headers, body = asyncio.run(main())
+    assert headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in headers["Vary"]
+    events = parse(zlib.decompress(body, 16 + zlib.MAX_WBITS))
+    assert any(event.get("id") == "in" and event["result"]["result"] == "x" for event in events)
@@ -0,0 +1,67 @@
+# backend/tests/test_stream_edges.py
+
+import asyncio
+import pytest
+from app.pipelines import dynamic_pipeline
+from conftest import edges, run, step
+
+@pytest.fixture
+def log(node_type):
+    # "Delta Step" streams `count` deltas; "Read Step" consumes them as they
+    # arrive (after `delay` seconds each, or only the first one with "first")
+    # and returns them joined. Every send and receive is logged in order.
+    log = []
+
+    async def async_process(input_data, options):
+        for i in range(int(options.get("count", 3))):
+            log.append(("sent", i))
+            yield {"delta": str(i)}
+            await asyncio.sleep(0)
+        yield "done"
+
+    async def stream_process(chunks, options):
+        received = []
+        async for chunk in chunks:
+            log.append(("received", chunk))
+            received.append(chunk)
+            if options.get("first"):
+                break
+            await asyncio.sleep(float(options.get("delay", 0)))
+        yield "".join(received)
+
+    node_type("Delta Step", async_process=async_process)
+    node_type("Read Step", stream_process=stream_process)
+    return log
+
+def config(count=3, **read_options):
+    # The producer opts out of single-flight, which reads calls ahead into
+    # its own buffer for callers that join later
+    return {"nodes": [{**step("up", "Delta Step", count=count), "dedupe": False}, step("down", "Read Step", **read_options)],
+            "edges": edges(("up", "down"))}
+
+def test_the_consumer_reads_chunks_before_the_producer_finishes(log):
+    _, results, errors = run(config(count=3, delay=0.01))
+    assert not errors
+    assert results["down"]["result"] == "012"
+    assert log.index(("received", "0")) < log.index(("sent", 2))
+
+def test_a_slow_consumer_holds_back_the_producer(log, monkeypatch):
+    monkeypatch.setattr(dynamic_pipeline, "STREAM_EDGE_BUFFER", 2)
+    _, results, errors = run(config(count=20, delay=0.005))
+    assert not errors
+    assert results["down"]["result"] == "".join(str(i) for i in range(20))
+    lead = sent = received = 0
+    for kind, _ in log:
+        sent += kind == "sent"
+        received += kind == "received"
+        lead = max(lead, sent - received)
+    # The buffered chunks, the one waiting to be put and the one being read
+    assert lead <= 2 + 2
+
+def test_a_consumer_that_stops_reading_doesnt_block_the_producer(log, monkeypatch):
+    monkeypatch.setattr(dynamic_pipeline, "STREAM_EDGE_BUFFER", 2)
+    _, results, errors = run(config(count=20, first=True))
+    assert not errors
+    assert results["down"]["result"] == "0"
+    assert results["up"]["result"] == "done"
+    assert ("sent", 19) in log
@@ -0,0 +1,41 @@
+# backend/tests/test_streaming.py
+
+import asyncio
+import pytest
+from app.pipelines.dynamic_pipeline import execute_pipeline
+from benchmarks.mock_providers import MockConfig, MockProviderServer
+from conftest import edges
+
+@pytest.fixture
+def providers(monkeypatch):
+    # The benchmark's mock OpenAI and Anthropic APIs, streaming 5 tokens
+    server = MockProviderServer(MockConfig(latency=0, token_delay=0.001, tokens=5)).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", server.openai_base_url)
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", server.anthropic_base_url)
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "mock")
+    yield server
+    server.stop()
+
+def test_gpt_and_claude_nodes_stream_their_tokens_before_the_result(providers):
+    config = {
+        "nodes": [{"id": "in", "type": "Input Node", "options": {"value": "Say something"}},
+                  {"id": "gpt", "type": "GPT Node", "options": {"model": "gpt-4o-mini"}},
+                  {"id": "claude", "type": "Claude Node", "options": {}}],
+        "edges": edges(("in", "gpt"), ("in", "claude")),
+    }
+
+    async def main():
+        deltas, results = {"gpt": [], "claude": []}, {}
+        async for node_id, event in execute_pipeline(config):
+            if node_id in deltas and "intermediate" in event:
+                assert node_id not in results
+                deltas[node_id].append(event["intermediate"]["delta"])
+            elif node_id in deltas:
+                results[node_id] = event
+        return deltas, results
+    deltas, results = asyncio.run(main())
+
+    for node_id in ("gpt", "claude"):
+        assert len(deltas[node_id]) == 5
+        assert results[node_id]["result"] == "".join(deltas[node_id])
@@ -0,0 +1,67 @@
+# backend/tests/test_targets.py
+
+import asyncio
+import pytest
+from app.pipelines.incremental import RunState
+from app.pipelines.plan import PlanError, get_plan
+from conftest import pipeline, run
+
+def test_needed_nodes_are_the_targets_and_their_ancestors(calls):
+    plan = get_plan(pipeline())
+    assert plan.needed(["b"]) == ("in", "a", "b")
+    assert plan.needed(["b", "d"]) == ("in", "a", "d", "b")
+    assert plan.needed(None) == plan.node_ids
+
+def test_invalid_targets_are_rejected(calls):
+    # Whether or not the plan is already cached
+    for _ in range(2):
+        with pytest.raises(PlanError) as error:
+            get_plan(pipeline(targets=["b", "missing"]))
+        assert [e["type"] for e in error.value.errors] == ["unknown_target"]
+        assert error.value.errors[0]["node"] == "missing"
+        with pytest.raises(PlanError) as error:
+            get_plan(pipeline(targets="b"))
+        assert [e["type"] for e in error.value.errors] == ["invalid_targets"]
+
+def test_nodes_the_targets_dont_need_are_not_run(calls):
+    plan, results, _ = run(pipeline(), RunState(), targets=["b"])
+    assert sorted(calls) == ["a", "b"]
+    assert set(results) == {"in", "a", "b"}
+    assert plan["recomputed"] == ["in", "a", "b"]
+    assert sorted(plan["pruned"]) == ["c", "d"]
+
+def test_pruned_nodes_downstream_of_changes_are_recomputed_later(calls):
+    state = RunState()
+    run(pipeline(), state)
+    assert sorted(calls) == ["a", "b", "c", "d"]
+
+    # Changing "a" while only "b" is needed leaves "c" out of date
+    del calls[:]
+    plan, _, _ = run(pipeline(a={"suffix": 1}), state, targets=["b"])
+    assert calls == ["a", "b"]
+    assert plan["reused"] == ["in"]
+    assert sorted(plan["pruned"]) == ["c", "d"]
+    assert "c" not in state.signatures
+    assert "d" in state.signatures
+
+    # The next full run recomputes "c" and reuses "d"
+    del calls[:]
+    plan, results, _ = run(pipeline(a={"suffix": 1}), state)
+    assert calls == ["c"]
+    assert sorted(plan["reused"]) == ["a", "b", "d", "in"]
+    assert results["c"]["result"] == "c(b(a(x)))"
+
+def test_targets_of_an_execution_dont_stick_to_the_run(calls):
+    from app import app
+
+    async def main():
+        client = app.test_client()
+        response = await client.post('/start-pipeline', json=pipeline())
+        run_id = (await response.get_json())["run_id"]
+        previewed = await (await client.get(f'/execute/{run_id}?targets=b')).get_data()
+        executed = await (await client.get(f'/execute/{run_id}')).get_data()
+        return previewed, executed
+    previewed, executed = asyncio.run(main())
+    assert b'"pruned":["d","c"]' in previewed
+    assert sorted(calls) == ["a", "b", "c", "d"]
+    assert b'"pruned":[]' in executed
@@ -0,0 +1,36 @@
+# backend/worker.py
+
+import signal
+import asyncio
+import argparse
+from app.pipelines.jobs import Worker, JOB_WORKER_CONCURRENCY
+
+async def serve(worker):
+    # Stop gracefully on SIGTERM, handing unfinished runs back to the queue
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass  # Not supported on Windows
+    try:
+        await worker.run()
+    except asyncio.CancelledError:
+        print(f"Worker {worker.worker_id} stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description="Execute queued pipeline runs (see JOB_QUEUE)")
+    parser.add_argument('--queues', default=None, help="Comma-separated queues to serve, e.g. gpu (default: all)")
+    parser.add_argument('--concurrency', type=int, default=JOB_WORKER_CONCURRENCY, help="Runs executed at the same time")
+    args = parser.parse_args()
+
+    queues = [queue.strip() for queue in args.queues.split(',') if queue.strip()] if args.queues else None
+    worker = Worker(queues, args.concurrency)
+    try:
+        asyncio.run(serve(worker))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
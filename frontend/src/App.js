@@ -82,15 +82,14 @@ const NodeTemplate = ({ data, isConnectable }) => {
         let imageUrl;
         let fullSizeUrl;
         
-        if (nodeType === 'FLUX Image Generator') {
-          // For FLUX, the result is a base64 string
-          imageUrl = data.result.result ? data.result.result.image : data.result.result;
-          fullSizeUrl = imageUrl; // The full size URL is the same as the image URL for base64
-        } else {
-          // For DALL-E, the result is a URL
-          imageUrl = data.result.result;
-          fullSizeUrl = imageUrl;
+        // Generated images are either a remote URL or a handle to an image in
+        // the backend's artifact store ({"image": "/artifacts/<id>", ...})
+        const result = data.result.result;
+        imageUrl = result && typeof result === 'object' ? result.image : result;
+        if (imageUrl && imageUrl.startsWith('/artifacts/')) {
+          imageUrl = `http://localhost:5000${imageUrl}`;
         }
+        fullSizeUrl = imageUrl;
 
         return (
           <div>
@@ -219,6 +218,10 @@ function App() {
   
   const nodesRef = useRef(nodes);
   const edgesRef = useRef(edges);
+  // Pipeline id the backend returned for each node's runs. Sending it back
+  // continues that pipeline, so a node executed again with the same input
+  // and options reuses its previous result.
+  const pipelineIdsRef = useRef({});
 
   useEffect(() => {
     nodesRef.current = nodes;
@@ -347,14 +350,17 @@ function App() {
           input: nodeInput
         }],
         edges: [],
-        startNodeId: nodeId
+        // No startNodeId: it would always recompute the node
+        pipelineId: pipelineIdsRef.current[nodeId]
       };
   
       console.log("Executing pipeline:", pipeline);
   
-      axios.post('http://localhost:5000/start-pipeline', pipeline)
-        .then(() => {
-          const eventSource = new EventSource('http://localhost:5000/execute');
+      // The session cookie set by /start-pipeline identifies us to /execute
+      axios.post('http://localhost:5000/start-pipeline', pipeline, { withCredentials: true })
+        .then((response) => {
+          pipelineIdsRef.current[nodeId] = response.data.pipeline_id;
+          const eventSource = new EventSource(`http://localhost:5000/execute/${response.data.run_id}`, { withCredentials: true });
   
           eventSource.onmessage = (event) => {
             const data = JSON.parse(event.data);
@@ -367,6 +373,53 @@ function App() {
               eventSource.close();
               return;
             }
+
+            if (data.plan) {
+              // Nodes that are (re)computed start over, e.g. when a run
+              // resumes after the connection was lost. Pruned nodes are not
+              // needed for the requested targets and don't run at all.
+              const recomputed = data.plan.recomputed || [];
+              const pruned = data.plan.pruned || [];
+              setNodes((nds) =>
+                nds.map((node) => {
+                  if (recomputed.includes(node.id)) {
+                    return { ...node, data: { ...node.data, result: undefined } };
+                  }
+                  if (pruned.includes(node.id)) {
+                    return { ...node, data: { ...node.data, isLoading: false } };
+                  }
+                  return node;
+                })
+              );
+              return;
+            }
+
+            if (data.intermediate) {
+              // Streamed tokens are appended to the text shown in the node,
+              // partial results replace it
+              if (data.intermediate.delta || data.intermediate.partial !== undefined) {
+                setNodes((nds) =>
+                  nds.map((node) => {
+                    if (node.id === data.id) {
+                      const previous = (node.data.result && node.data.result.result) || '';
+                      const text = data.intermediate.delta
+                        ? previous + data.intermediate.delta
+                        : data.intermediate.partial;
+                      return {
+                        ...node,
+                        data: {
+                          ...node.data,
+                          isLoading: false,
+                          result: { result: text }
+                        }
+                      };
+                    }
+                    return node;
+                  })
+                );
+              }
+              return;
+            }
   
             setNodes((nds) =>
               nds.map((node) => {
@@ -393,6 +446,12 @@ function App() {
           };
   
           eventSource.onerror = (error) => {
+            if (eventSource.readyState === EventSource.CONNECTING) {
+              // The browser reconnects by itself and the server resumes the
+              // run, sending the events that were missed
+              console.log('EventSource reconnecting:', error);
+              return;
+            }
             console.log('EventSource ended or errored:', error);
             eventSource.close();
             setIsExecuting(false);
@@ -419,7 +478,13 @@ function App() {
               }
             }))
           );
-          alert('Failed to start pipeline execution. Please try again.');
+          // Invalid configurations come back with a list of what is wrong
+          const errors = error.response && error.response.data && error.response.data.errors;
+          if (errors) {
+            alert(`Invalid pipeline configuration:\n${errors.map((e) => e.message).join('\n')}`);
+          } else {
+            alert('Failed to start pipeline execution. Please try again.');
+          }
         });
     };
   